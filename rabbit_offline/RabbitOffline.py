@@ -1,3 +1,4 @@
+import functools
 import json
 import warnings
 
@@ -9,6 +10,14 @@ from important_features import __stats as stats, __convert_col_type as convert_c
 from rabbit import compute_confidence, get_model
 
 
+@functools.lru_cache(maxsize=None)
+def _get_model():
+    """
+    Load the model of RABBIT (only once per process)
+    """
+    return get_model()
+
+
 def _events_to_activities(raw_events):
     """
     Convert the events to activities and identify the activity type
@@ -47,15 +56,8 @@ def _extract_features(df, contributor):
     - DCAT: time taken to switch activity type (mean, median, std, gini and IQR),
     - NAT: number of activities per type (mean, median, std, gini and IQR).
     """
-    features = ['NA', 'NT', 'NOR', 'ORR',
-              'DCA_mean', 'DCA_median', 'DCA_std', 'DCA_gini',
-              'NAR_mean', 'NAR_median', 'NAR_gini', 'NAR_IQR',
-              'NTR_mean', 'NTR_median', 'NTR_std', 'NTR_gini',
-              'NCAR_mean', 'NCAR_std', 'NCAR_IQR',
-              'DCAR_mean', 'DCAR_median', 'DCAR_std', 'DCAR_IQR',
-              'DAAR_mean', 'DAAR_median', 'DAAR_std', 'DAAR_gini', 'DAAR_IQR',
-              'DCAT_mean', 'DCAT_median', 'DCAT_std', 'DCAT_gini', 'DCAT_IQR',
-              'NAT_mean', 'NAT_median', 'NAT_std', 'NAT_gini', 'NAT_IQR']
+    # Features of the model, in its order
+    features = list(_get_model().feature_names_in_)
 
     df['date'] = pd.to_datetime(df.date, errors='coerce', format='%Y-%m-%dT%H:%M:%S+00:00').dt.tz_localize(None)
     df[['owner', 'repo']] = df.repository.str.split('/', expand=True)
@@ -103,7 +105,7 @@ def predict(df_feat):
     Returns:
         A tuple with the contributor type and the confidence
     """
-    model = get_model()
+    model = _get_model()
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=UserWarning)
         proba = model.predict_proba(df_feat)
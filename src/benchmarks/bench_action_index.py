@@ -0,0 +1,111 @@
+"""
+Benchmark of the decision index of the event to action mapping (see `gitbot_utils.action_index`).
+
+The events are read from the event archive of the dataset (see `scripts/save_user_events.py`) or, if it does not
+exist, from an archive of synthetic GitLab events. The action of each event is found by:
+- the loop of `ActionMapper.map` (every action of the configuration is tested),
+- the decision index of the shared glmap mapper,
+and the whole mapping of `ActionMapper.map` is compared with the shared mapper. The actions must be the same,
+including for events with missing or unexpected fields (same action or same exception).
+"""
+
+import copy
+import os
+import random
+import tempfile
+import time
+
+from ghmap.mapping.action_mapper import ActionMapper
+from ghmap.utils import load_json_file
+
+from gitbot_utils.event_archive import EventArchive
+from gitbot_utils.mapping import MAPPING_FILES, get_mappers
+from synthetic_events import gitlab_events
+
+ARCHIVE_FOLDER = '../tests/gitlab_dataset/archive'
+NB_USERS = 300
+NB_EVENTS = 1000
+
+
+def load_events():
+    if os.path.isdir(ARCHIVE_FOLDER):
+        archive = EventArchive(ARCHIVE_FOLDER)
+    else:
+        print(f"No event archive in {ARCHIVE_FOLDER}: archive of {NB_USERS} synthetic users")
+        archive = EventArchive(tempfile.mkdtemp())
+        archive.write('synthetic', {f'user{i}': gitlab_events(f'user{i}', NB_EVENTS, seed=i) for i in range(NB_USERS)})
+    return [event for origin in archive.origins() for events in archive.load(origin).values() for event in events]
+
+
+def altered_events(events, nb_events, seed=0):
+    """
+    Copies of events with a field removed or replaced (None, other value, other type).
+    """
+    rng = random.Random(seed)
+    altered = []
+    for event in rng.sample(events, nb_events):
+        event = copy.deepcopy(event)
+        obj = rng.choice([event, event.get('note') or event, event.get('push_data') or event])
+        key = rng.choice(list(obj))
+        change = rng.randrange(4)
+        if change == 0:
+            del obj[key]
+        elif change == 1:
+            obj[key] = None
+        elif change == 2:
+            obj[key] = rng.choice(['Issue', 'MergeRequest', 'tag', 'branch', 'created', 'commented on'])
+        else:
+            obj[key] = rng.choice([[], {}, 'x', 1])
+        altered.append(event)
+    return altered
+
+
+def linear_find_action(mapper, event_record):
+    """
+    Action of an event as found by the loop of `ActionMapper.map`.
+    """
+    event_type = mapper._extract_field(event_record, mapper.event_type_key)
+    for action_name, action_details in mapper.action_mapping['actions'].items():
+        if (event_type == action_details['event'].get('type', None)
+                and all(mapper._match_condition(mapper._extract_field(event_record, k), v)
+                        for k, v in action_details['event'].items() if k != 'type')):
+            return action_name, action_details
+    return None
+
+
+def outcome(function, *args):
+    try:
+        return function(*args)
+    except Exception as e:
+        return type(e)
+
+
+def timed(label, nb_events, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {elapsed:6.2f}s ({nb_events / elapsed:12,.0f} events/s)")
+    return result
+
+
+if __name__ == '__main__':
+    events = load_events()
+    mapper = ActionMapper(load_json_file(MAPPING_FILES['glmap'][0]), progress_bar=False)
+    action_mapper, _ = get_mappers('glmap')
+    print(f"{len(events)} events")
+
+    expected = timed("action lookup, ActionMapper loop", len(events),
+                     lambda: [linear_find_action(mapper, event) for event in events])
+    found = timed("action lookup, decision index", len(events),
+                  lambda: [action_mapper._find_action(event) for event in events])
+    assert found == expected
+
+    expected = timed("mapping, ActionMapper", len(events), mapper.map, events)
+    actions = timed("mapping, shared mapper", len(events), action_mapper.map, events)
+    assert actions == expected
+
+    altered = altered_events(events, min(len(events), 20000))
+    expected = [outcome(linear_find_action, mapper, event) for event in altered]
+    assert [outcome(action_mapper._find_action, event) for event in altered] == expected
+    print(f"Same actions ({len(set(name for name, _ in filter(None, found)))} actions found), "
+          f"and on {len(altered)} altered events")
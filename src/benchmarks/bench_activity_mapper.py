@@ -0,0 +1,69 @@
+"""
+Benchmark of the activity grouping engine (see `gitbot_utils.activity_engine`) on synthetic GitLab events.
+
+The actions are mapped to activities with the glmap mapping by `ActivityMapper` (new mapper for each contributor,
+as done before) and by the shared mapper of `gitbot_utils.mapping`. The activities must be the same.
+The events of the bots are close in time (a few seconds), so that most of their actions are grouped in activities,
+and spread over a few projects only.
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from ghmap.mapping.activity_mapper import ActivityMapper
+from ghmap.utils import load_json_file
+
+from gitbot_utils.mapping import MAPPING_FILES, get_mappers
+from synthetic_events import gitlab_events
+
+NB_USERS = 200
+NB_EVENTS = 500
+BOT_SIZES = [2000, 4000, 8000]
+LARGE_BOT_SIZE = 100000
+
+
+def bot_events(user, nb_events, nb_projects=5):
+    """
+    Events of a bot: one event every 0 to 3 seconds, from the most recent to the oldest.
+    The ids of the events are unique (the random ids of `gitlab_events` are not, for this number of events).
+    """
+    rng = random.Random(user)
+    events = gitlab_events(user, nb_events, nb_projects=nb_projects)
+    date = datetime(2025, 1, 1)
+    for event_id, event in enumerate(reversed(events)):
+        date += timedelta(milliseconds=rng.randrange(3000))
+        event['id'] = event_id
+        event['created_at'] = date.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return events
+
+
+def reference_mapping(actions):
+    activity_mapper = ActivityMapper(load_json_file(MAPPING_FILES['glmap'][1]), progress_bar=False)
+    return activity_mapper.map(actions)
+
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<36} {time.perf_counter() - start:8.2f}s")
+    return result
+
+
+if __name__ == '__main__':
+    action_mapper, activity_mapper = get_mappers('glmap')
+    user_actions = [action_mapper.map(gitlab_events(f'user{i}', NB_EVENTS, seed=i)) for i in range(NB_USERS)]
+    bot_actions = {size: action_mapper.map(bot_events(f'bot{size}', size)) for size in BOT_SIZES}
+
+    expected = timed(f"ActivityMapper, {NB_USERS} users", lambda: [reference_mapping(a) for a in user_actions])
+    activities = timed(f"engine, {NB_USERS} users", lambda: [activity_mapper.map(a) for a in user_actions])
+    assert activities == expected
+    for size, actions in bot_actions.items():
+        expected = timed(f"ActivityMapper, bot of {size} events", reference_mapping, actions)
+        activities = timed(f"engine, bot of {size} events", activity_mapper.map, actions)
+        assert activities == expected
+        print(f"Same activities ({len(activities)} activities)")
+
+    actions = action_mapper.map(bot_events('large-bot', LARGE_BOT_SIZE))
+    activities = timed(f"engine, bot of {LARGE_BOT_SIZE} events", activity_mapper.map, actions)
+    assert sum(len(activity['actions']) for activity in activities) <= len(actions)
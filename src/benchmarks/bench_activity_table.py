@@ -0,0 +1,91 @@
+"""
+Benchmark of the memory used by the mapping of the events of a bot (see `gitbot_utils.activity_table`).
+
+The features of a GitLab bot with 100k events are computed from its activities as dictionaries
+(`events_to_activities` and `activity_to_df`) and as an `ActivityTable` (`events_to_activity_table` and
+`activity_table_to_df`). Each path runs in a new process, which reports the increase of its peak RSS
+(maximum resident set size) over its RSS once the events are generated. The peak RSS is reset after the generation
+of the events (`/proc/self/clear_refs`, Linux only).
+
+The DataFrames of activities and the features must be the same with both paths (checked in this process).
+"""
+
+import copy
+import gc
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from bench_activity_mapper import bot_events
+from gitbot_utils.gl_api import GitLabManager
+
+NB_EVENTS = 100_000
+NB_PROJECTS = 5
+
+
+def manager():
+    # The native feature extractor, to only measure the mapping
+    gl_manager = GitLabManager(native_features=True)
+    gl_manager.repo_owners.set_many({project_id: f'owner-{project_id % 3}' for project_id in range(NB_PROJECTS)})
+    return gl_manager
+
+
+def memory_status(field):
+    """
+    Field of the memory status of the process (MB), ex: 'VmRSS' (RSS) or 'VmHWM' (peak RSS).
+    """
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def dict_features(gl_manager, events):
+    return gl_manager.extract_features(gl_manager.activity_to_df(gl_manager.events_to_activities(events)), 'bot')
+
+
+def table_features(gl_manager, events):
+    return gl_manager.extract_features(gl_manager.activity_table_to_df(gl_manager.events_to_activity_table(events)),
+                                       'bot')
+
+
+PATHS = {'dictionaries': dict_features, 'table': table_features}
+
+
+def measure(path):
+    """
+    Run a path in this process and print the increase of the peak RSS and the time taken.
+    """
+    gl_manager = manager()
+    events = bot_events('bot', NB_EVENTS, nb_projects=NB_PROJECTS)
+    gc.collect()
+    with open('/proc/self/clear_refs', 'w') as file:
+        file.write('5')
+    baseline = memory_status('VmRSS')
+    start = time.perf_counter()
+    PATHS[path](gl_manager, events)
+    print(memory_status('VmHWM') - baseline, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        measure(sys.argv[1])
+        sys.exit()
+
+    gl_manager = manager()
+    events = bot_events('bot', NB_EVENTS, nb_projects=NB_PROJECTS)
+    expected = gl_manager.activity_to_df(gl_manager.events_to_activities(copy.deepcopy(events)))
+    activities_df = gl_manager.activity_table_to_df(gl_manager.events_to_activity_table(events))
+    pd.testing.assert_frame_equal(activities_df, expected)
+    pd.testing.assert_frame_equal(gl_manager.extract_features(activities_df, 'bot'),
+                                  gl_manager.extract_features(expected, 'bot'))
+    print(f"Same activities and features ({len(expected)} activities for {NB_EVENTS} events)")
+    del events, expected, activities_df
+
+    for path in PATHS:
+        output = subprocess.run([sys.executable, __file__, path], capture_output=True, text=True, check=True).stdout
+        increase, elapsed = map(float, output.split()[-2:])
+        print(f"{path:<14} peak RSS +{increase:7.0f} MB {elapsed:7.2f}s")
@@ -0,0 +1,73 @@
+"""
+Benchmark of `APIManager.activity_to_df` against the previous row-by-row implementation.
+
+It checks that both implementations produce the same DataFrame and compares their execution time on:
+- the GitHub events of `rabbit_offline/events.json` (mapped with ghmap),
+- synthetic GitLab accounts with many activities.
+"""
+
+import json
+import time
+
+import pandas as pd
+
+from gitbot_utils.gh_api import GitHubManager
+from gitbot_utils.gl_api import GitLabManager
+from synthetic_events import synthetic_activities
+
+
+def legacy_activity_to_df(manager, activities):
+    """
+    Previous implementation of `activity_to_df`: one DataFrame per activity concatenated to the result.
+    """
+    activities_df = pd.DataFrame()
+    for activity in activities:
+        new_row = pd.DataFrame([[
+            activity['start_date'],
+            activity['activity'],
+            activity['actor']['login'],
+            activity['repository']['id']
+        ]], columns=['date', 'activity', 'contributor', 'repository'])
+        new_row['owner'] = manager._get_repo_owner(activity)
+        activities_df = pd.concat([activities_df, new_row], ignore_index=True)
+    activities_df['date'] = (pd.to_datetime(activities_df['date'], errors='coerce', format='%Y-%m-%dT%H:%M:%SZ')
+                             .dt.tz_localize(None))
+
+    return activities_df
+
+
+def timeit(function, *args, repeat=3):
+    """
+    Return the best execution time (in seconds) of `function(*args)` and its result.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def compare(label, manager, activities, repeat=3):
+    """
+    Check that both implementations return the same DataFrame and print their execution time.
+    """
+    legacy_time, legacy_df = timeit(lambda: legacy_activity_to_df(manager, activities), repeat=repeat)
+    new_time, new_df = timeit(lambda: manager.activity_to_df(activities), repeat=repeat)
+    pd.testing.assert_frame_equal(legacy_df, new_df)
+    print(f"{label:<30} {len(activities):>8} activities | "
+          f"row-by-row: {legacy_time:9.4f}s | columnar: {new_time:9.4f}s | x{legacy_time / new_time:.1f}")
+
+
+if __name__ == '__main__':
+    with open('../../rabbit_offline/events.json', 'r') as f:
+        events = json.load(f)
+    gh_manager = GitHubManager()
+    compare('rabbit_offline/events.json', gh_manager, gh_manager.events_to_activities(events), repeat=10)
+
+    # Owners are known in advance to measure the DataFrame construction only
+    gl_manager = GitLabManager()
+    gl_manager.repo_owners.set_many({repository_id: f'owner-{repository_id % 7}' for repository_id in range(50)})
+    for size in [1_000, 10_000, 20_000]:
+        compare(f'synthetic ({size})', gl_manager, synthetic_activities(size), repeat=1)
@@ -0,0 +1,122 @@
+"""
+Check of the checkpointed crawl of `scripts/create_gitlab_dataset.py` (see `gitbot_utils.crawl_journal`).
+
+The GitLab API is replaced by a fake manager with a fixed latency per call, whose contributors and features are
+derived from the ids. A complete crawl is compared to a crawl that fails after half of the feature queries
+(then restarted), and to a crawl whose last append was not recorded in the journal. The outputs must be the same,
+and the restarted crawl must not query again the contributors and repositories already done.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from gitbot_utils.crawl_journal import CrawlJournal
+from gitbot_utils.features import COUNT_FEATURES, FEATURES
+from gitbot_utils.model_registry import get_model
+
+sys.path.append('../scripts')
+import create_gitlab_dataset as cgd  # noqa: E402
+
+NB_REPOSITORIES = 60
+LATENCY = 0.01
+MODELS_FOLDER = '../resources/models'
+IMPUTED_FEATURES = [f'{feature}_{statistic}' for feature in ('DAAR', 'DCAT') for statistic in ('mean', 'median', 'IQR')]
+
+
+class Crash(Exception):
+    pass
+
+
+class FakeContributorManager:
+    """
+    Replacement of `AsyncContributorManager` (same queries, no HTTP).
+    """
+    calls = {'contributors': 0, 'features': 0}
+    max_feature_calls = None
+
+    def __init__(self, manager, max_concurrency=None):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def query_repo_contributors(self, project_id, min_contributors=10):
+        self.calls['contributors'] += 1
+        await asyncio.sleep(LATENCY)
+        # Some repositories have no contributor, none has more than `min_contributors` (the random sample of the
+        # contributors would make the outputs of the crawls different)
+        return [{'id': project_id * 100 + i, 'username': f'user{project_id}-{i}', 'name': f'User {i}'}
+                for i in range(project_id % (min_contributors + 1))]
+
+    async def compute_features(self, contributor):
+        if self.max_feature_calls is not None and self.calls['features'] >= self.max_feature_calls:
+            raise Crash()
+        self.calls['features'] += 1
+        await asyncio.sleep(LATENCY)
+        if contributor % 7 == 0:
+            return None
+        rng = np.random.default_rng(contributor)
+        # Missing values only in the columns imputed by the models (as with a single repository or activity type)
+        return pd.DataFrame({feature: [int(rng.integers(1, 300)) if feature in COUNT_FEATURES else
+                                       np.nan if feature in IMPUTED_FEATURES and contributor % 5 == 0 else
+                                       rng.random() * 100]
+                             for feature in FEATURES}, index=[contributor])
+
+
+def crawl(folder, name, max_feature_calls=None):
+    """
+    Run the crawl with the journal `name` (returns the time and the number of calls).
+    """
+    FakeContributorManager.calls = {'contributors': 0, 'features': 0}
+    FakeContributorManager.max_feature_calls = max_feature_calls
+    progress = None
+    start = time.perf_counter()
+    with CrawlJournal(os.path.join(folder, f'{name}.sqlite'), os.path.join(folder, f'{name}.csv'),
+                      cgd.COLUMNS) as journal:
+        try:
+            asyncio.run(cgd.main(None, repositories, bimbis, bimbas, journal, batch_size=16))
+        except Crash:
+            progress = journal.progress('contributors')
+            print(f"Crawl stopped ({progress})")
+    return time.perf_counter() - start, dict(FakeContributorManager.calls), progress
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+if __name__ == '__main__':
+    cgd.AsyncContributorManager = FakeContributorManager
+    bimbis, bimbas = get_model('bimbis', MODELS_FOLDER), get_model('bimbas', MODELS_FOLDER)
+    repositories = pd.DataFrame({'id': range(1, NB_REPOSITORIES + 1),
+                                 'owner': 'owner', 'project': [f'project{i}' for i in range(NB_REPOSITORIES)]})
+    folder = tempfile.mkdtemp()
+
+    full_time, full_calls, _ = crawl(folder, 'full')
+    print(f"Complete crawl: {full_time:.2f}s, calls: {full_calls}")
+
+    _, first_calls, progress = crawl(folder, 'resumed', max_feature_calls=full_calls['features'] // 2)
+    resume_time, resume_calls, _ = crawl(folder, 'resumed')
+    print(f"Restarted crawl: {resume_time:.2f}s, calls: {resume_calls} (before the stop: {first_calls})")
+    assert read(os.path.join(folder, 'resumed.csv')) == read(os.path.join(folder, 'full.csv'))
+    # Only the queries in progress when the crawl stopped are lost
+    assert resume_calls['features'] == full_calls['features'] - progress['users']
+    assert resume_calls['contributors'] == full_calls['contributors'] - progress['started']
+
+    # Rows appended without being recorded in the journal (stop between the append and the commit)
+    with open(os.path.join(folder, 'full.csv'), 'a') as file:
+        file.write("user-unrecorded,Unrecorded,1,Bot,0.5,Bot")
+    _, calls, _ = crawl(folder, 'full')
+    assert read(os.path.join(folder, 'full.csv')) == read(os.path.join(folder, 'resumed.csv'))
+    assert calls == {'contributors': 0, 'features': 0}
+    print(f"Same output after the restarts ({len(pd.read_csv(os.path.join(folder, 'full.csv')))} rows)")
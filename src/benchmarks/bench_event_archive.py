@@ -0,0 +1,59 @@
+"""
+Benchmark of the columnar event archive (see `gitbot_utils.event_archive`) against one indented JSON file per user.
+
+It checks that the events read from the archive are mapped to the same activities as the original events,
+and compares the write time, the read time and the read time of a projection on two columns.
+"""
+
+import copy
+import json
+import os
+import tempfile
+import time
+
+from gitbot_utils.event_archive import EventArchive
+from gitbot_utils.mapping import map_events
+from synthetic_events import gitlab_events
+
+
+def timeit(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def write_json_files(folder, user_events):
+    for username, events in user_events.items():
+        with open(os.path.join(folder, f'{username}.json'), 'w') as file:
+            json.dump(events, file, indent=4)
+
+
+def read_json_files(folder):
+    user_events = {}
+    for name in os.listdir(folder):
+        with open(os.path.join(folder, name)) as file:
+            user_events[name[:-len('.json')]] = json.load(file)
+    return user_events
+
+
+if __name__ == '__main__':
+    user_events = {f'user{i}': gitlab_events(f'user{i}', 300) for i in range(500)}
+    nb_events = sum(len(events) for events in user_events.values())
+
+    json_folder = tempfile.mkdtemp()
+    archive = EventArchive(tempfile.mkdtemp())
+
+    _, json_write = timeit(write_json_files, json_folder, user_events)
+    _, archive_write = timeit(archive.write, 'human', user_events)
+    json_events, json_read = timeit(read_json_files, json_folder)
+    archive_events, archive_read = timeit(archive.load)
+    table, projection_read = timeit(archive.read_table, None, None, ['created_at', 'project_id'])
+
+    for username, events in user_events.items():
+        assert map_events(copy.deepcopy(events), 'glmap') == map_events(archive_events[username], 'glmap')
+    assert table.num_rows == nb_events
+
+    print(f"{len(user_events)} users, {nb_events} events")
+    print(f"JSON files | write: {json_write:6.2f}s | read: {json_read:6.2f}s")
+    print(f"Archive    | write: {archive_write:6.2f}s | read: {archive_read:6.2f}s | "
+          f"read of 2 columns: {projection_read:6.2f}s")
@@ -0,0 +1,99 @@
+"""
+Benchmark of the delta refreshes of the event store (see `gitbot_utils.event_store`).
+
+A fake manager serves a timeline of events (one every 10 minutes) as the GitLab API would: `query_events` returns
+the most recent pages, `query_events_after` the events after a date from the oldest (`sort=asc`), page by page.
+A user with a long history is refreshed day by day: the time of a refresh must not depend on the size of the
+history (it is compared with the time to load the history, the former cost of a refresh). The stored events must be
+the events of the timeline, without duplicates, also when a refresh is limited to a few pages.
+"""
+
+import bisect
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from gitbot_utils.event_store import EventStore
+
+EVENTS_PER_DAY = 144
+PER_PAGE = 100
+
+
+def timeline(nb_events):
+    """
+    Events from the oldest to the most recent (one every 10 minutes from 2020-01-01).
+    """
+    start = datetime(2020, 1, 1)
+    return [{'id': i, 'created_at': (start + timedelta(minutes=10 * i)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+             'action_name': 'pushed to'} for i in range(nb_events)]
+
+
+class FakeManager:
+    """
+    Replacement of `GitLabManager` serving the first `now` events of a timeline.
+    """
+    max_queries = 3
+    max_workers = 1
+
+    def __init__(self, events):
+        self.events = events
+        self.dates = [event['created_at'] for event in events]
+        self.now = 0
+        self.nb_pages = 0
+
+    def query_events(self, contributor):
+        events = self.events[:self.now][::-1][:self.max_queries * PER_PAGE]
+        self.nb_pages += -(-len(events) // PER_PAGE)
+        return events
+
+    def query_events_after(self, contributor, after, max_pages=100):
+        # First event of the day after `after` (the dates of the timeline are sorted)
+        first = bisect.bisect_right(self.dates, f'{after}T99')
+        events = self.events[first:self.now][:max_pages * PER_PAGE]
+        self.nb_pages += -(-len(events) // PER_PAGE)
+        return events
+
+
+def check_store(store, manager):
+    events = store.load('user')
+    assert store.count('user') == len(events) == manager.now
+    assert {event['id'] for event in events} == set(range(manager.now))
+
+
+if __name__ == '__main__':
+    for nb_days in [30, 300, 1500]:
+        manager = FakeManager(timeline((nb_days + 10) * EVENTS_PER_DAY))
+        store = EventStore(tempfile.mkdtemp(), max_segments=1000)
+        manager.now = nb_days * EVENTS_PER_DAY
+        store.append('user', manager.events[:manager.now])
+
+        start = time.perf_counter()
+        store.load('user')
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(10):
+            manager.now += EVENTS_PER_DAY
+            assert store.refresh(manager, 'user', 'user') == EVENTS_PER_DAY
+        refresh_time = (time.perf_counter() - start) / 10
+        check_store(store, manager)
+        print(f"{manager.now - 10 * EVENTS_PER_DAY:>7} events stored | refresh of a day: "
+              f"{refresh_time * 1000:6.2f} ms | load of the history: {load_time * 1000:8.2f} ms")
+
+    # A refresh limited to 2 pages after 5 days without refresh: the next refreshes continue without gap
+    manager = FakeManager(timeline(20 * EVENTS_PER_DAY))
+    store = EventStore(tempfile.mkdtemp())
+    manager.now = 10 * EVENTS_PER_DAY
+    store.refresh(manager, 'user', 'user')
+    # Only the most recent events were queried (`max_queries` pages)
+    stored = {event['id'] for event in store.load('user')}
+    manager.now = 15 * EVENTS_PER_DAY
+    query_events_after = manager.query_events_after
+    manager.query_events_after = lambda contributor, after: query_events_after(contributor, after, max_pages=2)
+    nb_refreshes = 0
+    while store.refresh(manager, 'user', 'user'):
+        nb_refreshes += 1
+    new_ids = {event['id'] for event in store.load('user')} - stored
+    assert new_ids == set(range(10 * EVENTS_PER_DAY, manager.now))
+    assert store.count('user') == len(stored) + len(new_ids)
+    print(f"5 days limited to 2 pages per refresh: {nb_refreshes} refreshes, {len(new_ids)} new events, no gap")
@@ -0,0 +1,67 @@
+"""
+Benchmark of the flat array models (see `gitbot_utils.fast_model`) against the scikit-learn pipelines.
+
+- Parity: the probabilities of both versions of every model must be identical on `gitlab_glmap_features.csv`.
+- Latency: best time of a `predict_proba` call on a single contributor, and on the whole dataset.
+- Cold start: time for a new Python process to import the dependencies, load bimbas and score one contributor.
+
+The .npz files are exported with `scripts/export_models.py`.
+"""
+
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from gitbot_utils.model_registry import get_registry
+
+FEATURES_FILE = '../resources/data/gitlab/gitlab_glmap_features.csv'
+MODELS_FOLDER = '../resources/models'
+
+COLD_START = {
+    'scikit-learn': "import joblib, pandas as pd; model = joblib.load('../resources/models/bimbas.joblib')",
+    'flat arrays': "from gitbot_utils.fast_model import FastModel; import pandas as pd; "
+                   "model = FastModel('../resources/models/bimbas.npz')",
+}
+
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def cold_start(setup):
+    code = (f"import warnings; warnings.simplefilter('ignore'); {setup}; "
+            f"X = pd.read_csv('{FEATURES_FILE}')[list(model.feature_names_in_)].iloc[[0]]; model.predict_proba(X)")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore')
+    registry = get_registry(MODELS_FOLDER)
+    dataset = pd.read_csv(FEATURES_FILE)
+
+    for name in registry.names():
+        model, fast_model = registry.get(name), registry.get_compiled(name)
+        features = dataset[registry.feature_names(name)]
+        assert np.array_equal(model.predict_proba(features), fast_model.predict_proba(features)), name
+
+        one_row = features.iloc[[0]]
+        sklearn_time = best_time(lambda: model.predict_proba(one_row), 200)
+        fast_time = best_time(lambda: fast_model.predict_proba(one_row), 200)
+        sklearn_all = best_time(lambda: model.predict_proba(features), 20)
+        fast_all = best_time(lambda: fast_model.predict_proba(features), 20)
+        print(f"{name:<12} identical | 1 contributor: {sklearn_time * 1000:6.3f} ms -> {fast_time * 1000:6.3f} ms | "
+              f"{len(features)} contributors: {sklearn_all * 1000:6.2f} ms -> {fast_all * 1000:6.2f} ms")
+
+    for label, setup in COLD_START.items():
+        print(f"Cold start ({label}): {cold_start(setup):.2f}s")
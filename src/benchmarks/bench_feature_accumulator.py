@@ -0,0 +1,61 @@
+"""
+Benchmark of the incremental features (see `gitbot_utils.feature_accumulator`) against a full recompute.
+
+The activities of synthetic GitLab accounts arrive in chunks. After each chunk, the accumulator (restored from
+its JSON state, as in a monitoring loop) is updated with the new activities only, while `extract_features`
+recomputes the features from all the activities. The script reports the time of both approaches and the
+largest difference per feature:
+- when `max_exact` is larger than the number of activities, the values are kept exactly and both feature rows
+  are the same (but the state grows with the activities),
+- otherwise, the sketches are used: the state is bounded and the differences stay within the documented bounds.
+"""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from gitbot_utils import features
+from gitbot_utils.feature_accumulator import FeatureAccumulator
+from gitbot_utils.gl_api import GitLabManager
+from synthetic_events import synthetic_activities
+
+
+def stream(activities_df, nb_chunks, max_exact):
+    """
+    Features after each chunk, with the accumulator and with a full recompute, and the time of both approaches.
+    """
+    state = json.dumps(FeatureAccumulator(max_exact=max_exact).to_dict())
+    chunks = np.array_split(np.arange(len(activities_df)), nb_chunks)
+    incremental_time = recompute_time = 0
+    differences = pd.Series(0.0, index=features.FEATURES)
+    for chunk in chunks:
+        start = time.perf_counter()
+        accumulator = FeatureAccumulator.from_dict(json.loads(state))
+        accumulator.update(activities_df.iloc[chunk])
+        incremental = accumulator.to_frame('contributor').iloc[0]
+        state = json.dumps(accumulator.to_dict())
+        incremental_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        recompute = features.extract_features(activities_df.iloc[:chunk[-1] + 1], 'contributor').iloc[0]
+        recompute_time += time.perf_counter() - start
+
+        both_nan = incremental.isna() & recompute.isna()
+        differences = np.maximum(differences, (incremental - recompute).abs().where(~both_nan, 0.0))
+    return incremental_time, recompute_time, differences
+
+
+if __name__ == '__main__':
+    manager = GitLabManager()
+    activities = synthetic_activities(20_000, nb_repositories=5)
+    manager.repo_owners.set_many({repository_id: f'owner-{repository_id % 3}' for repository_id in range(5)})
+    activities_df = manager.activity_to_df(activities)
+
+    for max_exact in [100_000, 4096, 256]:
+        incremental_time, recompute_time, differences = stream(activities_df, 200, max_exact)
+        print(f"max_exact={max_exact:<7} | incremental: {incremental_time:6.2f}s | "
+              f"full recompute: {recompute_time:6.2f}s | largest difference: {differences.max():.4f} "
+              f"({differences.idxmax()})")
+        print(differences[differences > 0].round(4).to_string() if (differences > 0).any() else "  identical features")
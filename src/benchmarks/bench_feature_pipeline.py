@@ -0,0 +1,79 @@
+"""
+Benchmark of the parallel feature pipeline (see `gitbot_utils.feature_pipeline`).
+
+A synthetic event archive is built (the owners of the projects are stored in the owner cache beforehand). The
+features of its users are computed with 1 to `os.cpu_count()` workers and the output files must be identical.
+The same contributor appears in two partitions (with different events): both rows must be written. The
+resumption is checked by interrupting a run (first half of the users, then an incomplete line) and running the
+pipeline again on all the users, with a single partition kept in memory per worker.
+The runs use the native features by chunk (`native_features=True`). Without it, the features of each user come
+from `extract_features` of the manager (RABBIT by default, replaced here by the native extractor of a single user):
+the features of a chunk must be the same.
+"""
+
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from gitbot_utils import feature_pipeline, features
+from gitbot_utils.event_archive import EventArchive
+from gitbot_utils.feature_pipeline import build_features
+from gitbot_utils.owner_cache import OwnerCache
+from synthetic_events import gitlab_events
+
+NB_USERS = 2000
+NB_PROJECTS = 50
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+if __name__ == '__main__':
+    folder = tempfile.mkdtemp()
+    archive = EventArchive(os.path.join(folder, 'archive'))
+    archive.write('human', {f'user{i}': gitlab_events(f'user{i}', 300, NB_PROJECTS, seed=i)
+                            for i in range(NB_USERS)})
+    owner_cache = os.path.join(folder, 'owners.sqlite')
+    archive.write('bot_heuristic', {'user0': gitlab_events('user0', 300, NB_PROJECTS, seed=NB_USERS)})
+    OwnerCache(owner_cache).set_many({project_id: f'owner{project_id % 7}' for project_id in range(NB_PROJECTS)})
+
+    # The users without events are reported (user-missing), user0 is in both partitions
+    users = pd.DataFrame({'contributor': [f'user{i}' for i in range(NB_USERS)] + ['user-missing', 'user0'],
+                          'label': 'Human', 'partition': ['human'] * (NB_USERS + 1) + ['bot_heuristic']})
+    kwargs = {'archive_folder': archive.folder, 'manager_kwargs': {'owner_cache': owner_cache, 'native_features': True}}
+
+    outputs = {}
+    for nb_workers in sorted({1, 2, os.cpu_count()}):
+        output = os.path.join(folder, f'features-{nb_workers}.csv')
+        start = time.perf_counter()
+        nb_written, missing = build_features(users, output, nb_workers=nb_workers, **kwargs)
+        print(f"{nb_workers} workers: {time.perf_counter() - start:6.2f}s ({nb_written} users, missing: {missing})")
+        outputs[nb_workers] = read(output)
+    assert len(set(outputs.values())) == 1
+    rows = pd.read_csv(output)
+    assert len(rows) == NB_USERS + 1 and not rows.iloc[0, 2:].equals(rows.iloc[-1, 2:])
+
+    # Interrupted run: first half of the users, then an incomplete line
+    output = os.path.join(folder, 'features-resumed.csv')
+    build_features(users.iloc[:NB_USERS // 2], output, **kwargs)
+    with open(output, 'a') as file:
+        file.write('user1000,Human,12')
+    nb_written, _ = build_features(users, output, max_tables=1, **kwargs)
+    assert nb_written == NB_USERS // 2 + 1
+    assert read(output) == outputs[1]
+    print(f"Resumed run: {nb_written} users written, same output as a complete run")
+
+    # Features of each user with the extractor of the manager (without native_features)
+    chunk = users.iloc[-66:].to_dict('records')
+    feature_pipeline._init_worker(archive.folder, kwargs['manager_kwargs'], 2)
+    batch_features, batch_missing = feature_pipeline._process_chunk(chunk)
+    feature_pipeline._init_worker(archive.folder, {'owner_cache': owner_cache}, 2)
+    feature_pipeline._worker['manager'].extract_features = features.extract_features
+    user_features, user_missing = feature_pipeline._process_chunk(chunk)
+    pd.testing.assert_frame_equal(batch_features, user_features)
+    assert batch_missing == user_missing == ['user-missing']
+    print(f"Extractor of the manager: same features as the chunk pass for {len(user_features)} users")
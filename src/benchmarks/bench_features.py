@@ -0,0 +1,179 @@
+"""
+Benchmark and validation of the native feature extractor (see `gitbot_utils.features`).
+
+- Speed: time per contributor of the native extractor on synthetic GitLab accounts, compared with
+  the RABBIT extractor (`important_features.__stats`) when RABBIT is installed. The values of both extractors
+  are compared on the same activities (maximum absolute difference of each feature).
+- Batch: time of the batch extractor (`extract_features_batch`) on the concatenated activities of the same
+  accounts, compared with one call to the native extractor per contributor (the values must be identical).
+- Validation: when the event archive of the dataset exists (see `scripts/save_user_events.py`), the features
+  of each user are recomputed and compared value for value with `gitlab_glmap_features.csv`, and with the RABBIT
+  extractor on the same activities when RABBIT is installed (maximum absolute difference of each feature, and
+  time per contributor of both extractors).
+
+The native extractor stays opt-in (`native_features=True`) until both comparisons report no difference.
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from gitbot_utils import features
+from gitbot_utils.gl_api import GitLabManager
+from synthetic_events import synthetic_activities
+
+ARCHIVE_FOLDER = '../tests/gitlab_dataset/archive'
+FEATURES_FILE = '../resources/data/gitlab/gitlab_glmap_features.csv'
+
+
+def rabbit_extract_features(df, contributor):
+    """
+    Previous implementation of `APIManager.extract_features`, with the RABBIT extractor.
+    """
+    # Have to rename to avoid the problem with double underscore.
+    from important_features import __stats as stats, __convert_col_type as convert_col_type
+
+    df = df.copy()
+    df['date'] = pd.to_datetime(df.date, errors='coerce', format='%Y-%m-%dT%H:%M:%S+00:00').dt.tz_localize(None)
+    df_feat = pd.json_normalize(stats(df), sep='_')
+    df_feat['NR'] = np.int64(df['repository'].nunique())
+    return (
+        convert_col_type(df_feat)
+        .rename(columns={'feat_NA': 'NA', 'feat_NT': 'NT', 'feat_NOR': 'NOR', 'feat_ORR': 'ORR'})
+        [features.FEATURES]
+        .sort_index()
+        .set_index([[contributor]])
+    )
+
+
+def compare_values(expected, actual, tolerance=1e-3):
+    """
+    Names of the features whose values differ by more than `tolerance` (NaN only matches NaN).
+    """
+    different = []
+    for feature in features.FEATURES:
+        a, b = float(expected[feature]), float(actual[feature])
+        if np.isnan(a) != np.isnan(b) or (not np.isnan(a) and abs(a - b) > tolerance):
+            different.append(feature)
+    return different
+
+
+def max_differences(expected, actual):
+    """
+    Maximum absolute difference of each feature between two DataFrames of features (same rows).
+    A NaN that is not matched by a NaN counts as an infinite difference.
+    """
+    result = {}
+    for feature in features.FEATURES:
+        a = expected[feature].to_numpy(dtype=float)
+        b = actual[feature].to_numpy(dtype=float)
+        differences = np.where(np.isnan(a) & np.isnan(b), 0.0, np.abs(a - b))
+        result[feature] = float(np.nan_to_num(differences, nan=np.inf).max(initial=0.0))
+    return pd.Series(result)
+
+
+def print_differences(label, differences, tolerance=1e-3):
+    """
+    Print the maximum difference of each feature that differs by more than `tolerance`.
+    """
+    different = differences[differences > tolerance]
+    print(f"{label}: {len(different)}/{len(differences)} features with a maximum difference above {tolerance}")
+    for feature, difference in different.items():
+        print(f"  {feature}: {difference:.6g}")
+
+
+def synthetic_accounts(nb_accounts, nb_activities):
+    manager = GitLabManager()
+    accounts = []
+    for seed in range(nb_accounts):
+        activities = synthetic_activities(nb_activities, nb_repositories=1 + seed % 20, seed=seed)
+        manager.repo_owners.set_many({activity['repository']['id']: f"owner{activity['repository']['id'] % 7}"
+                                      for activity in activities})
+        accounts.append(manager.activity_to_df(activities).assign(contributor=f'contributor{seed}'))
+    return accounts
+
+
+def bench_speed(nb_accounts=200, nb_activities=300):
+    accounts = synthetic_accounts(nb_accounts, nb_activities)
+
+    start = time.perf_counter()
+    native = [features.extract_features(df, 'contributor') for df in accounts]
+    native_time = (time.perf_counter() - start) / nb_accounts
+    print(f"Native extractor: {native_time * 1000:7.3f} ms per contributor")
+
+    try:
+        start = time.perf_counter()
+        rabbit = [rabbit_extract_features(df, 'contributor') for df in accounts]
+        rabbit_time = (time.perf_counter() - start) / nb_accounts
+    except ImportError:
+        print("RABBIT is not installed: skipping the comparison with its extractor.")
+        return
+    print(f"RABBIT extractor: {rabbit_time * 1000:7.3f} ms per contributor (x{rabbit_time / native_time:.1f})")
+    nb_different = sum(bool(compare_values(r.iloc[0], n.iloc[0])) for r, n in zip(rabbit, native))
+    print(f"Contributors with different values: {nb_different}/{nb_accounts}")
+    print_differences("Synthetic accounts, native vs RABBIT", max_differences(pd.concat(rabbit), pd.concat(native)))
+
+
+def bench_batch(nb_accounts=2000, nb_activities=300):
+    accounts = synthetic_accounts(nb_accounts, nb_activities)
+
+    start = time.perf_counter()
+    native = pd.concat([features.extract_features(df, df['contributor'].iloc[0]) for df in accounts])
+    native_time = time.perf_counter() - start
+
+    activities_df = pd.concat(accounts, ignore_index=True)
+    start = time.perf_counter()
+    batch = features.extract_features_batch(activities_df)
+    batch_time = time.perf_counter() - start
+
+    assert list(batch.index) == list(native.index)
+    pd.testing.assert_frame_equal(batch, native, check_names=False)
+    print(f"{nb_accounts} contributors | one call per contributor: {native_time:6.2f}s | "
+          f"batch: {batch_time:6.2f}s | x{native_time / batch_time:.1f}")
+
+
+def validate_dataset():
+    if not os.path.isdir(ARCHIVE_FOLDER):
+        print(f"No event archive in {ARCHIVE_FOLDER}: skipping the validation against {FEATURES_FILE}.")
+        return
+    from gitbot_utils.event_archive import EventArchive
+
+    manager = GitLabManager(owner_cache='../resources/data/gitlab/repo_owners.sqlite')
+    expected = pd.read_csv(FEATURES_FILE).drop_duplicates('contributor').set_index('contributor')
+    archive = EventArchive(ARCHIVE_FOLDER)
+    accounts = []
+    for origin in archive.origins():
+        for username, events in archive.load(origin).items():
+            if username in expected.index:
+                accounts.append(manager.activity_to_df(manager.events_to_activities(events)).assign(
+                    contributor=username))
+
+    start = time.perf_counter()
+    native = pd.concat([features.extract_features(df, df['contributor'].iloc[0]) for df in accounts])
+    native_time = (time.perf_counter() - start) / max(len(accounts), 1)
+    mismatches = {username: compare_values(expected.loc[username], native.loc[username]) for username in native.index}
+    mismatches = {username: different for username, different in mismatches.items() if different}
+    print(f"Users validated against {FEATURES_FILE}: {len(native)}, with different values: {len(mismatches)}")
+    for username, different in list(mismatches.items())[:10]:
+        print(f"  {username}: {', '.join(different)}")
+    print_differences(f"Native vs {os.path.basename(FEATURES_FILE)}",
+                      max_differences(expected.loc[native.index], native))
+
+    try:
+        start = time.perf_counter()
+        rabbit = pd.concat([rabbit_extract_features(df, df['contributor'].iloc[0]) for df in accounts])
+        rabbit_time = (time.perf_counter() - start) / max(len(accounts), 1)
+    except ImportError:
+        print("RABBIT is not installed: skipping the comparison with its extractor on the archived events.")
+        return
+    print(f"Archived events: native {native_time * 1000:.3f} ms, RABBIT {rabbit_time * 1000:.3f} ms per contributor "
+          f"(x{rabbit_time / native_time:.1f})")
+    print_differences("Native vs RABBIT on the archived events", max_differences(rabbit, native))
+
+
+if __name__ == '__main__':
+    bench_speed()
+    bench_batch()
+    validate_dataset()
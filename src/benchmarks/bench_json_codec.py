@@ -0,0 +1,76 @@
+"""
+Benchmark of the JSON decoding of the pages of events (see `gitbot_utils.json_codec`).
+
+Pages of 100 synthetic GitLab events are decoded with each parser installed (`loads`) and with the decoders
+keeping only the fields used by glmap (`EventDecoder`, with msgspec structs if installed and by pruning the decoded
+events). The memory used by the decoded events is measured with tracemalloc.
+
+The events must be the same with every parser, the pruned events the same with both decoders, and the pruned events
+must be mapped to the same activities as the whole events (glmap for GitLab, ghmap for GitHub).
+"""
+
+import json
+import time
+import tracemalloc
+
+from gitbot_utils import json_codec
+from gitbot_utils.json_codec import EventDecoder
+from gitbot_utils.mapping import map_events
+from synthetic_events import github_events, gitlab_events
+
+NB_PAGES = 3000
+PAGE_SIZE = 100
+
+
+def pages_of(events):
+    return [json.dumps(events[i:i + PAGE_SIZE]).encode() for i in range(0, len(events), PAGE_SIZE)]
+
+
+def timed(label, function, pages):
+    start = time.perf_counter()
+    result = [function(page) for page in pages]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:6.2f}s ({len(pages) * PAGE_SIZE / elapsed:10,.0f} events/s)")
+    return result
+
+
+def memory(function, pages):
+    """
+    Memory (MB) used by the decoded pages.
+    """
+    tracemalloc.start()
+    result = [function(page) for page in pages]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size / 2 ** 20
+
+
+if __name__ == '__main__':
+    events = [event for i in range(NB_PAGES * PAGE_SIZE // 1000) for event in gitlab_events(f'user{i}', 1000, seed=i)]
+    pages = pages_of(events)
+    print(f"{len(pages)} pages of {PAGE_SIZE} GitLab events, {sum(map(len, pages)) / 2 ** 20:.0f} MB")
+
+    expected = timed("json (standard library)", json.loads, pages)
+    for backend in json_codec.available_backends():
+        json_codec.set_backend(backend)
+        assert timed(f"loads, {backend}", json_codec.loads, pages) == expected
+    json_codec.set_backend()
+
+    decoder = EventDecoder.of_mapping('glmap')
+    pruned = timed(f"EventDecoder, {'msgspec' if json_codec.msgspec else 'pruning'}", decoder.decode, pages)
+    pruning_decoder = EventDecoder.of_mapping('glmap')
+    pruning_decoder._decoder = None
+    assert timed("EventDecoder, pruning", pruning_decoder.decode, pages) == pruned
+    print(f"Memory: whole events {memory(json_codec.loads, pages):.0f} MB, "
+          f"glmap fields {memory(decoder.decode, pages):.0f} MB")
+
+    # Same activities with the whole and the pruned events (the events are modified by the mapping)
+    for i in range(0, len(pages), 100):
+        assert map_events(json.loads(pages[i]), 'glmap') == map_events(decoder.decode(pages[i]), 'glmap')
+
+    github_pages = pages_of([event for i in range(20) for event in github_events(f'user{i}', 300, seed=i)])
+    github_decoder = EventDecoder.of_mapping('ghmap')
+    for page in github_pages:
+        assert map_events(json.loads(page), 'ghmap') == map_events(github_decoder.decode(page), 'ghmap')
+    print(f"Same activities ({len(pages) // 100} GitLab pages, {len(github_pages)} GitHub pages)")
@@ -0,0 +1,44 @@
+"""
+Benchmark of the batch scoring (`model_utils.predict_contributors`) against one `predict_contributor` call per
+contributor and per model (as in `create_gitlab_dataset.label_contributor` before).
+
+The population is made of the rows of `gitlab_glmap_features.csv` repeated up to 50k contributors. The labels
+and confidences of both approaches are compared on a sample, and the time of the per-contributor approach is
+extrapolated from this sample.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import gitbot_utils.model_utils as mod
+from gitbot_utils.features import FEATURES
+from gitbot_utils.model_registry import get_model
+
+FEATURES_FILE = '../resources/data/gitlab/gitlab_glmap_features.csv'
+MODELS_FOLDER = '../resources/models'
+
+
+if __name__ == '__main__':
+    models = {name: get_model(name, MODELS_FOLDER) for name in ['bimbis', 'bimbas']}
+    dataset = pd.read_csv(FEATURES_FILE)[FEATURES]
+    population = dataset.iloc[np.arange(50_000) % len(dataset)].reset_index(drop=True)
+
+    sample = population.iloc[:1000]
+    start = time.perf_counter()
+    expected = {name: [mod.predict_contributor(sample.iloc[[i]], model) for i in range(len(sample))]
+                for name, model in models.items()}
+    loop_time = (time.perf_counter() - start) * len(population) / len(sample)
+
+    start = time.perf_counter()
+    predictions = mod.predict_contributors(population, models)
+    batch_time = time.perf_counter() - start
+
+    for name in models:
+        labels, confidences = zip(*expected[name])
+        assert list(predictions[f'{name}_label'].iloc[:len(sample)]) == list(labels)
+        assert np.array_equal(predictions[f'{name}_conf'].iloc[:len(sample)], confidences)
+    print(f"{len(population)} contributors, {len(models)} models | one call per contributor: ~{loop_time:6.1f}s "
+          f"(extrapolated) | batch: {batch_time:6.2f}s | x{loop_time / batch_time:.0f}")
+    print(predictions['label'].value_counts().to_string())
@@ -0,0 +1,68 @@
+"""
+Checks of the repository owners cache (see `gitbot_utils.owner_cache`).
+
+- The project ids given as strings and as integers are the same projects, also after a reload of the database.
+- The projects that could not be queried (404 of the stub server) are not queried again before `failure_ttl`:
+  the second lookup is answered while the server is stopped.
+- Time of `get_many` on a reloaded database (cold) then in memory (warm).
+"""
+
+import os
+import tempfile
+import time
+
+from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.owner_cache import OwnerCache
+from stub_server import start_server
+
+NB_PROJECTS = 50_000
+
+
+def check_ids(path):
+    """
+    Owners set and get with string and integer ids, before and after a reload.
+    """
+    cache = OwnerCache(path)
+    cache.set_many({'123': 'owner-a', 7: 'owner-b'})
+    for owners in (cache, OwnerCache(path)):
+        assert owners.get_many(['123', 123, '7', 8]) == {'123': 'owner-a', 123: 'owner-a', '7': 'owner-b'}
+        assert '7' in owners and owners[123] == 'owner-a'
+    print("ids: '123' and 123 are the same project after a reload")
+
+
+def check_failures(path):
+    """
+    Failed lookups stored without owner until `failure_ttl`.
+    """
+    server = start_server(latency=0, fail_status=404)
+    manager = GitLabManager(query_root=f'http://127.0.0.1:{server.server_address[1]}/api/v4', owner_cache=path)
+    assert manager.query_repo_owners([1, 2]) == {1: None, 2: None}
+    server.shutdown()
+    server.server_close()
+
+    # The server is stopped: the projects must come from the cache (a request would raise a connection error)
+    reloaded = GitLabManager(query_root=manager.query_root, owner_cache=OwnerCache(path))
+    assert reloaded.query_repo_owners(['1', 2]) == {'1': None, 2: None}
+    assert OwnerCache(path, failure_ttl=0).get_many([1, 2]) == {}
+    # An owner found later replaces the failed lookup
+    reloaded.repo_owners.set_many({1: 'owner-c'})
+    assert OwnerCache(path).get_many([1, 2]) == {1: 'owner-c', 2: None}
+    print("failures: not queried again before failure_ttl, replaced by the owner found later")
+
+
+def time_get_many(path):
+    OwnerCache(path).set_many({project_id: f'owner-{project_id % 300}' for project_id in range(NB_PROJECTS)})
+    ids = [str(project_id) for project_id in range(NB_PROJECTS)]
+    cache = OwnerCache(path)
+    for label in ['cold', 'warm']:
+        start = time.perf_counter()
+        found = cache.get_many(ids)
+        assert len(found) == NB_PROJECTS
+        print(f"get_many {NB_PROJECTS} string ids ({label}): {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == '__main__':
+    folder = tempfile.mkdtemp()
+    check_ids(os.path.join(folder, 'ids.sqlite'))
+    check_failures(os.path.join(folder, 'failures.sqlite'))
+    time_get_many(os.path.join(folder, 'timing.sqlite'))
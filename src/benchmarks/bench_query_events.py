@@ -0,0 +1,91 @@
+"""
+Benchmark of the event fetching of the API managers against the local stub server (see `stub_server.py`).
+
+It compares the sequential `query_events` loop with `query_events_many` (threads and asyncio) and checks that
+they all return the same events. The members and contributors of projects queried by the synchronous and
+asynchronous managers of `scripts/create_gitlab_dataset.py` (same pagers) must also be the same.
+"""
+
+import asyncio
+import sys
+import time
+
+from gitbot_utils.gh_api import GitHubManager
+from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.gl_async import AsyncGitLabManager
+from stub_server import start_server
+
+sys.path.append('../scripts')
+from create_gitlab_dataset import AsyncContributorManager, ContributorManager  # noqa: E402
+
+
+def compare(label, manager, contributors):
+    """
+    Query the events of the contributors sequentially then concurrently and print the execution times.
+    """
+    start = time.perf_counter()
+    sequential = {contributor: manager.query_events(contributor) for contributor in contributors}
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = manager.query_events_many(contributors)
+    concurrent_time = time.perf_counter() - start
+
+    assert sequential == concurrent
+    assert list(concurrent) == list(contributors)
+    nb_events = sum(len(events) for events in concurrent.values())
+    print(f"{label:<8} {len(contributors)} users, {nb_events} events | sequential: {sequential_time:7.2f}s | "
+          f"concurrent ({manager.max_workers} workers): {concurrent_time:7.2f}s")
+    return concurrent
+
+
+def compare_async(manager, contributors, expected, max_concurrency=200):
+    """
+    Query the events of the contributors with `AsyncGitLabManager` and print the execution time.
+    """
+    async def query():
+        async with AsyncGitLabManager(manager, max_concurrency=max_concurrency) as async_manager:
+            return await async_manager.query_events_many(contributors)
+
+    start = time.perf_counter()
+    results = asyncio.run(query())
+    async_time = time.perf_counter() - start
+
+    assert results == expected
+    print(f"{'GitLab':<8} {len(contributors)} users | asyncio ({max_concurrency} in flight): {async_time:7.2f}s")
+
+
+def compare_repo_queries(root, project_ids):
+    """
+    Query the members and contributors of projects with `ContributorManager` and `AsyncContributorManager`.
+    """
+    manager = ContributorManager(query_root=root, max_queries=5)
+    expected = [(manager.query_repo_members(project_id), manager.query_repo_contributors(project_id))
+                for project_id in project_ids]
+
+    async def query():
+        async with AsyncContributorManager(manager) as async_manager:
+            return await asyncio.gather(*(
+                asyncio.gather(async_manager.query_repo_members(project_id),
+                               async_manager.query_repo_contributors(project_id))
+                for project_id in project_ids))
+
+    results = [tuple(result) for result in asyncio.run(query())]
+    assert results == expected
+    nb_members = sum(len(members) for members, _ in expected)
+    nb_contributors = sum(len(contributors) for _, contributors in expected)
+    print(f"{'GitLab':<8} {len(project_ids)} projects | {nb_members} members, {nb_contributors} contributors "
+          f"(same with the sync and asyncio managers)")
+
+
+if __name__ == '__main__':
+    server = start_server(latency=0.05)
+    root = f'http://127.0.0.1:{server.server_address[1]}'
+    users = [f'user{i}' for i in range(100)]
+
+    gl_manager = GitLabManager(query_root=f'{root}/api/v4', max_workers=16)
+    gl_events = compare('GitLab', gl_manager, users)
+    compare_async(gl_manager, users, gl_events)
+    compare_repo_queries(f'{root}/api/v4', list(range(1, 21)))
+    compare('GitHub', GitHubManager(query_root=root, max_workers=16), users)
+    server.shutdown()
@@ -0,0 +1,133 @@
+"""
+Checks of the rate limiter of the API managers (see `gitbot_utils.rate_limit`) against the local stub server
+(see `stub_server.py`) when the transport raises.
+
+A request that gets no response (connection refused, cancelled request) must not stay in flight in the rate limiter:
+while the quota of a token is unknown, a single request is sent at a time, so a request left in flight would block
+the next ones forever. The next requests must be sent without waiting once the server is back.
+
+A request still failing after the retries (503 for every request) must raise a `RetryError`, instead of returning
+an empty page that would end the pagination as if all the events were queried.
+"""
+
+import asyncio
+import threading
+import time
+
+import requests
+
+from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.gl_async import AsyncGitLabManager
+from gitbot_utils.rate_limit import RetryError
+from stub_server import start_server
+
+# Maximum time (in seconds) to get the events of a user once the server is back
+TIMEOUT = 5
+
+
+def stopped_server():
+    """
+    Start then stop a stub server, to get a port on which the connections are refused.
+    """
+    server = start_server(latency=0)
+    server.shutdown()
+    server.server_close()
+    return server.server_address[1]
+
+
+def query_with_timeout(manager, contributor):
+    """
+    Query the events of a contributor in a thread and return them (None if it takes more than `TIMEOUT` seconds).
+    """
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(events=manager.query_events(contributor)), daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    return result.get('events')
+
+
+def check_sync():
+    """
+    Connection refused with `GitLabManager._request`, then the same manager once the server is back.
+    """
+    port = stopped_server()
+    manager = GitLabManager(query_root=f'http://127.0.0.1:{port}/api/v4', api_key='sync-token')
+    try:
+        manager.query_events('user1')
+        raise AssertionError("The connection should be refused")
+    except requests.ConnectionError:
+        pass
+    limiter = manager.token_pool.limiter('sync-token')
+    assert limiter._in_flight == 0
+
+    server = start_server(port=port, latency=0, rate_limit=100)
+    start = time.perf_counter()
+    events = query_with_timeout(manager, 'user1')
+    assert events is not None, "The requests are blocked by the failed request"
+    print(f"sync   connection refused then {len(events)} events in {time.perf_counter() - start:.2f}s")
+    server.shutdown()
+
+
+def check_async():
+    """
+    Connection refused and cancelled request with `AsyncGitLabManager._get`, then the same manager.
+    """
+    port = stopped_server()
+    manager = GitLabManager(query_root=f'http://127.0.0.1:{port}/api/v4', api_key='async-token')
+    limiter = manager.token_pool.limiter('async-token')
+
+    async def query():
+        async with AsyncGitLabManager(manager) as async_manager:
+            try:
+                await async_manager.query_events('user1')
+                raise AssertionError("The connection should be refused")
+            except OSError:
+                pass
+            assert limiter._in_flight == 0
+
+            server = start_server(port=port, latency=1, rate_limit=100)
+            try:
+                await asyncio.wait_for(async_manager.query_events('user1'), timeout=0.2)
+                raise AssertionError("The request should be cancelled")
+            except asyncio.TimeoutError:
+                pass
+            assert limiter._in_flight == 0
+
+            server.RequestHandlerClass.latency = 0
+            start = time.perf_counter()
+            events = await asyncio.wait_for(async_manager.query_events('user1'), timeout=TIMEOUT)
+            print(f"async  connection refused, cancelled request then {len(events)} events in "
+                  f"{time.perf_counter() - start:.2f}s")
+            server.shutdown()
+
+    asyncio.run(query())
+
+
+def check_retries():
+    """
+    Server answering 503 to every request, with the sync and async managers.
+    """
+    server = start_server(latency=0, fail_status=503)
+    manager = GitLabManager(query_root=f'http://127.0.0.1:{server.server_address[1]}/api/v4', api_key='retry-token')
+    limiter = manager.token_pool.limiter('retry-token')
+    limiter.max_retries, limiter.backoff_base = 2, 0.01
+
+    async def query():
+        async with AsyncGitLabManager(manager) as async_manager:
+            return await async_manager.query_events('user1')
+
+    for label, query_events in [('sync', lambda: manager.query_events('user1')),
+                                ('async', lambda: asyncio.run(query()))]:
+        try:
+            query_events()
+            raise AssertionError("The failed page should raise")
+        except RetryError as e:
+            assert e.status == 503
+            print(f"{label:<6} {e}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    check_sync()
+    check_async()
+    check_retries()
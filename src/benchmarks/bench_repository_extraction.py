@@ -0,0 +1,107 @@
+"""
+Benchmark of the repository extraction (`scripts/extract_gitlab_repositories.py`) against the local stub server
+(see `stub_server.py`).
+
+The streaming extraction (offset pagination with prefetching, and keyset pagination) is compared to the previous
+extraction (sequential pages, linear search of the id in a DataFrame and rewrite of the whole file for each
+repository). The files must be the same. With drifting offset pages (overlapping), the duplicates must be skipped.
+An interrupted keyset extraction must resume after the smallest id of the file, and a server answering 503 must
+raise a `RetryError` after the retries (not end the extraction as if there were no more repositories).
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from gitbot_utils.rate_limit import RateLimiter, RetryError
+from stub_server import start_server
+
+sys.path.append('../scripts')
+import extract_gitlab_repositories as egr  # noqa: E402
+
+NB_PROJECTS = 3000
+
+
+def previous_extraction(query_root, path, max_queries=1000):
+    """
+    Extraction as done before (see the module documentation).
+    """
+    df_repo = None
+    for page in range(1, max_queries + 1):
+        repositories = egr.query_repository_page(page, query_root=query_root)
+        if repositories is None or len(repositories) == 0:
+            break
+        for repository in repositories:
+            repo_data = egr.parse_repository_data(repository)
+            if df_repo is not None and repo_data['id'] in df_repo['id'].values:
+                continue
+            if df_repo is None:
+                df_repo = pd.DataFrame([repo_data])
+            else:
+                df_repo = pd.concat([df_repo, pd.DataFrame([repo_data])], ignore_index=True)
+            df_repo.to_csv(path, index=False)
+
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+def timed(label, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    print(f"{label:<32} {time.perf_counter() - start:6.2f}s")
+    return result
+
+
+if __name__ == '__main__':
+    folder = tempfile.mkdtemp()
+    server = start_server(latency=0.05, nb_projects=NB_PROJECTS)
+    root = f'http://127.0.0.1:{server.server_address[1]}/api/v4'
+
+    previous_path = os.path.join(folder, 'previous.csv')
+    timed("previous extraction", previous_extraction, root, previous_path)
+    for prefetch in [1, 8]:
+        path = os.path.join(folder, f'offset-{prefetch}.csv')
+        timed(f"offset pagination, prefetch={prefetch}", egr.extract_repositories, path=path, prefetch=prefetch,
+              query_root=root)
+        assert read(path) == read(previous_path)
+    keyset_path = os.path.join(folder, 'keyset.csv')
+    timed("keyset pagination", egr.extract_repositories, path=keyset_path, pagination='keyset', query_root=root)
+    assert read(keyset_path) == read(previous_path)
+
+    # Restart on an existing file: nothing new
+    assert egr.extract_repositories(path=keyset_path, pagination='keyset', query_root=root) == 0
+
+    # Keyset extraction interrupted after 10 pages: each restart continues after the smallest id of the file
+    resumed_path = os.path.join(folder, 'keyset-resumed.csv')
+    assert egr.extract_repositories(path=resumed_path, pagination='keyset', max_queries=10, query_root=root) == 1000
+    assert egr.extract_repositories(path=resumed_path, pagination='keyset', max_queries=10, query_root=root) == 1000
+    egr.extract_repositories(path=resumed_path, pagination='keyset', query_root=root)
+    assert read(resumed_path) == read(previous_path)
+    print("Interrupted keyset extraction: resumed after the smallest id, same file")
+
+    # Unavailable server: the extraction fails instead of stopping as if it were complete
+    failing_server = start_server(latency=0, fail_status=503)
+    failing_root = f'http://127.0.0.1:{failing_server.server_address[1]}/api/v4'
+    for pagination in ['offset', 'keyset']:
+        try:
+            egr.extract_repositories(path=os.path.join(folder, f'failing-{pagination}.csv'), pagination=pagination,
+                                     query_root=failing_root, limiter=RateLimiter(max_retries=2, backoff_base=0.01))
+            raise AssertionError("The extraction must fail")
+        except RetryError as e:
+            assert e.status == 503
+    print("Unavailable server: RetryError after the retries (offset and keyset pagination)")
+
+    # Offset pages drifting by 20 projects per request: the repositories of the overlapping pages are skipped
+    drift_server = start_server(latency=0.05, nb_projects=NB_PROJECTS, drift=20)
+    drift_root = f'http://127.0.0.1:{drift_server.server_address[1]}/api/v4'
+    drift_path = os.path.join(folder, 'drift.csv')
+    egr.extract_repositories(path=drift_path, prefetch=1, query_root=drift_root)
+    ids = pd.read_csv(drift_path)['id']
+    assert ids.is_unique and len(ids) == NB_PROJECTS
+    print(f"Drifting offset pages: {drift_server.nb_project_requests - 1} pages for {len(ids)} repositories "
+          f"(without drift: {NB_PROJECTS // 100})")
@@ -0,0 +1,57 @@
+"""
+Benchmark of the response cache of the API managers (see `gitbot_utils.http_cache`) against the local stub server.
+
+The events of the same users are queried three times: without cache entries (cold), with the cache validated by
+conditional requests (warm, the unchanged pages come back as 304), and from the cache only (offline).
+"""
+
+import asyncio
+import tempfile
+import time
+
+from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.gl_async import AsyncGitLabManager
+from gitbot_utils.http_cache import ResponseCache
+from stub_server import start_server
+
+
+def run(label, manager, contributors, server):
+    """
+    Query the events of the contributors and print the execution time and the number of 304 responses.
+    """
+    nb_304 = server.nb_304
+    start = time.perf_counter()
+    events = manager.query_events_many(contributors)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {elapsed:7.2f}s | 304 responses: {server.nb_304 - nb_304}")
+    return events
+
+
+def run_async(manager, contributors):
+    """
+    Query the events of the contributors with `AsyncGitLabManager`.
+    """
+    async def query():
+        async with AsyncGitLabManager(manager) as async_manager:
+            return await async_manager.query_events_many(contributors)
+
+    return asyncio.run(query())
+
+
+if __name__ == '__main__':
+    server = start_server(latency=0.05)
+    root = f'http://127.0.0.1:{server.server_address[1]}'
+    users = [f'user{i}' for i in range(100)]
+    cache = ResponseCache(tempfile.mkdtemp())
+
+    manager = GitLabManager(query_root=f'{root}/api/v4', max_workers=16, response_cache=cache)
+    cold = run('cold', manager, users, server)
+    warm = run('warm', manager, users, server)
+    cache.offline = True
+    offline = run('offline', manager, users, server)
+    assert cold == warm == offline
+
+    assert run_async(manager, users) == cold
+    cache.offline = False
+    assert run_async(manager, users) == cold
+    server.shutdown()
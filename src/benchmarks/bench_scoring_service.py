@@ -0,0 +1,115 @@
+"""
+Load test of the local scoring service (see `gitbot_utils.scoring_service`).
+
+Concurrent clients post the raw GitLab events of synthetic users (the owners of the projects come from the
+stub server, queried during a warm-up where the requests are retried until the owners are known). The client-side
+latency percentiles and the per-stage latencies of the service are compared without micro-batching
+(`max_batch_size=1`) and with micro-batching, with the native features (`native_features=True`).
+The requests of a manager without `native_features` must go through its `extract_features` (RABBIT by default,
+replaced here by a counting extractor returning the native features) and give the same predictions.
+"""
+
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from gitbot_utils import features
+from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.scoring_service import ScoringService
+from stub_server import start_server
+from synthetic_events import gitlab_events
+
+
+def load_test(port, bodies, nb_clients, retry_pending=False):
+    """
+    Post all the bodies with `nb_clients` concurrent clients (one keep-alive connection each).
+    With `retry_pending`, the requests answered while the owners of their projects are queried are sent again.
+
+    Returns:
+        The latency of each request (ms) and the number of requests per second
+    """
+    chunks = [bodies[i::nb_clients] for i in range(nb_clients)]
+
+    def client(chunk):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        latencies = []
+        for body in chunk:
+            start = time.perf_counter()
+            connection.request('POST', '/predict', body=body, headers={'Content-Type': 'application/json'})
+            response = json.loads(connection.getresponse().read())
+            while retry_pending and response['label'] is None:
+                time.sleep(0.05)
+                connection.request('POST', '/predict', body=body, headers={'Content-Type': 'application/json'})
+                response = json.loads(connection.getresponse().read())
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response['label'] in ('Bot', 'Human', 'Unknown'), response
+        connection.close()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(nb_clients) as executor:
+        latencies = [latency for chunk in executor.map(client, chunks) for latency in chunk]
+    return np.array(latencies), len(bodies) / (time.perf_counter() - start)
+
+
+class CountingManager(GitLabManager):
+    """
+    GitLab manager without `native_features` counting the calls to `extract_features`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nb_extractions = 0
+
+    def extract_features(self, df, contributor):
+        self.nb_extractions += 1
+        return features.extract_features(df, contributor)
+
+
+def check_extractor(native_manager, bodies):
+    """
+    The requests of a manager without `native_features` use its extractor, with the same predictions
+    (the owners come from the cache of `native_manager`, filled by the load tests).
+    """
+    results = {}
+    counting_manager = CountingManager(query_root=native_manager.query_root, owner_cache=native_manager.repo_owners)
+    for manager in [native_manager, counting_manager]:
+        service = ScoringService({'gitlab': manager}, models=('bimbas',), models_folder='../resources/models')
+        results[type(manager).__name__] = [
+            {key: value for key, value in service.predict(**json.loads(body)).items() if key != 'timings'}
+            for body in bodies]
+    assert counting_manager.nb_extractions == len(bodies)
+    assert results['GitLabManager'] == results['CountingManager']
+    print(f"Extractor of the manager: {len(bodies)} calls, same predictions as the native batch path")
+
+
+if __name__ == '__main__':
+    stub = start_server(latency=0)
+    manager = GitLabManager(query_root=f'http://127.0.0.1:{stub.server_address[1]}/api/v4', native_features=True)
+    bodies = [json.dumps({'platform': 'gitlab', 'contributor': f'user{i}',
+                          'events': gitlab_events(f'user{i}', 100, seed=i)}) for i in range(400)]
+
+    for max_batch_size in [1, 32]:
+        service = ScoringService({'gitlab': manager}, models=('bimbas',), models_folder='../resources/models',
+                                 max_batch_size=max_batch_size)
+        server = service.serve(port=0)
+        port = server.server_address[1]
+        load_test(port, bodies[:50], 4, retry_pending=True)  # warm-up (owners of the projects)
+        service.latencies = {stage: type(latencies)(maxlen=latencies.maxlen)
+                             for stage, latencies in service.latencies.items()}
+        for nb_clients in [1, 4, 16]:
+            latencies, throughput = load_test(port, bodies, nb_clients)
+            p50, p99 = np.percentile(latencies, [50, 99])
+            print(f"max_batch_size={max_batch_size:<3} clients={nb_clients:<3} | p50: {p50:6.2f} ms | "
+                  f"p99: {p99:6.2f} ms | {throughput:6.0f} requests/s")
+        stats = service.stats()
+        print("  service stages (p50/p99 ms): " + ", ".join(
+            f"{stage} {stats[stage]['p50']:.2f}/{stats[stage]['p99']:.2f}" for stage in
+            ['mapping', 'owners', 'queue', 'features', 'prediction', 'total']) +
+            f" | mean batch: {stats['mean_batch_size']:.1f}")
+        server.shutdown()
+
+    check_extractor(manager, bodies[:50])
@@ -0,0 +1,225 @@
+"""
+Local stub HTTP server mimicking the `/users/{id}/events` endpoints of the GitLab and GitHub APIs.
+
+- GitLab: `/api/v4/users/{id}/events` (pagination with the `X-Next-Page` header)
+- GitHub: `/users/{id}/events` (pagination with the `Link` header)
+- GitLab: `/api/v4/projects/{id}` (namespace of the project only)
+- GitLab: `/api/v4/projects/{id}/members/all` and `/api/v4/projects/{id}/events` (page pagination, an empty page
+  after the last one; one author in three of the events has a bot-like name)
+- GitLab: `/api/v4/projects` (list of `nb_projects` projects, offset pagination with `page` or keyset pagination
+  with `pagination=keyset`, `order_by=id` and `sort=desc`). With `drift`, `drift` projects move up the list after
+  each offset request (as projects updated during a crawl sorted by `updated_at`), so offset pages overlap.
+
+Each user has a deterministic number of events (between 0 and `max_events`) derived from its id,
+so that the results of different fetch strategies can be compared.
+
+With `rate_limit`, the server sends GitLab-like `RateLimit-*` headers and answers 429 when more than `rate_limit`
+requests of the same token (`Private-Token` header) are received in a window of `window` seconds
+(the number of 429 responses is kept in `server.nb_429`). The tokens in `revoked_tokens` are answered with 401.
+With `fail_status`, every request is answered with this status (ex: 503 for an unavailable server).
+
+Every body has an `ETag`, and requests with a matching `If-None-Match` are answered with a 304 without body
+(the number of 304 responses is kept in `server.nb_304`).
+"""
+
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def nb_user_events(user, max_events):
+    """
+    Deterministic number of events of a user.
+    """
+    return zlib.crc32(str(user).encode()) % (max_events + 1)
+
+
+def make_event(user, index, gitlab):
+    """
+    Build a minimal event of a user (GitLab or GitHub format).
+    """
+    date = f"2025-01-{1 + index % 28:02d}T{index % 24:02d}:00:00Z"
+    if gitlab:
+        return {'id': index, 'project_id': index % 5, 'action_name': 'pushed to', 'target_type': None,
+                'author': {'id': 1, 'username': str(user)}, 'push_data': {'action': 'pushed'}, 'created_at': date}
+    return {'id': str(index), 'type': 'PushEvent', 'actor': {'id': 1, 'login': str(user)},
+            'repo': {'id': index % 5, 'name': f'owner/repo{index % 5}'}, 'payload': {}, 'created_at': date}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    max_events = 350
+    latency = 0.05
+
+    def _rate_limit_headers(self):
+        """
+        Count the request in the current window and return the rate limit headers (None if the limit is exceeded).
+        """
+        server = self.server
+        if server.rate_limit is None:
+            return {}
+        with server.lock:
+            token = self.headers.get('Private-Token')
+            now = time.time()
+            window_reset, window_count = server.windows.get(token, (0, 0))
+            if now >= window_reset:
+                window_reset, window_count = int(now) + server.window, 0
+            window_count += 1
+            server.windows[token] = (window_reset, window_count)
+            remaining = server.rate_limit - window_count
+            headers = {'RateLimit-Limit': str(server.rate_limit), 'RateLimit-Remaining': str(max(remaining, 0)),
+                       'RateLimit-Reset': str(window_reset)}
+            if remaining < 0:
+                server.nb_429 += 1
+                return None
+            return headers
+
+    def do_GET(self):
+        if self.headers.get('Private-Token') in self.server.revoked_tokens:
+            self.send_response(401)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.server.fail_status is not None:
+            self.send_response(self.server.fail_status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        rate_limit_headers = self._rate_limit_headers()
+        if rate_limit_headers is None:
+            self.send_response(429)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.rate_limit_headers = rate_limit_headers
+
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        gitlab = parts[:2] == ['api', 'v4']
+        if gitlab:
+            parts = parts[2:]
+        if gitlab and parts == ['projects']:
+            self._send_projects(parse_qs(url.query))
+            return
+        if gitlab and len(parts) == 2 and parts[0] == 'projects':
+            time.sleep(self.latency)
+            self._send_json({'id': int(parts[1]), 'namespace': {'path': f'owner-{parts[1]}'}})
+            return
+        if gitlab and len(parts) >= 3 and parts[0] == 'projects' and parts[2:] in (['members', 'all'], ['events']):
+            self._send_project_page(parts[1], parts[2], parse_qs(url.query))
+            return
+        if len(parts) != 3 or parts[0] != 'users' or parts[2] != 'events':
+            self.send_error(404)
+            return
+
+        params = parse_qs(url.query)
+        page = int(params.get('page', ['1'])[0])
+        per_page = int(params.get('per_page', ['20'])[0])
+        total = nb_user_events(parts[1], self.max_events)
+        start = (page - 1) * per_page
+        events = [make_event(parts[1], i, gitlab) for i in range(start, min(start + per_page, total))]
+
+        time.sleep(self.latency)
+        has_next = start + per_page < total
+        if gitlab:
+            headers = {'X-Page': str(page), 'X-Next-Page': str(page + 1) if has_next else ''}
+        else:
+            headers = {'Link': f'<{url.path}?page={page + 1}>; rel="next"'} if has_next else {}
+        self._send_json(events, headers)
+
+    def _send_projects(self, params):
+        """
+        Send a page of the list of projects (ids from `nb_projects` down to 1).
+        """
+        per_page = int(params.get('per_page', ['20'])[0])
+        headers = {}
+        if params.get('pagination') == ['keyset']:
+            id_before = int(params.get('id_before', [self.server.nb_projects + 1])[0])
+            ids = list(range(id_before - 1, max(id_before - 1 - per_page, 0), -1))
+            if ids and ids[-1] > 1:
+                headers['Link'] = (f'<http://{self.headers.get("Host")}/api/v4/projects?pagination=keyset&'
+                                   f'per_page={per_page}&order_by=id&sort=desc&id_before={ids[-1]}>; rel="next"')
+        else:
+            with self.server.lock:
+                shift = self.server.drift * self.server.nb_project_requests
+                self.server.nb_project_requests += 1
+            start = max((int(params.get('page', ['1'])[0]) - 1) * per_page - shift, 0)
+            ids = list(range(self.server.nb_projects - start, max(self.server.nb_projects - start - per_page, 0), -1))
+        time.sleep(self.latency)
+        self._send_json([{'id': project_id, 'path': f'project-{project_id}', 'star_count': project_id % 50,
+                          'namespace': {'path': f'owner-{project_id % 300}'}} for project_id in ids], headers)
+
+    def _send_project_page(self, project_id, endpoint, params):
+        """
+        Send a page of the members or of the events of a project.
+        """
+        page = int(params.get('page', ['1'])[0])
+        per_page = int(params.get('per_page', ['20'])[0])
+        total = nb_user_events(f'project{project_id}-{endpoint}', self.max_events)
+        start = (page - 1) * per_page
+        items = []
+        for i in range(start, min(start + per_page, total)):
+            username = f"{'ci-' if i % 3 == 0 else ''}user{i % 40}"
+            if endpoint == 'members':
+                items.append({'id': i, 'username': username, 'name': username})
+            else:
+                items.append({**make_event(username, i, True), 'author': {'id': i % 40, 'username': username}})
+        time.sleep(self.latency)
+        self._send_json(items)
+
+    def _send_json(self, data, headers=None):
+        body = json.dumps(data).encode()
+        # Weak validator of the body: unchanged bodies are answered with a 304 without body
+        etag = f'W/"{zlib.crc32(body):08x}"'
+        not_modified = self.headers.get('If-None-Match') == etag
+        if not_modified:
+            with self.server.lock:
+                self.server.nb_304 += 1
+        self.send_response(304 if not_modified else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '0' if not_modified else str(len(body)))
+        self.send_header('ETag', etag)
+        for key, value in {**self.rate_limit_headers, **(headers or {})}.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if not not_modified:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, max_events=350, latency=0.05, rate_limit=None, window=60, revoked_tokens=(),
+                 nb_projects=10_000, drift=0, fail_status=None):
+    """
+    Start the stub server in a background thread.
+
+    Returns:
+        The server (`server.server_address` gives the port, `server.shutdown()` stops it)
+    """
+    handler = type('Handler', (StubHandler,), {'max_events': max_events, 'latency': latency})
+    server_class = type('Server', (ThreadingHTTPServer,), {'request_queue_size': 1024, 'daemon_threads': True})
+    server = server_class(('127.0.0.1', port), handler)
+    server.rate_limit = rate_limit
+    server.window = window
+    server.revoked_tokens = set(revoked_tokens)
+    server.fail_status = fail_status
+    # Key: token - Value: (reset time, number of requests) of the current window
+    server.windows = {}
+    server.nb_429 = 0
+    server.nb_304 = 0
+    server.nb_projects = nb_projects
+    server.drift = drift
+    server.nb_project_requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    stub = start_server(port=8000)
+    print("Stub server listening on http://127.0.0.1:8000 (GitLab root: /api/v4)")
+    threading.Event().wait()
@@ -0,0 +1,124 @@
+"""
+Generators of synthetic GitLab/GitHub events and activities used by the benchmarks.
+
+The GitLab events have the same fields as the `/users/{id}/events` endpoint and cover the main glmap actions:
+pushes, branch/tag creations, issues, merge requests, milestones, comments (with and without diff position),
+membership changes and wiki pages. The GitHub events cover the main event types and payload actions.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+
+def gitlab_events(user, nb_events, nb_projects=50, seed=0):
+    """
+    Generate the events of a user (deterministic for a given user and seed), from the most recent to the oldest.
+    """
+    rng = random.Random(f'{user}-{seed}')
+    events = []
+    for _ in range(nb_events):
+        event = {
+            'id': rng.randrange(10 ** 9),
+            'project_id': rng.randrange(nb_projects),
+            'action_name': None,
+            'target_id': None,
+            'target_iid': None,
+            'target_type': None,
+            'author_id': 1,
+            'target_title': None,
+            'created_at': f'2025-01-{1 + rng.randrange(28):02d}T{rng.randrange(24):02d}:'
+                          f'{rng.randrange(60):02d}:{rng.randrange(60):02d}.{rng.randrange(1000):03d}Z',
+            'author': {'id': 1, 'username': user, 'name': user, 'state': 'active', 'avatar_url': None},
+            'imported': False,
+            'author_username': user,
+        }
+        kind = rng.randrange(6)
+        if kind == 0:
+            event.update(action_name='pushed to', push_data={
+                'commit_count': 1 + rng.randrange(5), 'action': 'pushed', 'ref_type': 'branch', 'commit_from': 'a1',
+                'commit_to': 'b2', 'ref': 'main', 'commit_title': 'Fix the build', 'ref_count': None})
+        elif kind == 1:
+            event.update(action_name='pushed new', push_data={
+                'commit_count': 0, 'action': 'created', 'ref_type': rng.choice(['branch', 'tag']), 'commit_from': None,
+                'commit_to': 'b2', 'ref': f'feature-{rng.randrange(100)}', 'commit_title': None, 'ref_count': None})
+        elif kind == 2:
+            event.update(action_name=rng.choice(['opened', 'closed']),
+                         target_type=rng.choice(['Issue', 'MergeRequest', 'Milestone']),
+                         target_id=rng.randrange(10 ** 6), target_iid=rng.randrange(1000), target_title='Title')
+        elif kind == 3:
+            position = rng.choice([None, {'new_path': 'src/main.py', 'new_line': rng.randrange(500),
+                                          'line_range': {'start': {'line_code': 'abc_1_1', 'type': 'new'},
+                                                         'end': {'line_code': 'abc_1_2', 'type': 'new'}}}])
+            event.update(action_name='commented on', target_type=rng.choice(['Note', 'DiscussionNote', 'DiffNote']),
+                         target_id=rng.randrange(10 ** 6), target_title='Title',
+                         note={'id': rng.randrange(10 ** 6), 'type': None, 'body': 'Looks good to me',
+                               'noteable_type': rng.choice(['Issue', 'MergeRequest', 'Commit']),
+                               'noteable_id': rng.randrange(10 ** 6), 'noteable_iid': rng.randrange(1000),
+                               'position': position})
+        elif kind == 4:
+            event.update(action_name=rng.choice(['joined', 'left']))
+        else:
+            event.update(action_name=rng.choice(['created', 'updated']), target_type='WikiPage::Meta',
+                         target_id=rng.randrange(10 ** 6), target_title='Home',
+                         wiki_page={'format': 'markdown', 'slug': 'home'})
+        events.append(event)
+    events.sort(key=lambda event: event['created_at'], reverse=True)
+    return events
+
+
+GITHUB_EVENTS = [
+    ('PushEvent', {'size': 1}), ('CreateEvent', {'ref_type': 'branch'}), ('CreateEvent', {'ref_type': 'tag'}),
+    ('CreateEvent', {'ref_type': 'repository'}), ('DeleteEvent', {'ref_type': 'branch'}),
+    ('IssuesEvent', {'action': 'opened'}), ('IssuesEvent', {'action': 'closed'}), ('IssuesEvent', {'action': 'labeled'}),
+    ('IssueCommentEvent', {'action': 'created', 'issue': {'number': 1}}),
+    ('IssueCommentEvent', {'action': 'created', 'issue': {'number': 2, 'pull_request': {'url': 'u'}}}),
+    ('PullRequestEvent', {'action': 'opened', 'pull_request': {'merged': False}}),
+    ('PullRequestEvent', {'action': 'closed', 'pull_request': {'merged': True}}),
+    ('PullRequestEvent', {'action': 'closed', 'pull_request': {'merged': False}}),
+    ('PullRequestReviewEvent', {'action': 'created'}), ('PullRequestReviewCommentEvent', {'action': 'created'}),
+    ('WatchEvent', {'action': 'started'}), ('ForkEvent', {}), ('ReleaseEvent', {'action': 'published'}),
+    ('GollumEvent', {}), ('MemberEvent', {'action': 'added'}), ('DiscussionEvent', {'action': 'created'}),
+]
+
+
+def github_events(user, nb_events, nb_repositories=50, seed=0):
+    """
+    Generate the events of a GitHub user (deterministic for a given user and seed), from the most recent to the
+    oldest. The dates are rounded to the minute, so several events have the same date.
+    """
+    rng = random.Random(f'{user}-{seed}')
+    events = []
+    for _ in range(nb_events):
+        event_type, payload = rng.choice(GITHUB_EVENTS)
+        repository = rng.randrange(nb_repositories)
+        events.append({
+            'id': str(rng.randrange(10 ** 10)),
+            'type': event_type,
+            'actor': {'id': 1, 'login': user},
+            'repo': {'id': repository, 'name': f'owner{repository % 7}/repo{repository}'},
+            'payload': payload,
+            'public': True,
+            'created_at': f'2025-01-{1 + rng.randrange(28):02d}T{rng.randrange(3):02d}:{rng.randrange(60):02d}:00Z',
+        })
+    events.sort(key=lambda event: event['created_at'], reverse=True)
+    return events
+
+
+def synthetic_activities(nb_activities, nb_repositories=50, seed=42):
+    """
+    Generate GitLab-like activities for a single contributor.
+    """
+    rng = random.Random(seed)
+    names = ['PushCommits', 'CreateIssue', 'CommentIssue', 'MergePullRequest', 'ReviewPullRequest', 'ManageBranches']
+    start = datetime(2024, 10, 21)
+    activities = []
+    for i in range(nb_activities):
+        date = (start + timedelta(seconds=37 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        activities.append({
+            'activity': rng.choice(names),
+            'start_date': date,
+            'end_date': date,
+            'actor': {'id': 1, 'login': 'synthetic-bot'},
+            'repository': {'id': rng.randrange(nb_repositories)},
+        })
+    return activities
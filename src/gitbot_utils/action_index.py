@@ -0,0 +1,206 @@
+"""
+Decision index of the event to action mappings (ghmap `event_to_action.json`, glmap `gl_event_to_action.json`).
+
+`ActionMapper.map` tests the conditions of every action of the configuration for each event, in the order of the
+configuration, and keeps the first action whose conditions hold. `ActionIndex` gives the actions that can match an
+event with a few dictionary lookups:
+- the actions are grouped by event type,
+- within a type, a decision tree is built on the fields with fixed values in the conditions (ex: `action_name`,
+  then `note.noteable_type`). Each node looks up the value of the event in a dictionary. The actions without a
+  condition on the field (wildcards) are kept in every branch, in the order of the configuration.
+
+An action whose conditions were all looked up matches the event without other test, the conditions of the other
+remaining actions (regular expressions, lists) are tested as `ActionMapper` does. When a value cannot be looked up
+(a missing key, which matches any value, or a field that is not an object), all the actions of the node are tested.
+
+`find_conflicts` reports the actions that can never be used (all their events match an action defined before)
+and the actions that match the same events as an action defined before (the first one is used).
+"""
+
+from ghmap.mapping.action_mapper import ActionMapper
+
+
+def conditions(action_details):
+    """
+    Conditions of an action on the fields of the events, except the type.
+
+    Returns:
+        A dictionary with the value of each field path (tuple of keys) of the conditions
+    """
+    leaves = {}
+
+    def visit(path, value):
+        if isinstance(value, dict) and value:
+            for key, sub_value in value.items():
+                visit(path + (key,), sub_value)
+        else:
+            leaves[path] = value
+
+    for key, value in action_details['event'].items():
+        if key != 'type':
+            visit((key,), value)
+    return leaves
+
+
+def _is_indexed(path, value):
+    """
+    Whether a condition is a fixed value, which can be looked up (not a regular expression, a list or an object,
+    nor a field with a dotted name).
+    """
+    if isinstance(value, (dict, list)) or '.' in path[0]:
+        return False
+    return not (isinstance(value, str) and value.startswith('^') and value.endswith('$'))
+
+
+def _lookup(event_record, path):
+    """
+    Value of a field of an event, as compared by `ActionMapper._match_condition`.
+
+    Returns:
+        A tuple (True, value), or (False, None) if the field matches any value or is not in an object
+    """
+    value = event_record.get(path[0])
+    for key in path[1:]:
+        if not isinstance(value, dict) or key not in value:
+            return False, None
+        value = value[key]
+    return True, value
+
+
+class _Node:
+    """
+    Node of the decision tree of an event type.
+
+    Attributes:
+        actions (list): The (action name, action details, indexed conditions, whether all the conditions are
+            indexed) that can match the events of the node
+        matched (list): For each action, whether all its conditions were checked by the lookups leading to the node
+        path (tuple): The field path looked up at the node (None for a leaf)
+        branches (dict): The child node of each value of the field
+        default (_Node): The child node of the other values
+    """
+
+    def __init__(self, actions, used_paths=frozenset()):
+        self.actions = actions
+        self.matched = [complete and leaves.keys() <= used_paths for _, _, leaves, complete in actions]
+        self.path, self.branches, self.default = None, {}, None
+
+        # Field with a fixed value in the most conditions, then with the most distinct values
+        values_by_path = {}
+        for _, _, leaves, _ in actions:
+            for path, value in leaves.items():
+                if path not in used_paths:
+                    values_by_path.setdefault(path, []).append(value)
+        if not values_by_path:
+            return
+        self.path = max(values_by_path, key=lambda p: (len(values_by_path[p]), len(set(values_by_path[p]))))
+
+        used_paths = used_paths | {self.path}
+        wildcards = [action for action in actions if self.path not in action[2]]
+        for value in values_by_path[self.path]:
+            if value not in self.branches:
+                self.branches[value] = _Node([action for action in actions if self.path not in action[2]
+                                              or action[2][self.path] == value], used_paths)
+        self.default = _Node(wildcards, used_paths)
+
+
+class ActionIndex:
+    """
+    Decision index of the actions of an event to action mapping (see the module documentation).
+
+    Attributes:
+        nodes (dict): The root node of the decision tree of each event type
+    """
+
+    def __init__(self, action_mapping, event_type_key='type'):
+        self.event_type_key = event_type_key
+        actions_by_type = {}
+        for action_name, action_details in action_mapping['actions'].items():
+            event_type = action_details['event'].get('type', None)
+            leaves = conditions(action_details)
+            indexed = {path: value for path, value in leaves.items() if _is_indexed(path, value)}
+            actions_by_type.setdefault(event_type, []).append((action_name, action_details, indexed,
+                                                               len(indexed) == len(leaves)))
+        self.nodes = {event_type: _Node(actions) for event_type, actions in actions_by_type.items()}
+
+    def _node(self, event_record):
+        """
+        Node of the decision tree of an event, and whether all the lookups were done (leaf node).
+        """
+        try:
+            if '.' in self.event_type_key:
+                node = self.nodes.get(ActionMapper._extract_field(event_record, self.event_type_key))
+            else:
+                node = self.nodes.get(event_record.get(self.event_type_key))
+        except TypeError:
+            # Unhashable type (list, object): different from the types of the configuration
+            return None, False
+        if node is None:
+            return None, False
+        while node.path is not None:
+            found, value = _lookup(event_record, node.path)
+            if not found:
+                return node, False
+            try:
+                node = node.branches.get(value, node.default)
+            except TypeError:
+                return node, False
+        return node, True
+
+    def candidates(self, event_record):
+        """
+        Actions that can match an event, in the order of the configuration.
+
+        Returns:
+            A list of (action name, action details, indexed conditions, whether all the conditions are indexed)
+        """
+        node, _ = self._node(event_record)
+        return node.actions if node is not None else []
+
+    def find_action(self, event_record):
+        """
+        Name and details of the first action matching the event (same result as the loop of `ActionMapper.map`),
+        or None if there is none.
+        """
+        node, leaf = self._node(event_record)
+        if node is None:
+            return None
+        for (action_name, action_details, _, _), matched in zip(node.actions, node.matched):
+            if (leaf and matched) or all(
+                    ActionMapper._match_condition(ActionMapper._extract_field(event_record, k), v)
+                    for k, v in action_details['event'].items() if k != 'type'):
+                return action_name, action_details
+        return None
+
+
+def find_conflicts(action_mapping):
+    """
+    Find the actions of a mapping that are shadowed by an action defined before them.
+
+    Two actions of the same type conflict when no field has different values in their conditions (two different
+    regular expressions are considered as exclusive):
+    - 'unreachable': every condition of the first action is a condition of the second one, so every event
+      matching the second action matches the first one, and the second action is never used,
+    - 'ambiguous': an event with all the fields of both conditions can match both actions, the first one is used.
+
+    Parameters:
+        action_mapping: The event to action mapping (content of the configuration file)
+
+    Returns:
+        A list of tuples (kind, first action, second action)
+    """
+    actions = [(name, details['event'].get('type', None), conditions(details))
+               for name, details in action_mapping['actions'].items()]
+    conflicts = []
+    for i, (first, first_type, first_leaves) in enumerate(actions):
+        for second, second_type, second_leaves in actions[i + 1:]:
+            if first_type != second_type:
+                continue
+            shared = first_leaves.keys() & second_leaves.keys()
+            if any(first_leaves[path] != second_leaves[path] for path in shared):
+                continue
+            if shared == first_leaves.keys():
+                conflicts.append(('unreachable', first, second))
+            else:
+                conflicts.append(('ambiguous', first, second))
+    return conflicts
@@ -0,0 +1,278 @@
+"""
+Activity grouping engine for the ghmap/glmap action to activity mapping.
+
+`ActivityMapper.map` tests, for each position of the actions of an (actor, repository) pair, every activity of the
+configuration, and starts again from the first position after each activity found, filtering the whole list of
+actions. Its cost is quadratic in the number of actions of a pair, which takes minutes for the bots with 100k+
+events.
+
+`WindowActivityMapper` gives the same activities in the same order:
+- the actions of each pair are sorted once and kept in a linked list, the actions of an activity are unlinked,
+- the activities are indexed by action, only the activities that can start with the action of a position are
+  tested,
+- the dates are parsed once, the time windows are compared as integers (microseconds),
+- a position where no activity was found is tested again only if an activity removed an action up to the last
+  position read by its scans (the scans of the other positions read the same actions and fail again). Restarting
+  from the first position, as `ActivityMapper` does, finds the first of these positions, which is the next one to
+  test here.
+
+`WindowActivityMapper.map_table` maps the actions of an `ActionTable` to an `ActivityTable` with the same engine,
+without creating a dictionary per action or per activity (see `gitbot_utils.activity_table`).
+"""
+
+import heapq
+from datetime import datetime, timedelta
+
+import numpy as np
+from ghmap.mapping.activity_mapper import ActivityMapper
+
+from .activity_table import ActivityTable, ActivityTableBuilder, Codes
+
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime.fromisoformat('1970-01-01T00:00:00+00:00')
+
+
+def _timestamp(date):
+    """
+    Date of an action in microseconds, as parsed by `ActivityMapper._within_time_limit`.
+    """
+    value = datetime.fromisoformat(date.replace("Z", ""))
+    return (value - (_EPOCH if value.tzinfo is None else _EPOCH_UTC)) // _ONE_MICROSECOND
+
+
+class _CompiledActivity:
+    """
+    Rules of an activity of the configuration, as read by `ActivityMapper._gather_actions`.
+    """
+
+    def __init__(self, activity):
+        self.activity = activity
+        self.name = activity["name"]
+        self.required = {a["action"] for a in activity["actions"] if not a.get("optional", False)}
+        self.allowed = self.required | {a["action"] for a in activity["actions"] if a.get("optional", True)}
+        self.repeatable = {a["action"] for a in activity["actions"] if a.get("repeat", False)}
+        self.window = activity["time_window"] // _ONE_MICROSECOND
+        self.validated = any(a.get("validate_with") for a in activity["actions"])
+
+
+class _TableGroup:
+    """
+    Actions of an (actor, repository) pair of an `ActionTable`, as the dictionaries read by
+    `ActivityMapper._validate_gathered_actions` (created on access).
+    """
+
+    def __init__(self, actions, positions):
+        self.actions = actions
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        position = self.positions[i]
+        return {"action": self.actions.action_names[self.actions.action[position]],
+                "event_id": self.actions.event_ids[position],
+                "details": self.actions.details(position)}
+
+
+class WindowActivityMapper(ActivityMapper):
+    """
+    ActivityMapper with the grouping engine described in the module documentation.
+
+    Same behaviour as `ActivityMapper.map` on a new mapper. If several actions have the same event id, the actions
+    are mapped by `ActivityMapper.map`.
+    """
+
+    def __init__(self, activity_mapping, progress_bar=False):
+        super().__init__(activity_mapping, progress_bar=progress_bar)
+        self.activities = [_CompiledActivity(activity) for activity in self.activity_mapping["activities"]]
+        # Key: action - Value: the activities that can start with the action (in the order of the configuration)
+        self.activities_by_action = {}
+        for activity in self.activities:
+            for action in activity.allowed:
+                self.activities_by_action.setdefault(action, [])
+        for action, activities in self.activities_by_action.items():
+            activities.extend(activity for activity in self.activities if action in activity.allowed)
+
+    def _gather(self, group, names, times, following, end, start, activity):
+        """
+        Scan of `ActivityMapper._gather_actions` from a position of the linked list.
+
+        Returns:
+            A tuple (positions of the validated actions, position where the scan stopped, `end` if at the end)
+        """
+        gathered, gathered_names, found_required = [], set(), set()
+        window = activity.window
+        position = start
+        while position != end:
+            name = names[position]
+            if gathered and abs(times[position] - times[gathered[-1]]) > window:
+                break
+            if name not in activity.allowed:
+                break
+            if name in activity.repeatable or name not in gathered_names:
+                gathered.append(position)
+                gathered_names.add(name)
+                if name in activity.required:
+                    found_required.add(name)
+            else:
+                break
+            position = following[position]
+
+        if not activity.required.issubset(found_required):
+            return [], position
+        if len(gathered) > 1 and activity.validated:
+            actions = [group[i] for i in gathered]
+            validated, _ = self._validate_gathered_actions(actions, activity.activity)
+            valid_ids = {id(action) for action in validated}
+            gathered = [i for i, action in zip(gathered, actions) if id(action) in valid_ids]
+        return gathered, position
+
+    def _find_activities(self, group, names, times):
+        """
+        Find the activities of the actions of an (actor, repository) pair, sorted by date.
+
+        Parameters:
+            group: The actions of the pair (only read to validate the gathered actions)
+            names: The name of each action
+            times: The date of each action in microseconds
+
+        Returns:
+            A generator of tuples (compiled activity, positions of its actions in the group)
+        """
+        end = len(group)
+        following = list(range(1, end + 1))
+        previous = list(range(-1, end - 1))
+        removed = [False] * end
+        # Positions where no activity was found: last position read by their scans (-1: pending test)
+        stops = [-1] * end
+        pending = []  # min-heap of the positions to test again
+        failed = []  # max-heap of (-last position read, position) of the positions without activity
+        cursor = 0  # first position never tested
+        activities_by_action, gather = self.activities_by_action, self._gather
+
+        while True:
+            while pending and removed[pending[0]]:
+                heapq.heappop(pending)
+            while cursor < end and removed[cursor]:
+                cursor += 1
+            if pending and pending[0] < cursor:
+                start = heapq.heappop(pending)
+            elif cursor < end:
+                start = cursor
+                cursor += 1
+            else:
+                break
+
+            last_read = start
+            for activity in activities_by_action.get(names[start], ()):
+                gathered, stop = gather(group, names, times, following, end, start, activity)
+                if stop > last_read:
+                    last_read = stop
+                if gathered:
+                    break
+            else:
+                stops[start] = last_read
+                heapq.heappush(failed, (-last_read, start))
+                continue
+
+            yield activity, gathered
+            for i in gathered:
+                removed[i] = True
+                if previous[i] >= 0:
+                    following[previous[i]] = following[i]
+                if following[i] < end:
+                    previous[following[i]] = previous[i]
+
+            # The scans that read up to the first removed action must be done again, as well as the scan of the
+            # tested position if its action was not validated
+            if not removed[start]:
+                heapq.heappush(pending, start)
+            first_removed = gathered[0]
+            while failed and -failed[0][0] >= first_removed:
+                last_read, position = heapq.heappop(failed)
+                if removed[position] or stops[position] != -last_read:
+                    continue
+                stops[position] = -1
+                heapq.heappush(pending, position)
+
+    def _map_group(self, group, mapped_activities):
+        """
+        Map the actions of an (actor, repository) pair, sorted by date.
+        """
+        names = [action["action"] for action in group]
+        dates = {date: _timestamp(date) for date in {action["date"] for action in group}}
+        times = [dates[action["date"]] for action in group]
+        for activity, gathered in self._find_activities(group, names, times):
+            actions = [group[i] for i in gathered]
+            mapped_activities.append({
+                "activity": activity.name,
+                "start_date": actions[0]["date"],
+                "end_date": actions[-1]["date"],
+                "actor": actions[0]["actor"],
+                "repository": actions[0]["repository"],
+                "actions": [{"action": a["action"], "event_id": a["event_id"], "date": a["date"], "details": a["details"]}
+                            for a in actions]
+            })
+            self.used_ids.update([a["event_id"] for a in actions])
+
+    def map(self, actions):
+        """
+        Map actions to activities. Same behaviour as `ActivityMapper.map` on a new mapper.
+        """
+        self.used_ids = set()
+        if len({action["event_id"] for action in actions}) != len(actions):
+            return ActivityMapper.map(self, actions)
+
+        grouped = self._group_actions(actions)
+        all_mapped_activities = []
+        for actions_group in grouped.values():
+            self._map_group(actions_group, all_mapped_activities)
+
+        unused_ids = {a["event_id"] for group in grouped.values() for a in group} - self.used_ids
+        if unused_ids:
+            print(f"Warning: Unused actions: {unused_ids}")
+
+        all_mapped_activities.sort(key=lambda x: x["start_date"])
+        return all_mapped_activities
+
+    def map_table(self, actions):
+        """
+        Map the actions of an `ActionTable` to an `ActivityTable`. Same activities as `map` on the actions as
+        dictionaries.
+        """
+        event_ids = actions.event_ids
+        if len(set(event_ids)) != len(event_ids):
+            return ActivityTable.from_activities(self.map(actions.to_dicts()))
+
+        # Actions sorted by (actor, repository) pair, in the order of their first action, then by date (stable)
+        actor_ids = [actor["id"] for actor in actions.actors]
+        repository_ids = [repository["id"] for repository in actions.repositories]
+        groups = Codes()
+        group = np.array([groups.code((actor_ids[actor], repository_ids[repository]))
+                          for actor, repository in zip(actions.actor.tolist(), actions.repository.tolist())],
+                         dtype=np.int64)
+        seconds = actions.date.view(np.int64)
+        order = np.lexsort((seconds, group))
+        bounds = np.searchsorted(group[order], np.arange(len(groups.values) + 1)).tolist()
+
+        positions = order.tolist()
+        names = [actions.action_names[action] for action in actions.action[order].tolist()]
+        times = (seconds[order] * 1_000_000).tolist()
+        seconds, actor, repository = seconds.tolist(), actions.actor.tolist(), actions.repository.tolist()
+        used = [False] * len(actions)
+        builder = ActivityTableBuilder()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            group_positions = positions[start:end]
+            for activity, gathered in self._find_activities(_TableGroup(actions, group_positions),
+                                                            names[start:end], times[start:end]):
+                first, last = group_positions[gathered[0]], group_positions[gathered[-1]]
+                builder.add(activity.name, seconds[first], seconds[last], actor[first], repository[first])
+                for i in gathered:
+                    used[group_positions[i]] = True
+
+        unused_ids = {event_id for event_id, is_used in zip(event_ids, used) if not is_used}
+        if unused_ids:
+            print(f"Warning: Unused actions: {unused_ids}")
+        return builder.build(actions.actors, actions.repositories)
@@ -0,0 +1,252 @@
+"""
+Compact (struct of arrays) representation of the actions and the activities of a contributor.
+
+The ghmap/glmap mappers return a dictionary per action and per activity, each holding its own `actor` and
+`repository` dictionaries (and the details of its actions), on top of the events. For the bots with 100k+ events,
+these trees take several times the memory of the events themselves.
+
+`ActionTable` and `ActivityTable` keep one NumPy array per field instead:
+- the action and activity names are codes (indexes in a list of distinct names),
+- the actors and the repositories are codes (indexes in a list of distinct actor/repository dictionaries, the first
+  one seen for each value),
+- the dates are `datetime64[s]` arrays (epoch seconds, the precision of the dates of the mappers).
+
+The details of the actions are only extracted from the events when an activity validates its actions
+(see `ActionTable.details`).
+"""
+
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_SECOND = timedelta(seconds=1)
+
+
+def epoch_seconds(created_at):
+    """
+    Date of an event in seconds since the epoch, as converted by `ActionMapper._convert_date_to_iso`
+    (ISO 8601 string in UTC, with or without milliseconds, or Unix timestamp in milliseconds).
+    """
+    if isinstance(created_at, int):
+        return created_at // 1000
+    if '.' in created_at:
+        created_at = created_at.split('.')[0] + 'Z'
+    if len(created_at) == 20 and created_at[10] == 'T' and created_at[19] == 'Z':
+        date = datetime.fromisoformat(created_at[:19])
+    else:
+        date = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%SZ')
+    return (date - _EPOCH) // _ONE_SECOND
+
+
+def _dates(values):
+    """
+    `datetime64[s]` array of dates (datetime64 array) or of epoch seconds (ex: an `array('q')`).
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        return values.astype('datetime64[s]')
+    return np.asarray(values, dtype=np.int64).view('datetime64[s]')
+
+
+class Codes:
+    """
+    Codes of distinct values, in the order in which they are seen.
+
+    Attributes:
+        codes (dict): The code of each key
+        values (list): The value of each code (the first value given for its key)
+    """
+
+    def __init__(self, values=()):
+        self.codes = {}
+        self.values = []
+        for value in values:
+            self.code(value)
+
+    def code(self, key, value=None):
+        """
+        Code of a key (a new code if the key was never seen, with `value` as value or the key itself).
+        """
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(key if value is None else value)
+        return code
+
+
+class ActionTable:
+    """
+    Actions of a contributor, in the order of the events.
+
+    Attributes:
+        action (np.ndarray): The code of the action of each event (index in `action_names`)
+        date (np.ndarray): The date of each action (`datetime64[s]`)
+        actor (np.ndarray): The code of the actor of each action (index in `actors`)
+        repository (np.ndarray): The code of the repository of each action (index in `repositories`)
+        event_ids (list): The event id of each action
+        action_names (list): The names of the actions
+        actors (list): The distinct actors (dictionaries of the common fields)
+        repositories (list): The distinct repositories (dictionaries of the common fields)
+    """
+
+    def __init__(self, action, date, actor, repository, event_ids, action_names, actors, repositories, details):
+        self.action = np.asarray(action, dtype=np.int16)
+        self.date = _dates(date)
+        self.actor = np.asarray(actor, dtype=np.int32)
+        self.repository = np.asarray(repository, dtype=np.int32)
+        self.event_ids = event_ids
+        self.action_names = action_names
+        self.actors = actors
+        self.repositories = repositories
+        self._details = details
+
+    def __len__(self):
+        return len(self.action)
+
+    def details(self, position):
+        """
+        Details of an action (extracted from its event).
+        """
+        return self._details(position)
+
+    def to_dicts(self):
+        """
+        Actions as returned by `ActionMapper.map` (dictionaries).
+        """
+        dates = np.datetime_as_string(self.date, unit='s')
+        return [{'action': self.action_names[action], 'event_id': self.event_ids[i], 'date': f'{dates[i]}Z',
+                 'actor': self.actors[actor], 'repository': self.repositories[repository], 'details': self.details(i)}
+                for i, (action, actor, repository) in enumerate(zip(self.action.tolist(), self.actor.tolist(),
+                                                                    self.repository.tolist()))]
+
+
+class ActivityTableBuilder:
+    """
+    Columns of an `ActivityTable` filled activity by activity (compact `array` columns).
+    """
+
+    def __init__(self):
+        self.activity = array('h')
+        self.start = array('q')
+        self.end = array('q')
+        self.actor = array('i')
+        self.repository = array('i')
+        self.activity_names = Codes()
+
+    def add(self, name, start, end, actor, repository):
+        """
+        Add an activity.
+
+        Parameters:
+            name: The name of the activity
+            start: The date of its first action (epoch seconds)
+            end: The date of its last action (epoch seconds)
+            actor: The code of its actor
+            repository: The code of its repository
+        """
+        self.activity.append(self.activity_names.code(name))
+        self.start.append(start)
+        self.end.append(end)
+        self.actor.append(actor)
+        self.repository.append(repository)
+
+    def build(self, actors, repositories):
+        """
+        Table of the activities, sorted by start date (stable sort, as the mappers).
+        """
+        table = ActivityTable(self.activity, self.start, self.end, self.actor, self.repository,
+                              self.activity_names.values, actors, repositories)
+        return table.take(np.argsort(table.start, kind='stable'))
+
+
+class ActivityTable:
+    """
+    Activities of a contributor, sorted by start date.
+
+    Attributes:
+        activity (np.ndarray): The code of each activity (index in `activity_names`)
+        start (np.ndarray): The date of the first action of each activity (`datetime64[s]`)
+        end (np.ndarray): The date of the last action of each activity (`datetime64[s]`)
+        actor (np.ndarray): The code of the actor of each activity (index in `actors`)
+        repository (np.ndarray): The code of the repository of each activity (index in `repositories`)
+        activity_names (list): The names of the activities
+        actors (list): The distinct actors (dictionaries, ex: {'id': 1, 'login': 'user'})
+        repositories (list): The distinct repositories (dictionaries, ex: {'id': 1, 'name': 'owner/repo'})
+    """
+
+    def __init__(self, activity, start, end, actor, repository, activity_names, actors, repositories):
+        self.activity = np.asarray(activity, dtype=np.int16)
+        self.start = _dates(start)
+        self.end = _dates(end)
+        self.actor = np.asarray(actor, dtype=np.int32)
+        self.repository = np.asarray(repository, dtype=np.int32)
+        self.activity_names = activity_names
+        self.actors = actors
+        self.repositories = repositories
+
+    def __len__(self):
+        return len(self.activity)
+
+    def take(self, indices):
+        """
+        Table of some activities (same names, actors and repositories).
+        """
+        return ActivityTable(self.activity[indices], self.start[indices], self.end[indices], self.actor[indices],
+                             self.repository[indices], self.activity_names, self.actors, self.repositories)
+
+    @classmethod
+    def from_activities(cls, activities):
+        """
+        Table of activities given as dictionaries (as returned by the mappers).
+        """
+        builder = ActivityTableBuilder()
+        actors, repositories = Codes(), Codes()
+        for activity in activities:
+            builder.add(activity['activity'], epoch_seconds(activity['start_date']), epoch_seconds(activity['end_date']),
+                        actors.code(tuple(activity['actor'].items()), activity['actor']),
+                        repositories.code(tuple(activity['repository'].items()), activity['repository']))
+        return builder.build(actors.values, repositories.values)
+
+    def names(self):
+        """
+        Name of each activity (object array).
+        """
+        return _take(self.activity_names, self.activity)
+
+    def logins(self):
+        """
+        Login of the actor of each activity.
+        """
+        return _take([actor['login'] for actor in self.actors], self.actor)
+
+    def repository_ids(self):
+        """
+        Id of the repository of each activity.
+        """
+        return self.per_repository([repository['id'] for repository in self.repositories])
+
+    def per_repository(self, values):
+        """
+        Value of the repository of each activity, from the values of the distinct repositories (ex: their owners).
+        """
+        return _take(values, self.repository)
+
+    def to_dicts(self):
+        """
+        Activities as dictionaries, without their actions.
+        """
+        starts = np.datetime_as_string(self.start, unit='s')
+        ends = np.datetime_as_string(self.end, unit='s')
+        return [{'activity': self.activity_names[activity], 'start_date': f'{start}Z', 'end_date': f'{end}Z',
+                 'actor': self.actors[actor], 'repository': self.repositories[repository]}
+                for activity, start, end, actor, repository in zip(self.activity.tolist(), starts, ends,
+                                                                   self.actor.tolist(), self.repository.tolist())]
+
+
+def _take(values, codes):
+    """
+    Values of codes, with the dtype given by pandas to a column holding the values (ex: int64 for integers).
+    """
+    return pd.Series(values).to_numpy()[codes]
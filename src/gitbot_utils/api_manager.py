@@ -1,11 +1,41 @@
 import time
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import numpy as np
 import pandas as pd
-# Have to rename to avoid the problem with double underscore.
-from important_features import __stats as stats, __convert_col_type as convert_col_type
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import features, json_codec
+from .activity_table import ActivityTable
+from .http_cache import ResponseCache
+from .rate_limit import RetryError
+from .token_pool import TokenPool
+
+
+def _rabbit_features(df):
+    """
+    Features of an activity DataFrame computed by the RABBIT feature extractor, in the order of `features.FEATURES`.
+    """
+    # Imported here (and out of the class, to avoid the problem with double underscore) so that RABBIT is only
+    # required by the default feature extractor
+    from important_features import __stats as stats, __convert_col_type as convert_col_type
+
+    df['date'] = pd.to_datetime(df.date, errors='coerce', format='%Y-%m-%dT%H:%M:%S+00:00').dt.tz_localize(None)
+
+    # Extract features using RABBIT extractor
+    df_feat = pd.json_normalize(stats(df), sep='_')
+
+    # Add column 'NR' for Number of Repositories
+    df_feat['NR'] = np.int64(df['repository'].nunique())
+
+    return (
+        convert_col_type(df_feat)
+        .rename(columns={'feat_NA': 'NA', 'feat_NT': 'NT', 'feat_NOR': 'NOR', 'feat_ORR': 'ORR'})
+        [features.FEATURES]  # Reorder the columns
+    )
 
 
 class APIManager:
@@ -13,17 +43,108 @@ class APIManager:
     Abstract class for an API manager.
 
     Attributes:
-        api_key: The API key to use the API
+        api_key: The API key to use the API, or a `TokenPool` to spread the requests over several keys
         max_queries: The maximum number of pages to query
         min_events: The minimum number of events to query
         query_root: The root URL of the API to query events (ex: 'https://api.github.com' for GitHub API)
+        max_workers: The maximum number of concurrent requests (see `query_events_many`)
+        session: The HTTP session (keep-alive connection pool) used for all the requests of the manager
+        token_pool: The pool of API keys (a single key if `api_key` is not a `TokenPool`). Each key has a rate limiter
+            shared by all the managers using the same key.
+        per_page: The number of events queried per page
+        response_cache: The cache of the responses (see `gitbot_utils.http_cache`), None to disable it
+        decoder: The decoder of the pages of events (see `gitbot_utils.json_codec.EventDecoder`), None to decode
+            the whole events
+        native_features: Whether to compute the features with the native extractor (see `gitbot_utils.features`)
+            instead of the RABBIT feature extractor
     """
+    per_page = 100
 
-    def __init__(self, api_key, query_root, max_queries=3, min_events=5):
+    def __init__(self, api_key, query_root, max_queries=3, min_events=5, max_workers=8, response_cache=None,
+                 decoder=None, native_features=False):
         self.api_key = api_key
         self.max_queries = max_queries
         self.min_events = min_events
         self.query_root = query_root
+        self.max_workers = max_workers
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.token_pool = TokenPool.of(api_key, query_root)
+        self.response_cache = ResponseCache.of(response_cache)
+        self.decoder = decoder
+        self.native_features = native_features
+
+    @abstractmethod
+    def _auth_headers(self, token):
+        """
+        Abstract method returning the headers used to authenticate a request with a token.
+
+        Parameters:
+            token: The API key to use (can be None)
+        """
+        pass
+
+    def _request(self, query, params=None):
+        """
+        Send a GET request to the API through the session of the manager, with the API key of the pool that has
+        the most remaining requests. Rate limited (429/403) and failed (5xx) requests are retried with a jittered
+        backoff, and requests rejected because of their key are retried with another key of the pool.
+        With a response cache, the cached responses are validated with a conditional request (a 304 response
+        is served from the cache), or served directly in offline mode.
+
+        Parameters:
+            query: The URL to query
+            params: The parameters of the query
+
+        Returns:
+            The response (not retried, or served from the cache)
+
+        Raises:
+            RetryError: If the request is still rate limited or failed after the retries (the callers must not take
+                the missing response for an empty page)
+        """
+        cached = None
+        if self.response_cache is not None:
+            cached = self.response_cache.get(query, params)
+            if self.response_cache.offline:
+                return cached or self.response_cache.offline_miss()
+
+        attempt = 0
+        while True:
+            token = self.token_pool.acquire()
+            headers = {**self._auth_headers(token), **ResponseCache.conditional_headers(cached)}
+            try:
+                response = self.session.get(query, headers=headers, params=params)
+            except BaseException:
+                # No response: the request must not stay in flight in the rate limiter
+                self.token_pool.release(token)
+                raise
+            self.token_pool.update(token, response.status_code, response.headers)
+            if response.status_code == 304 and cached is not None:
+                return cached
+            if response.status_code == 200 and self.response_cache is not None:
+                self.response_cache.set(query, params, response.headers, response.content)
+
+            if not self.token_pool.should_retry(token, response.status_code):
+                return response
+            rate_limiter = self.token_pool.limiter(token)
+            if attempt >= rate_limiter.max_retries:
+                raise RetryError(query, response.status_code)
+            delay = rate_limiter.backoff(attempt, response.headers)
+            print(f"Error {response.status_code} while querying {query}, retrying in {delay:.1f} seconds.")
+            time.sleep(delay)
+            attempt += 1
+
+    def decode_events(self, content):
+        """
+        Decode the content of a page of events (JSON list), with the decoder of the manager if any.
+        """
+        if self.decoder is None:
+            return json_codec.loads(content)
+        return self.decoder.decode(content)
 
     @abstractmethod
     def _query_event_page(self, contributor, page):
@@ -43,7 +164,7 @@ class APIManager:
 
     def query_events(self, contributor):
         """
-        Query the events of a contributor from the GitHub API.
+        Query the events of a contributor from the API.
         A maximum of `max_queries` pages are queried where each page contains 100 events.
         """
         events = []
@@ -54,6 +175,24 @@ class APIManager:
                 break
         return events
 
+    def query_events_many(self, contributors, max_workers=None):
+        """
+        Query the events of several contributors concurrently.
+        The pages of a contributor are queried one after the other (to stop as soon as there are no events left),
+        while up to `max_workers` contributors are queried in parallel through the connection pool of the manager.
+
+        Parameters:
+            contributors: A list of contributors (usernames or ids, depending on the API)
+            max_workers: The maximum number of concurrent requests (default: `self.max_workers`)
+
+        Returns:
+            A dictionary with the events of each contributor, in the same order as `contributors`
+        """
+        contributors = list(contributors)
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            results = executor.map(self.query_events, contributors)
+            return dict(zip(contributors, results))
+
     # Function to check if there are events left
     @abstractmethod
     def _check_events_left(self, events, headers):
@@ -95,6 +234,19 @@ class APIManager:
         """
         pass
 
+    def events_to_activity_table(self, events):
+        """
+        Convert the events to activities, as an `ActivityTable` (see `gitbot_utils.activity_table`).
+        Same activities as `events_to_activities`.
+
+        Parameters:
+            events: A list of dictionaries corresponding to the events of a contributor
+
+        Returns:
+            An `ActivityTable` with the activities of a contributor
+        """
+        return ActivityTable.from_activities(self.events_to_activities(events))
+
     @abstractmethod
     def _get_repo_owner(self, activity):
         """
@@ -108,10 +260,30 @@ class APIManager:
         """
         pass
 
+    def _get_repo_owners(self, activities):
+        """
+        Get the owner of the repository of each activity.
+        Each distinct repository is resolved only once with `_get_repo_owner`.
+
+        Parameters:
+            activities: A list of dictionaries corresponding to the activities of a contributor
+
+        Returns:
+            A list with the owner of the repository of each activity (same order as `activities`)
+        """
+        # Key: repository id - Value: owner of the repository
+        owners = {}
+        for activity in activities:
+            repository_id = activity['repository']['id']
+            if repository_id not in owners:
+                owners[repository_id] = self._get_repo_owner(activity)
+        return [owners[activity['repository']['id']] for activity in activities]
+
     def activity_to_df(self, activities):
         """
         Convert the activities to a DataFrame compatible with the RABBIT feature extractor.
 
+        The columns are collected in a single pass over the activities and the DataFrame is created once.
         The returned DataFrame will have the following columns:
         - 'date'
         - 'activity'
@@ -123,29 +295,60 @@ class APIManager:
             activities: A list of dictionaries corresponding to the activities of a contributor
 
         Returns:
-            A DataFrame with the columns 'date', 'activity', 'contributor' and 'repository'
+            A DataFrame with the columns 'date', 'activity', 'contributor', 'repository' and 'owner'
         """
-        activities_df = pd.DataFrame()
+        dates = []
+        names = []
+        contributors = []
+        repositories = []
         for activity in activities:
-            new_row = pd.DataFrame([[
-                activity['start_date'],
-                activity['activity'],
-                activity['actor']['login'],
-                activity['repository']['id']
-            ]], columns=['date', 'activity', 'contributor', 'repository'])
-            new_row['owner'] = self._get_repo_owner(activity)
-            activities_df = pd.concat([activities_df, new_row], ignore_index=True)
+            dates.append(activity['start_date'])
+            names.append(activity['activity'])
+            contributors.append(activity['actor']['login'])
+            repositories.append(activity['repository']['id'])
+
+        activities_df = pd.DataFrame({
+            'date': dates,
+            'activity': names,
+            'contributor': contributors,
+            'repository': repositories,
+            'owner': self._get_repo_owners(activities),
+        })
         activities_df['date'] = (pd.to_datetime(activities_df['date'], errors='coerce', format='%Y-%m-%dT%H:%M:%SZ')
                                  .dt.tz_localize(None))
 
         return activities_df
 
-    @staticmethod
-    def extract_features(df, contributor):
+    def activity_table_to_df(self, activities):
+        """
+        Convert an `ActivityTable` to the DataFrame of `activity_to_df` (same DataFrame as for the activities as
+        dictionaries). The columns are taken from the arrays of the table and the owners are resolved once per
+        distinct repository.
+
+        Parameters:
+            activities: An `ActivityTable` with the activities of a contributor
+
+        Returns:
+            A DataFrame with the columns 'date', 'activity', 'contributor', 'repository' and 'owner'
+        """
+        if not len(activities):
+            return self.activity_to_df([])
+        owners = self._get_repo_owners([{'repository': repository} for repository in activities.repositories])
+        return pd.DataFrame({
+            'date': activities.start.astype('datetime64[ns]'),
+            'activity': activities.names(),
+            'contributor': activities.logins(),
+            'repository': activities.repository_ids(),
+            'owner': activities.per_repository(owners),
+        })
+
+    def extract_features(self, df, contributor):
         """
         Extract the features from the activities of a user.
         It uses the same features as the RABBIT feature extractor but does not remove some features
         (NR, DCA_iqr, NAR_std, NTR_IQR, NCAR_median, NCAR_gini, DCAR_gini).
+        With `native_features`, the features are computed natively with NumPy (see `gitbot_utils.features`)
+        instead of with the RABBIT extractor.
 
         args:
         - df: activity DataFrame with the columns 'date', 'activity', 'contributor', 'repository' (id) and 'owner'
@@ -167,34 +370,9 @@ class APIManager:
         - DCAT: time taken to switch activity type (mean, median, std, gini and IQR),
         - NAT: number of activities per type (mean, median, std, gini and IQR).
         """
-        features = ['NA', 'NT', 'NR', 'NOR', 'ORR',
-                    'NAR_mean', 'NAR_median', 'NAR_std', 'NAR_gini', 'NAR_IQR',
-                    'NAT_mean', 'NAT_median', 'NAT_std', 'NAT_gini', 'NAT_IQR',
-                    'NCAR_mean', 'NCAR_median', 'NCAR_std', 'NCAR_gini', 'NCAR_IQR',
-                    'NTR_mean', 'NTR_median', 'NTR_std', 'NTR_gini', 'NTR_IQR',
-                    'DCAR_mean', 'DCAR_median', 'DCAR_std', 'DCAR_gini', 'DCAR_IQR',
-                    'DAAR_mean', 'DAAR_median', 'DAAR_std', 'DAAR_gini', 'DAAR_IQR',
-                    'DCA_mean', 'DCA_median', 'DCA_std', 'DCA_gini', 'DCA_IQR',
-                    'DCAT_mean', 'DCAT_median', 'DCAT_std', 'DCAT_gini', 'DCAT_IQR',
-                    ]
-
-        df['date'] = pd.to_datetime(df.date, errors='coerce', format='%Y-%m-%dT%H:%M:%S+00:00').dt.tz_localize(None)
-
-        # Extract features using RABBIT extractor
-        df_feat = pd.json_normalize(stats(df), sep='_')
-
-        # Add column 'NR' for Number of Repositories
-        df_feat['NR'] = np.int64(df['repository'].nunique())
-
-        df_feat = (
-            convert_col_type(df_feat)
-            .rename(columns={'feat_NA': 'NA', 'feat_NT': 'NT', 'feat_NOR': 'NOR', 'feat_ORR': 'ORR'})
-            [features]  # Reorder the columns
-            .sort_index()
-            .set_index([[contributor]])
-        )
-
-        return df_feat
+        if self.native_features:
+            return features.extract_features(df, contributor)
+        return _rabbit_features(df).sort_index().set_index([[contributor]])
 
     def compute_features(self, contributor):
         """
@@ -203,14 +381,15 @@ class APIManager:
         It follows these steps:
         1. Query the events of the contributor.
         2. Check if the number of events is less than `min_events`. If so, return None.
-        3. Convert the events to activities.
+        3. Convert the events to activities (as an `ActivityTable`).
         5. Extract the features from the activities.
         """
         events = self.query_events(contributor)
         if len(events) < self.min_events:
             return None
 
-        activities = self.events_to_activities(events)
-        activities_df = self.activity_to_df(activities)
-        features = self.extract_features(activities_df, contributor)
-        return features
+        activities = self.events_to_activity_table(events)
+        # The table does not refer to the events, which can be released before the features are computed
+        del events
+        activities_df = self.activity_table_to_df(activities)
+        return self.extract_features(activities_df, contributor)
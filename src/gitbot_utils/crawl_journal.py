@@ -0,0 +1,177 @@
+"""
+Checkpoint journal of a crawl of repositories (see `scripts/create_gitlab_dataset.py`), stored in SQLite.
+
+For each repository and each kind of crawl ('members' or 'contributors'), the journal keeps:
+- the users selected in the repository (so that a restarted crawl keeps the same random sample),
+- the features of each user as soon as they are computed (None for the users without enough events),
+- whether the results of the repository were appended to the output file.
+
+Each change is committed immediately, so a crawl can be stopped at any time and restarted at the exact point where
+it stopped: the API calls of the users and repositories already done are skipped.
+
+The results are appended to the output CSV file by repository (`write_results`). The size of the file after each
+append is recorded in the same transaction as the repository, and the file is truncated to this size when the
+journal is opened: rows appended by a crawl that stopped before recording them are removed, so they are never
+written twice.
+"""
+
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from .features import COUNT_FEATURES, FEATURES
+
+
+def _features_to_json(features):
+    """
+    Serialize a single-row DataFrame of features (None if the user has no features).
+    """
+    if features is None:
+        return None
+    return json.dumps({feature: features[feature].iloc[0].item() for feature in FEATURES})
+
+
+def _features_from_json(content, contributor):
+    """
+    Single-row DataFrame of features (same types as `features.extract_features`) from `_features_to_json`.
+    """
+    if content is None:
+        return None
+    values = json.loads(content)
+    return pd.DataFrame({
+        feature: [int(values[feature]) if feature in COUNT_FEATURES else float(values[feature])]
+        for feature in FEATURES
+    }, index=[contributor])
+
+
+class CrawlJournal:
+    """
+    Durable journal of the repositories, members and contributors processed by a crawl.
+
+    Attributes:
+        path (str): Path of the SQLite database
+        output (str): Path of the CSV file where the results are appended
+        columns (list): Columns of the output file
+    """
+
+    def __init__(self, path, output, columns):
+        self.path = path
+        self.output = output
+        self.columns = list(columns)
+        self._connection = sqlite3.connect(path, timeout=30)
+        with self._connection as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS repositories (kind TEXT NOT NULL, repository TEXT NOT NULL, "
+                               "users TEXT NOT NULL, written INTEGER NOT NULL DEFAULT 0, "
+                               "PRIMARY KEY (kind, repository))")
+            connection.execute("CREATE TABLE IF NOT EXISTS users (kind TEXT NOT NULL, repository TEXT NOT NULL, "
+                               "username TEXT NOT NULL, features TEXT, PRIMARY KEY (kind, repository, username))")
+            connection.execute("CREATE TABLE IF NOT EXISTS outputs (path TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+        self._restore_output()
+
+    def _restore_output(self):
+        """
+        Remove the rows appended to the output file after the last recorded append
+        (an existing file unknown to the journal is kept as it is).
+        """
+        row = self._connection.execute("SELECT size FROM outputs WHERE path = ?", (self.output,)).fetchone()
+        current_size = os.path.getsize(self.output) if os.path.isfile(self.output) else 0
+        if row is None:
+            with self._connection as connection:
+                connection.execute("INSERT INTO outputs VALUES (?, ?)", (self.output, current_size))
+        elif current_size > row[0]:
+            with open(self.output, 'rb+') as file:
+                file.truncate(row[0])
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def users(self, kind, repository):
+        """
+        Users selected in a repository (None if the repository was not started).
+        """
+        row = self._connection.execute("SELECT users FROM repositories WHERE kind = ? AND repository = ?",
+                                       (kind, str(repository))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def start_repository(self, kind, repository, users):
+        """
+        Record the users selected in a repository (list of dictionaries with the keys 'id', 'username' and 'name').
+        """
+        with self._connection as connection:
+            connection.execute("INSERT OR REPLACE INTO repositories (kind, repository, users) VALUES (?, ?, ?)",
+                               (kind, str(repository), json.dumps(users)))
+
+    def features(self, kind, repository):
+        """
+        Features of the users of a repository that are done.
+
+        Returns:
+            A dictionary with the features of each user done (single-row DataFrame, or None without enough events)
+        """
+        rows = self._connection.execute("SELECT username, features FROM users WHERE kind = ? AND repository = ?",
+                                        (kind, str(repository))).fetchall()
+        return {username: _features_from_json(content, username) for username, content in rows}
+
+    def add_features(self, kind, repository, username, features):
+        """
+        Record the features of a user of a repository (None if the user does not have enough events).
+        """
+        content = _features_to_json(features)
+        with self._connection as connection:
+            connection.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                               (kind, str(repository), username, content))
+
+    def is_written(self, kind, repository):
+        """
+        Whether the results of a repository were appended to the output file.
+        """
+        row = self._connection.execute("SELECT written FROM repositories WHERE kind = ? AND repository = ?",
+                                       (kind, str(repository))).fetchone()
+        return bool(row and row[0])
+
+    def written_repositories(self, kind):
+        """
+        Repositories whose results were appended to the output file.
+        """
+        rows = self._connection.execute("SELECT repository FROM repositories WHERE kind = ? AND written = 1",
+                                        (kind,)).fetchall()
+        return {repository for repository, in rows}
+
+    def write_results(self, kind, repository, results):
+        """
+        Append the results of a repository to the output file and mark the repository as written.
+
+        Parameters:
+            kind: The kind of crawl ('members' or 'contributors')
+            repository: The id of the repository
+            results: A DataFrame with the results of the repository (possibly empty)
+        """
+        if not results.empty:
+            write_header = not os.path.isfile(self.output) or os.path.getsize(self.output) == 0
+            with open(self.output, 'a', newline='') as file:
+                file.write(results.reindex(columns=self.columns).to_csv(index=False, header=write_header))
+                file.flush()
+                os.fsync(file.fileno())
+        size = os.path.getsize(self.output) if os.path.isfile(self.output) else 0
+        with self._connection as connection:
+            connection.execute("UPDATE repositories SET written = 1 WHERE kind = ? AND repository = ?",
+                               (kind, str(repository)))
+            connection.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?)", (self.output, size))
+
+    def progress(self, kind):
+        """
+        Number of repositories written, of repositories started and of users done.
+        """
+        written, started = self._connection.execute(
+            "SELECT COALESCE(SUM(written), 0), COUNT(*) FROM repositories WHERE kind = ?", (kind,)).fetchone()
+        users, = self._connection.execute("SELECT COUNT(*) FROM users WHERE kind = ?", (kind,)).fetchone()
+        return {'written': written, 'started': started, 'users': users}
@@ -0,0 +1,213 @@
+"""
+Columnar archive of the GitLab events of the users (Parquet files, requires `pyarrow`).
+
+The archive only keeps the fields of the events used by glmap (see `mapping.event_columns`), flattened in one column per
+dotted path (ex: `note.noteable_type`). For each nested object (ex: `note`), a boolean column records whether the
+object is present in the event (absent objects are read as None), so that the events read from the archive
+are mapped exactly as the original ones.
+
+The archive is partitioned by origin (`<folder>/origin=<origin>/part-<n>.parquet`) and each row has
+the username of its user. The reads are memory-mapped and only decode the requested columns.
+"""
+
+import json
+import os
+import uuid
+from collections import defaultdict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import json_codec
+from .mapping import event_columns
+
+# Columns of the fields holding integers (the other fields are strings)
+INT_COLUMNS = {'id', 'project_id', 'author.id', 'target_id', 'target_iid',
+               'note.id', 'note.noteable_id', 'note.noteable_iid', 'note.position.new_line',
+               'push_data.commit_count', 'push_data.ref_count'}
+# Columns of the fields holding objects or lists (stored as JSON strings)
+JSON_COLUMNS = {'note.position.line_range'}
+
+
+def _parents(column):
+    """
+    Paths of the nested objects containing a field (ex: `note.position.new_line` -> `note`, `note.position`).
+    """
+    parts = column.split('.')
+    return ['.'.join(parts[:i]) for i in range(1, len(parts))]
+
+
+class EventArchive:
+    """
+    Parquet archive of the events of the users, partitioned by origin.
+
+    Attributes:
+        folder (str): The folder of the archive
+        columns (list): The field paths stored in the archive
+        row_group_size (int): The number of rows of each row group of the files
+    """
+
+    def __init__(self, folder, columns=None, row_group_size=64 * 1024):
+        self.folder = folder
+        self.columns = list(columns or event_columns('glmap'))
+        self.row_group_size = row_group_size
+        # Nested objects of the stored fields (one presence column each)
+        self.objects = sorted({parent for column in self.columns for parent in _parents(column)})
+
+    def schema(self):
+        """
+        Schema of the files of the archive.
+        """
+        fields = [pa.field('username', pa.string())]
+        fields += [pa.field(column, pa.int64() if column in INT_COLUMNS else pa.string()) for column in self.columns]
+        fields += [pa.field(f'{obj}?', pa.bool_()) for obj in self.objects]
+        return pa.schema(fields)
+
+    def _partition(self, origin):
+        return os.path.join(self.folder, f'origin={origin}')
+
+    def origins(self):
+        """
+        Origins of the partitions of the archive.
+        """
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name[len('origin='):] for name in os.listdir(self.folder) if name.startswith('origin='))
+
+    def _to_table(self, user_events):
+        """
+        Flatten the events of the users to a table with the schema of the archive.
+        """
+        events = [event for user_events_list in user_events.values() for event in user_events_list]
+        # Key: path of an object or a field ('' for the events) - Value: list of its values (one per event)
+        values = {'': events}
+        for path in [*self.objects, *self.columns]:
+            parent, _, key = path.rpartition('.')
+            values[path] = [obj.get(key) if isinstance(obj, dict) else None for obj in values[parent]]
+
+        data = {'username': [username for username, user_events_list in user_events.items() for _ in user_events_list]}
+        for column in self.columns:
+            data[column] = values[column]
+            if column in JSON_COLUMNS:
+                data[column] = [json.dumps(value) if value is not None else None for value in values[column]]
+        for obj in self.objects:
+            data[f'{obj}?'] = [isinstance(value, dict) for value in values[obj]]
+        schema = self.schema()
+        return pa.table([pa.array(data[field.name], type=field.type) for field in schema], schema=schema)
+
+    def write(self, origin, user_events, overwrite=False):
+        """
+        Write the events of users in a new file of the partition of an origin.
+
+        Parameters:
+            origin: The origin of the users (ex: 'human')
+            user_events: A dictionary with the events of each user (Key: username)
+            overwrite: Whether the previous files of the partition are removed (once the new file is written)
+
+        Returns:
+            The path of the new file
+        """
+        partition = self._partition(origin)
+        os.makedirs(partition, exist_ok=True)
+        previous = [os.path.join(partition, name) for name in os.listdir(partition) if name.endswith('.parquet')]
+
+        path = os.path.join(partition, f'part-{uuid.uuid4().hex}.parquet')
+        pq.write_table(self._to_table(user_events), f'{path}.tmp', row_group_size=self.row_group_size)
+        os.replace(f'{path}.tmp', path)
+
+        if overwrite:
+            for old_path in previous:
+                os.remove(old_path)
+        return path
+
+    def read_table(self, origin=None, usernames=None, columns=None):
+        """
+        Read the rows of the archive (memory-mapped), with only the requested columns.
+
+        Parameters:
+            origin: The origin of the users to read (default: all the origins)
+            usernames: The usernames of the users to read (default: all the users)
+            columns: The field paths to read (default: all the stored fields)
+
+        Returns:
+            A `pyarrow.Table` with a 'username' column, the requested columns and the presence columns
+            of their nested objects
+        """
+        columns = list(self.columns if columns is None else columns)
+        objects = sorted({parent for column in columns for parent in _parents(column)})
+        filters = []
+        if usernames is not None:
+            filters.append(('username', 'in', list(usernames)))
+
+        origins = [origin] if origin is not None else self.origins()
+        tables = []
+        for partition_origin in origins:
+            partition = self._partition(partition_origin)
+            if not os.path.isdir(partition):
+                continue
+            paths = sorted(os.path.join(partition, name) for name in os.listdir(partition) if name.endswith('.parquet'))
+            for path in paths:
+                tables.append(pq.read_table(path, columns=['username', *columns, *(f'{obj}?' for obj in objects)],
+                                            filters=filters or None, memory_map=True))
+        if not tables:
+            schema = self.schema()
+            return pa.schema([schema.field('username'), *(schema.field(column) for column in columns),
+                              *(schema.field(f'{obj}?') for obj in objects)]).empty_table()
+        return pa.concat_tables(tables)
+
+    def load(self, origin=None, usernames=None, columns=None):
+        """
+        Read the events of the users of the archive.
+
+        Parameters:
+            origin: The origin of the users to read (default: all the origins)
+            usernames: The usernames of the users to read (default: all the users)
+            columns: The field paths to read (default: all the stored fields)
+
+        Returns:
+            A dictionary with the events of each user (nested dictionaries, in the order in which they were written)
+        """
+        return self.events_from_table(self.read_table(origin, usernames, columns))
+
+    @staticmethod
+    def events_from_table(table):
+        """
+        Events of each user of a table returned by `read_table` (possibly filtered).
+
+        Returns:
+            A dictionary with the events of each user (nested dictionaries, in the order of the rows)
+        """
+        columns = [name for name in table.column_names if name != 'username' and not name.endswith('?')]
+        values = {name: table.column(name).to_pylist() for name in table.column_names}
+        for column in JSON_COLUMNS.intersection(columns):
+            values[column] = [json_codec.loads(value) if value is not None else None for value in values[column]]
+
+        # Build the nested objects column by column, from the deepest ones to the events themselves
+        # Key: path of an object ('' for the event) - Value: list of (key, values) of its direct fields
+        fields = defaultdict(list)
+        for column in columns:
+            parent, _, key = column.rpartition('.')
+            fields[parent].append((key, values[column]))
+        objects = sorted({parent for column in columns for parent in _parents(column)},
+                         key=lambda obj: obj.count('.'), reverse=True)
+        for obj in objects:
+            keys = [key for key, _ in fields[obj]]
+            rows = zip(values[f'{obj}?'], *(obj_values for _, obj_values in fields[obj]))
+            # An absent object is None (same value as a missing field for the mappers)
+            built = [dict(zip(keys, row[1:])) if row[0] else None for row in rows]
+            parent, _, key = obj.rpartition('.')
+            fields[parent].append((key, built))
+
+        keys = [key for key, _ in fields['']]
+        events = (dict(zip(keys, row)) for row in zip(*(event_values for _, event_values in fields[''])))
+        user_events = defaultdict(list)
+        for username, event in zip(values['username'], events):
+            user_events[username].append(event)
+        return dict(user_events)
+
+    def users(self, origin=None):
+        """
+        Usernames of the users of the archive.
+        """
+        table = self.read_table(origin, columns=[])
+        return sorted(set(table.column('username').to_pylist()))
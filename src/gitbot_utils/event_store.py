@@ -0,0 +1,235 @@
+"""
+Append-only store of the events of the users, refreshed with delta fetches.
+
+Each user has a folder with:
+- segments (`segment-<n>.jsonl`, one compact JSON event per line), each one holding the new events of a fetch;
+- a cursor (`cursor.json`) with the `created_at` and the id of the most recent event stored, and the ids of the
+  events stored in the window of the cursor (created at or after the day before the cursor, see `window_start`).
+
+On refresh, only the events created in the window of the cursor are queried (GitLab `after` parameter, see
+`GitLabManager.query_events_after`), so the new events can only overlap the events of the window: they are
+deduplicated against the ids of the cursor, without reading the segments. When a user has more than
+`max_segments` segments, they are compacted into a single one.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from . import json_codec
+
+
+class EventStore:
+    """
+    Append-only per-user event store.
+
+    Attributes:
+        folder (str): The folder of the store (one sub-folder per user)
+        max_segments (int): Number of segments of a user above which they are compacted
+    """
+
+    def __init__(self, folder, max_segments=8):
+        self.folder = folder
+        self.max_segments = max_segments
+
+    def _user_folder(self, username):
+        return os.path.join(self.folder, username)
+
+    def _segments(self, username):
+        """
+        Paths of the segments of a user, from the oldest to the most recent.
+        """
+        folder = self._user_folder(username)
+        if not os.path.isdir(folder):
+            return []
+        names = sorted(name for name in os.listdir(folder) if name.startswith('segment-') and name.endswith('.jsonl'))
+        return [os.path.join(folder, name) for name in names]
+
+    @staticmethod
+    def _write(path, content):
+        """
+        Write a file atomically (readers never see a partial file).
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def users(self):
+        """
+        Usernames of the users in the store.
+        """
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name for name in os.listdir(self.folder) if os.path.isdir(self._user_folder(name)))
+
+    @staticmethod
+    def window_start(cursor):
+        """
+        Start of the window of a cursor (Format: YYYY-MM-DD): the day before the day of the cursor
+        (GitLab `after` is a date, exclusive).
+        """
+        day = datetime.strptime(cursor['created_at'][:10], '%Y-%m-%d') - timedelta(days=1)
+        return day.strftime('%Y-%m-%d')
+
+    def cursor(self, username):
+        """
+        Cursor of a user: a dictionary with the `created_at` and the `id` of its most recent event, and the `recent`
+        [id, created_at] pairs of the events in its window (None if the user has no event in the store).
+        """
+        try:
+            with open(os.path.join(self._user_folder(username), 'cursor.json')) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def load(self, username):
+        """
+        Load the events of a user, from the most recent to the oldest (same order as the API).
+
+        Returns:
+            A list of dictionaries corresponding to the events of the user (empty if the user is not in the store)
+        """
+        events = {}
+        for path in self._segments(username):
+            with open(path, 'rb') as file:
+                for line in file:
+                    event = json_codec.loads(line)
+                    events[event['id']] = event
+        return sorted(events.values(), key=lambda event: (event['created_at'], event['id']), reverse=True)
+
+    def count(self, username):
+        """
+        Number of events of a user in the store (the segments never hold the same event twice).
+        """
+        total = 0
+        for path in self._segments(username):
+            with open(path, 'rb') as file:
+                total += sum(1 for _ in file)
+        return total
+
+    def _recent_events(self, username, cursor):
+        """
+        Creation date of each event in the window of the cursor (Key: id - Value: `created_at`).
+        The cursors written before the `recent` ids were kept are completed once from the segments.
+        """
+        if cursor is None:
+            return {}
+        if 'recent' not in cursor:
+            start = self.window_start(cursor)
+            cursor['recent'] = [[event['id'], event['created_at']] for event in self.load(username)
+                                if event['created_at'] >= start]
+            self._write(os.path.join(self._user_folder(username), 'cursor.json'), json.dumps(cursor))
+        return {event_id: created_at for event_id, created_at in cursor['recent']}
+
+    def append(self, username, events):
+        """
+        Append the events of a user that are not yet in the store (by id) in a new segment
+        and move the cursor to the most recent event.
+        The events created in the window of the cursor (all the events of `refresh`) are compared with the ids
+        of the cursor only. The segments are read only if some events are older (ex: import of a former dump).
+
+        Returns:
+            The number of new events
+        """
+        cursor = self.cursor(username)
+        recent = self._recent_events(username, cursor)
+        if cursor is not None and any(event['created_at'] < self.window_start(cursor) for event in events):
+            known_ids = {event['id'] for event in self.load(username)}
+        else:
+            known_ids = recent
+        new_events = [event for event in events if event['id'] not in known_ids]
+        new_events = list({event['id']: event for event in new_events}.values())
+        if not new_events:
+            return 0
+
+        folder = self._user_folder(username)
+        os.makedirs(folder, exist_ok=True)
+        segments = self._segments(username)
+        number = int(os.path.basename(segments[-1])[len('segment-'):-len('.jsonl')]) + 1 if segments else 1
+        self._write(os.path.join(folder, f'segment-{number:06d}.jsonl'),
+                    ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in new_events))
+
+        newest = max(new_events, key=lambda event: (event['created_at'], event['id']))
+        if cursor is None or (newest['created_at'], newest['id']) > (cursor['created_at'], cursor['id']):
+            cursor = {'created_at': newest['created_at'], 'id': newest['id']}
+        # The ids of the new window: the events of the previous window and the new events still in it
+        start = self.window_start(cursor)
+        recent.update((event['id'], event['created_at']) for event in new_events)
+        cursor['recent'] = [[event_id, created_at] for event_id, created_at in recent.items() if created_at >= start]
+        self._write(os.path.join(folder, 'cursor.json'), json.dumps(cursor))
+
+        if len(segments) + 1 > self.max_segments:
+            self.compact(username)
+        return len(new_events)
+
+    def compact(self, username):
+        """
+        Merge the segments of a user into a single segment (without duplicates).
+        """
+        segments = self._segments(username)
+        if len(segments) <= 1:
+            return
+        events = self.load(username)
+        # The merged segment replaces the most recent one, so that a crash never loses events
+        self._write(segments[-1], ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events))
+        for path in segments[:-1]:
+            os.remove(path)
+
+    def import_json_files(self):
+        """
+        Import the events of the `<username>.json` files of the folder of the store
+        (format of the former version of `save_user_events.py`).
+        The files of the users already in the store are skipped (imported by a previous call).
+
+        Returns:
+            The number of imported users
+        """
+        if not os.path.isdir(self.folder):
+            return 0
+        users = set(self.users())
+        names = [name for name in os.listdir(self.folder)
+                 if name.endswith('.json') and name[:-len('.json')] not in users]
+        for name in names:
+            self.append(name[:-len('.json')], json_codec.load(os.path.join(self.folder, name)))
+        return len(names)
+
+    def refresh(self, manager, username, contributor):
+        """
+        Fetch the new events of a user and append them to the store.
+        Without cursor, the events are queried with `manager.query_events`. Otherwise, only the events created
+        in the window of the cursor are queried (at most `query_events_after` pages, the next refresh continues
+        from the new cursor), and the events already stored are skipped.
+
+        Parameters:
+            manager: A `GitLabManager`
+            username: The username of the user (name of its folder in the store)
+            contributor: The id (or username) of the user in the API
+
+        Returns:
+            The number of new events
+        """
+        cursor = self.cursor(username)
+        if cursor is None:
+            events = manager.query_events(contributor)
+        else:
+            events = manager.query_events_after(contributor, self.window_start(cursor))
+        return self.append(username, events)
+
+    def refresh_many(self, manager, users, max_workers=None):
+        """
+        Refresh several users concurrently.
+
+        Parameters:
+            manager: A `GitLabManager`
+            users: A list of (username, contributor) pairs
+            max_workers: The maximum number of users refreshed in parallel (default: `manager.max_workers`)
+
+        Returns:
+            A dictionary with the number of new events of each user
+        """
+        users = list(users)
+        with ThreadPoolExecutor(max_workers=max_workers or manager.max_workers) as executor:
+            results = executor.map(lambda user: self.refresh(manager, *user), users)
+            return dict(zip((username for username, _ in users), results))
@@ -0,0 +1,152 @@
+"""
+Flat array version of the gradient boosting models of `resources/models` (for fast, low-latency scoring).
+
+The models are scikit-learn pipelines:
+- a `ColumnTransformer` with a `MissingIndicator` and a median `SimpleImputer` on the same columns, and the
+  other columns passed through,
+- a binary `GradientBoostingClassifier` (regression trees on the float32 transformed features).
+
+`export_model` stores such a pipeline in a .npz file: the parameters of the preprocessing, the initial raw
+prediction, the learning rate, and the nodes of all the trees concatenated in flat arrays (feature, threshold,
+left and right children, leaf value). `FastModel` loads this file with NumPy only (no scikit-learn import) and
+predicts all the trees at once: the nodes of every (contributor, tree) pair go down one level per iteration.
+The raw predictions are accumulated tree after tree, in the same order as scikit-learn, so the probabilities
+are the same as `model.predict_proba`.
+
+The .npz files of the models are exported with `scripts/export_models.py`.
+"""
+
+import math
+
+import numpy as np
+
+# Leaves of scikit-learn trees have no children (-1)
+TREE_LEAF = -1
+
+
+def _check_pipeline(model):
+    """
+    Steps of a supported pipeline: the column transformer and the gradient boosting classifier.
+    """
+    steps = getattr(model, 'steps', None)
+    if not steps or len(steps) != 2:
+        raise ValueError("Only pipelines with a preprocessor and a classifier are supported.")
+    preprocessor, classifier = steps[0][1], steps[1][1]
+    kinds = [type(transformer).__name__ for _, transformer, _ in preprocessor.transformers_]
+    if kinds != ['MissingIndicator', 'SimpleImputer', 'FunctionTransformer']:
+        raise ValueError(f"Unsupported preprocessor: {kinds}")
+    if type(classifier).__name__ != 'GradientBoostingClassifier' or len(classifier.classes_) != 2:
+        raise ValueError("Only binary GradientBoostingClassifier models are supported.")
+    return preprocessor, classifier
+
+
+def export_model(model, path):
+    """
+    Export a scikit-learn pipeline (see the module documentation) to a .npz file for `FastModel`.
+
+    Parameters:
+        model: The pipeline to export
+        path: The path of the .npz file
+    """
+    preprocessor, classifier = _check_pipeline(model)
+    (_, indicator, indicator_columns), (_, imputer, imputer_columns), (_, _, remainder_columns) = \
+        preprocessor.transformers_
+    if indicator.features != 'all' or imputer.strategy != 'median':
+        raise ValueError("Only MissingIndicator(features='all') and median SimpleImputer are supported.")
+    features = list(model.feature_names_in_)
+
+    trees = [estimator.tree_ for estimator in classifier.estimators_[:, 0]]
+    sizes = np.array([tree.node_count for tree in trees])
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    left = np.concatenate([np.where(tree.children_left == TREE_LEAF, np.arange(tree.node_count),
+                                    tree.children_left) + offset for tree, offset in zip(trees, offsets)])
+    right = np.concatenate([np.where(tree.children_right == TREE_LEAF, np.arange(tree.node_count),
+                                     tree.children_right) + offset for tree, offset in zip(trees, offsets)])
+
+    # Initial raw prediction (the prior of the classifier, constant for every contributor)
+    sample = np.zeros((1, classifier.n_features_in_), dtype=np.float32)
+    init = float(classifier._raw_predict_init(sample)[0, 0])
+
+    np.savez(
+        path,
+        features=np.array(features),
+        indicator_columns=np.array([features.index(column) for column in indicator_columns]),
+        imputer_columns=np.array([features.index(column) for column in imputer_columns]),
+        imputer_statistics=np.asarray(imputer.statistics_, dtype=np.float64),
+        remainder_columns=np.array([features.index(column) for column in remainder_columns]),
+        init=np.float64(init),
+        learning_rate=np.float64(classifier.learning_rate),
+        depth=np.int64(max(tree.max_depth for tree in trees)),
+        roots=offsets,
+        feature=np.concatenate([np.maximum(tree.feature, 0) for tree in trees]),
+        threshold=np.concatenate([tree.threshold for tree in trees]),
+        left=left,
+        right=right,
+        value=np.concatenate([tree.value[:, 0, 0] for tree in trees]),
+    )
+
+
+class FastModel:
+    """
+    Model exported by `export_model`, with the same `feature_names_in_` and `predict_proba` as the pipeline.
+    """
+
+    def __init__(self, path):
+        """
+        Load an exported model.
+
+        Parameters:
+            path: The path of the .npz file
+        """
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        self.feature_names_in_ = arrays.pop('features').astype(object)
+        self.init = float(arrays.pop('init'))
+        self.learning_rate = float(arrays.pop('learning_rate'))
+        self.depth = int(arrays.pop('depth'))
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.classes_ = np.array([0, 1])
+
+    def transform(self, X):
+        """
+        Features given to the trees: missing indicators, imputed columns and other columns (as float32 values).
+        """
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float64)
+        imputed = X[:, self.imputer_columns]
+        missing = np.isnan(imputed)
+        remainder = X[:, self.remainder_columns]
+        if np.isnan(remainder).any():
+            raise ValueError("Input contains NaN.")
+        transformed = np.hstack([np.isnan(X[:, self.indicator_columns]), np.where(missing, self.imputer_statistics,
+                                                                                   imputed), remainder])
+        return transformed.astype(np.float32).astype(np.float64)
+
+    def decision_function(self, X):
+        """
+        Raw predictions (log-odds of being a bot) of the contributors.
+        """
+        X = self.transform(X)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        # Same accumulation order as scikit-learn: the initial prediction, then each tree one after the other
+        leaf_values = self.learning_rate * self.value[nodes]
+        return np.add.accumulate(np.hstack([np.full((len(X), 1), self.init), leaf_values]), axis=1)[:, -1]
+
+    def predict_proba(self, X):
+        """
+        Probabilities of being a human (column 0) and a bot (column 1), as `model.predict_proba`.
+        """
+        # `math.exp` (C library) gives the same results as `scipy.special.expit` used by scikit-learn,
+        # the vectorized `np.exp` can differ by one ulp
+        exp = np.array([math.exp(-value) for value in self.decision_function(X).tolist()], dtype=np.float64)
+        proba = 1 / (1 + exp)
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int64)
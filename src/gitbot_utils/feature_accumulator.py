@@ -0,0 +1,292 @@
+"""
+Incremental computation of the BIMBAS features of a contributor (see `gitbot_utils.features`).
+
+A `FeatureAccumulator` is updated with the new activities of a contributor (in chronological order) in
+O(number of new activities), and produces the same feature row as `features.extract_features` on all the
+activities seen so far:
+- NA, NT, NR, NOR and ORR, as well as the NAR, NAT and NTR statistics, are exact: they are computed from the
+  number of activities per repository/type and the types of each repository.
+- NCAR, DCAR, DAAR, DCA and DCAT are streams of values (runs of consecutive activities in the same repository
+  and delays between activities). The last run is tracked exactly and each stream is summarized by a
+  `StreamSketch`: exact count, mean and std (running sums), and exact median, gini and IQR up to
+  `max_exact` values. Beyond, the values are kept in logarithmic buckets with a relative accuracy `alpha`:
+  the median and the quartiles have a relative error of at most `alpha`, the IQR an absolute error of at most
+  `alpha * (Q1 + Q3)` and the Gini coefficient an absolute error of at most `alpha`.
+
+The state is serializable with `to_dict` / `from_dict` (JSON compatible) to be persisted between two updates.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from .features import COUNT_FEATURES, FEATURES, NS_PER_HOUR, STATISTICS, _round, statistics
+
+
+class StreamSketch:
+    """
+    Summary of a stream of non-negative values for the statistics of `features.statistics`.
+    """
+
+    def __init__(self, alpha=0.005, max_exact=4096):
+        """
+        Initialize an empty sketch.
+
+        Parameters:
+            alpha: The relative accuracy of the logarithmic buckets
+            max_exact: The number of values kept exactly before switching to the buckets
+        """
+        self.alpha = alpha
+        self.max_exact = max_exact
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Exact values (None once the sketch uses the buckets)
+        self.values = []
+        self.zeros = 0
+        self.buckets = {}
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        self.total += value
+        # Welford's algorithm for the mean and the variance
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.values is not None:
+            self.values.append(value)
+            if len(self.values) > self.max_exact:
+                for exact_value in self.values:
+                    self._add_to_bucket(exact_value)
+                self.values = None
+        else:
+            self._add_to_bucket(value)
+
+    def _add_to_bucket(self, value):
+        if value <= 0:
+            self.zeros += 1
+        else:
+            index = math.ceil(math.log(value, self.gamma))
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def _sorted_buckets(self):
+        """
+        Representative value and count of each bucket (zeros included), sorted by value.
+        """
+        indexes = sorted(self.buckets)
+        values = [0.0] + [2 * self.gamma ** index / (self.gamma + 1) for index in indexes]
+        counts = [self.zeros] + [self.buckets[index] for index in indexes]
+        return np.array(values), np.array(counts, dtype=np.int64)
+
+    def statistics(self):
+        """
+        Statistics of the values: mean, median, std, gini and IQR (rounded to 3 decimals).
+
+        Returns:
+            A list with the statistics in the order of `STATISTICS`
+        """
+        if self.values is not None:
+            return statistics(self.values)
+        std = math.sqrt(self.m2 / (self.count - 1))
+        values, counts = self._sorted_buckets()
+        ends = np.cumsum(counts)
+
+        def value_at(rank):
+            return values[np.searchsorted(ends, rank, side='right')]
+
+        def quantile(q):
+            position = q * (self.count - 1)
+            low = int(position)
+            low_value, high_value = value_at(low), value_at(min(low + 1, self.count - 1))
+            return low_value + (high_value - low_value) * (position - low)
+
+        # Sum of (2i - n - 1) over the ranks i of each bucket, applied to the representative value of the bucket
+        starts = ends - counts
+        weights = counts * (2 * starts + counts - self.count)
+        gini = float(np.dot(weights, values) / (self.count * self.total)) if self.total else 0.0
+        median = (value_at((self.count - 1) // 2) + value_at(self.count // 2)) / 2
+        return [_round(self.mean), _round(median), _round(std), _round(gini), _round(quantile(0.75) - quantile(0.25))]
+
+    def to_dict(self):
+        return {
+            'alpha': self.alpha, 'max_exact': self.max_exact, 'count': self.count, 'total': self.total,
+            'mean': self.mean, 'm2': self.m2, 'values': self.values, 'zeros': self.zeros,
+            'buckets': [[index, count] for index, count in self.buckets.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['alpha'], state['max_exact'])
+        sketch.count, sketch.total = state['count'], state['total']
+        sketch.mean, sketch.m2 = state['mean'], state['m2']
+        sketch.values = None if state['values'] is None else list(state['values'])
+        sketch.zeros = state['zeros']
+        sketch.buckets = {index: count for index, count in state['buckets']}
+        return sketch
+
+
+class FeatureAccumulator:
+    """
+    Features of a contributor updated with its new activities (see the module documentation).
+    """
+
+    STREAMS = ['NCAR', 'DCAR', 'DAAR', 'DCA', 'DCAT']
+
+    def __init__(self, alpha=0.005, max_exact=4096):
+        """
+        Initialize the accumulator of a contributor without activity.
+
+        Parameters:
+            alpha: The relative accuracy of the sketches of NCAR, DCAR, DAAR, DCA and DCAT
+            max_exact: The number of values of each of these families kept exactly before using the sketch
+        """
+        self.nb_activities = 0
+        self.type_counts = {}
+        self.repo_counts = {}
+        # Key: repository - Value: activity types in the repository
+        self.repo_types = {}
+        self.owners = set()
+        self.sketches = {family: StreamSketch(alpha, max_exact) for family in self.STREAMS}
+        # Last activity and current run of activities in the same repository
+        self.last_date = None
+        self.last_hours = None
+        self.last_type = None
+        self.last_repo = None
+        self.run_start = None
+        self.run_length = 0
+
+    def add(self, date, activity, repository, owner=None):
+        """
+        Add an activity of the contributor. The activities must be added in chronological order.
+
+        Parameters:
+            date: The date of the activity (a nanosecond timestamp or any value accepted by `np.datetime64`)
+            activity: The activity type
+            repository: The repository of the activity
+            owner: The owner of the repository (None if unknown)
+        """
+        date = int(date) if isinstance(date, (int, np.integer)) else int(np.datetime64(date, 'ns').astype(np.int64))
+        if self.last_date is not None and date < self.last_date:
+            raise ValueError("The activities must be added in chronological order.")
+        hours = date / NS_PER_HOUR
+
+        self.nb_activities += 1
+        self.type_counts[activity] = self.type_counts.get(activity, 0) + 1
+        self.repo_counts[repository] = self.repo_counts.get(repository, 0) + 1
+        self.repo_types.setdefault(repository, set()).add(activity)
+        if not pd.isna(owner):
+            self.owners.add(owner)
+
+        if self.last_date is not None:
+            delay = hours - self.last_hours
+            self.sketches['DCA'].add(delay)
+            if activity != self.last_type:
+                self.sketches['DCAT'].add(delay)
+            if repository != self.last_repo:
+                self.sketches['DAAR'].add(delay)
+                self._close_run()
+        if self.run_start is None:
+            self.run_start = hours
+        self.run_length += 1
+        self.last_date, self.last_hours, self.last_type, self.last_repo = date, hours, activity, repository
+
+    def _close_run(self):
+        self.sketches['NCAR'].add(self.run_length)
+        self.sketches['DCAR'].add(self.last_hours - self.run_start)
+        self.run_start = None
+        self.run_length = 0
+
+    def update(self, df):
+        """
+        Add the activities of an activity DataFrame (sorted by date, they must not be older than the last
+        activity added).
+
+        Parameters:
+            df: activity DataFrame with the columns 'date', 'activity', 'repository' and 'owner'
+        """
+        dates = pd.to_datetime(df['date'], errors='coerce')
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        dates = dates.to_numpy().astype('datetime64[ns]').astype(np.int64)
+        order = np.argsort(dates, kind='stable')
+        columns = [df[column].to_numpy()[order].tolist() for column in ['activity', 'repository', 'owner']]
+        for date, activity, repository, owner in zip(dates[order].tolist(), *columns):
+            self.add(date, activity, repository, owner)
+
+    def features(self):
+        """
+        Features of the activities added so far.
+
+        Returns:
+            A dictionary with the value of each feature of `FEATURES`
+        """
+        nb_repos = len(self.repo_counts)
+        result = {
+            'NA': self.nb_activities,
+            'NT': len(self.type_counts),
+            'NR': nb_repos,
+            'NOR': len(self.owners),
+            'ORR': _round(len(self.owners) / nb_repos) if nb_repos else np.nan,
+        }
+        families = {
+            'NAR': statistics(list(self.repo_counts.values())),
+            'NAT': statistics(list(self.type_counts.values())),
+            'NTR': statistics([len(types) for types in self.repo_types.values()]),
+        }
+        # The current run is not closed yet: it is added to a copy of the NCAR and DCAR sketches
+        sketches = dict(self.sketches)
+        if self.run_length:
+            for family in ['NCAR', 'DCAR']:
+                sketches[family] = StreamSketch.from_dict(sketches[family].to_dict())
+            sketches['NCAR'].add(self.run_length)
+            sketches['DCAR'].add(self.last_hours - self.run_start)
+        for family, sketch in sketches.items():
+            families[family] = sketch.statistics()
+        for family, values in families.items():
+            result.update(zip((f'{family}_{statistic}' for statistic in STATISTICS), values))
+        return {feature: result[feature] for feature in FEATURES}
+
+    def to_frame(self, contributor):
+        """
+        Features of the activities added so far, in the format of `features.extract_features`.
+        """
+        values = self.features()
+        return pd.DataFrame({
+            feature: np.array([values[feature]], dtype=np.int64 if feature in COUNT_FEATURES else np.float64)
+            for feature in FEATURES
+        }, index=[contributor])
+
+    def to_dict(self):
+        """
+        JSON compatible state of the accumulator.
+        """
+        return {
+            'nb_activities': self.nb_activities,
+            'type_counts': [[activity, count] for activity, count in self.type_counts.items()],
+            'repo_counts': [[repository, count] for repository, count in self.repo_counts.items()],
+            'repo_types': [[repository, sorted(types)] for repository, types in self.repo_types.items()],
+            'owners': sorted(self.owners),
+            'sketches': {family: sketch.to_dict() for family, sketch in self.sketches.items()},
+            'last': [self.last_date, self.last_hours, self.last_type, self.last_repo],
+            'run': [self.run_start, self.run_length],
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Accumulator restored from the state returned by `to_dict`.
+        """
+        accumulator = cls()
+        accumulator.nb_activities = state['nb_activities']
+        accumulator.type_counts = {activity: count for activity, count in state['type_counts']}
+        accumulator.repo_counts = {repository: count for repository, count in state['repo_counts']}
+        accumulator.repo_types = {repository: set(types) for repository, types in state['repo_types']}
+        accumulator.owners = set(state['owners'])
+        accumulator.sketches = {family: StreamSketch.from_dict(sketch) for family, sketch in state['sketches'].items()}
+        accumulator.last_date, accumulator.last_hours, accumulator.last_type, accumulator.last_repo = state['last']
+        accumulator.run_start, accumulator.run_length = state['run']
+        return accumulator
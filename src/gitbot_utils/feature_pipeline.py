@@ -0,0 +1,182 @@
+"""
+Parallel computation of the features of the users of an event archive (see `gitbot_utils.event_archive`).
+
+The users are split in chunks of consecutive users, which are processed by a pool of processes. Each worker
+creates its manager (and thus compiles its mappers) once, then for each chunk:
+1. reads the events of the users of the chunk from the archive (the last partitions read by the worker are kept
+   in memory, at most `max_tables`, and filtered for each chunk),
+2. maps the events to activities,
+3. computes the features of each user with the manager (`APIManager.extract_features`, the RABBIT feature
+   extractor by default). With `native_features=True` in `manager_kwargs`, the features of all the users of the
+   chunk are computed in a single pass instead (see `features.extract_features_batch`).
+
+The chunks are appended to the output CSV file as soon as they are done, in the order of the input users, so the
+output is deterministic. After each chunk, the number of input users processed and the size of the output file
+are written to a progress file (`<output>.progress`). A run can be interrupted and started again with the same
+users: the output file is truncated to its recorded size (removing an incomplete chunk) and the run resumes at the
+recorded position in the input (the same contributor can appear several times, ex: in two partitions).
+"""
+
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .event_archive import EventArchive
+from .features import FEATURES, extract_features_batch
+from .gl_api import GitLabManager
+
+# State of a worker process (see `_init_worker`)
+_worker = {}
+
+
+def _init_worker(archive_folder, manager_kwargs, max_tables):
+    """
+    Create the archive and the manager of a worker process (once per process).
+    """
+    _worker['archive'] = EventArchive(archive_folder)
+    _worker['manager'] = GitLabManager(**manager_kwargs)
+    # Key: partition - Value: table of the partition (the least recently used ones are evicted)
+    _worker['tables'] = OrderedDict()
+    _worker['max_tables'] = max_tables
+
+
+def _read_events(partition, usernames):
+    """
+    Events of users of a partition of the archive.
+    """
+    tables = _worker['tables']
+    if partition in tables:
+        tables.move_to_end(partition)
+    else:
+        tables[partition] = _worker['archive'].read_table(partition)
+        while len(tables) > _worker['max_tables']:
+            tables.popitem(last=False)
+    table = tables[partition]
+    table = table.filter(pc.is_in(table['username'], value_set=pa.array(usernames, type=pa.string())))
+    return EventArchive.events_from_table(table)
+
+
+def _process_chunk(chunk):
+    """
+    Compute the features of a chunk of users.
+
+    Parameters:
+        chunk: A list of dictionaries with the 'contributor' and the 'partition' (origin in the archive) of each
+            user, and the other values to copy in the output (ex: label)
+
+    Returns:
+        A DataFrame with the users of the chunk that have events (same order as `chunk`), and the list of the
+        users without events
+    """
+    manager = _worker['manager']
+    user_events = {}
+    for partition in dict.fromkeys(user['partition'] for user in chunk):
+        usernames = [str(user['contributor']) for user in chunk if user['partition'] == partition]
+        for username, events in _read_events(partition, usernames).items():
+            user_events[(partition, username)] = events
+
+    users, frames, missing = [], [], []
+    for user in chunk:
+        events = user_events.get((user['partition'], str(user['contributor'])))
+        if not events:
+            missing.append(user['contributor'])
+            continue
+        activities_df = manager.activity_table_to_df(manager.events_to_activity_table(events))
+        # The activities and the features are attributed to the position of the user in the chunk (the same user
+        # can appear twice)
+        if manager.native_features:
+            frames.append(activities_df.assign(contributor=len(users)))
+        else:
+            frames.append(manager.extract_features(activities_df, user['contributor']).set_axis([len(users)]))
+        users.append(user)
+
+    if not users:
+        return pd.DataFrame(), missing
+    if manager.native_features:
+        features = extract_features_batch(pd.concat(frames, ignore_index=True)).reindex(range(len(users)))
+    else:
+        features = pd.concat(frames)
+    users_df = pd.DataFrame(users).drop(columns='partition')
+    return pd.concat([users_df, features.reset_index(drop=True)], axis=1), missing
+
+
+def _progress_path(output):
+    return output + '.progress'
+
+
+def _read_progress(output):
+    """
+    Number of input users processed and size of the output file after the last chunk written (0, 0 for a new run).
+    The lines written after the last recorded chunk are removed from the output file.
+    """
+    progress = _progress_path(output)
+    if not os.path.isfile(progress):
+        if os.path.isfile(output) and os.path.getsize(output) > 0:
+            raise ValueError(f"{output} exists without a progress file ({progress}): remove it to start a new run")
+        return 0, 0
+    with open(progress) as file:
+        nb_users, size = (int(value) for value in file.read().split())
+    with open(output, 'ab') as file:
+        file.truncate(size)
+    return nb_users, size
+
+
+def _write_progress(output, nb_users, size):
+    """
+    Record the number of input users processed and the size of the output file (replaced atomically).
+    """
+    progress = _progress_path(output)
+    with open(progress + '.tmp', 'w') as file:
+        file.write(f"{nb_users} {size}\n")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(progress + '.tmp', progress)
+
+
+def build_features(users, output, archive_folder, manager_kwargs=None, columns=None, nb_workers=None,
+                   chunk_size=64, max_tables=2):
+    """
+    Compute the features of users from their events in an archive and append them to a CSV file.
+
+    Parameters:
+        users: A DataFrame with a 'contributor' column, a 'partition' column (origin of the user in the archive)
+            and the other columns to copy in the output (ex: 'label', 'origin')
+        output: The path of the CSV file (to resume a run, the users must be the same: the users already processed
+            are skipped by position)
+        archive_folder: The folder of the event archive
+        manager_kwargs: The parameters of the `GitLabManager` of each worker (ex: owner_cache, native_features to
+            compute the features natively by chunk instead of with the RABBIT feature extractor)
+        columns: The columns of the output (default: the columns of `users` without 'partition', then the features)
+        nb_workers: The number of worker processes (default: number of CPUs)
+        chunk_size: The number of users per chunk
+        max_tables: The maximum number of partitions kept in memory by each worker
+
+    Returns:
+        The number of users written and the list of the users without events
+    """
+    if columns is None:
+        columns = [column for column in users.columns if column != 'partition'] + FEATURES
+    nb_done, size = _read_progress(output)
+    records = users.iloc[nb_done:].to_dict('records')
+    chunks = [records[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+
+    nb_written, missing = 0, []
+    with ProcessPoolExecutor(nb_workers, initializer=_init_worker,
+                             initargs=(archive_folder, manager_kwargs or {}, max_tables)) as executor:
+        # `map` returns the chunks in order, as soon as the previous ones are done
+        for chunk, (features, chunk_missing) in zip(chunks, executor.map(_process_chunk, chunks)):
+            missing.extend(chunk_missing)
+            if not features.empty:
+                with open(output, 'a', newline='') as file:
+                    file.write(features[columns].to_csv(index=False, header=size == 0))
+                    file.flush()
+                    os.fsync(file.fileno())
+                size = os.path.getsize(output)
+                nb_written += len(features)
+            nb_done += len(chunk)
+            _write_progress(output, nb_done, size)
+    return nb_written, missing
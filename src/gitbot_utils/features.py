@@ -0,0 +1,354 @@
+"""
+Native implementation of the BIMBAS features, written to give the same values as the RABBIT feature extractor.
+It has not been validated against RABBIT yet (see below): it is not a replacement for the RABBIT extractor.
+
+The activities of a contributor are sorted once by date (stable sort) and their activity types, repositories
+and owners are encoded as integers. Every feature is then computed with NumPy operations on these arrays:
+- counts per repository/type with `np.bincount`,
+- runs of consecutive activities in the same repository from the positions where the repository changes,
+- durations (in hours) from the differences between consecutive dates.
+
+For each family of values, the statistics are the mean, the median, the standard deviation (ddof=1),
+the Gini coefficient and the interquartile range (linear interpolation), rounded to 3 decimals like RABBIT.
+With a single value, the standard deviation and the Gini coefficient are 0. Without value (ex: DAAR for
+a contributor active in a single repository), the mean, median and IQR are NaN while the standard deviation
+and the Gini coefficient are 0.
+
+In the API managers, this extractor is opt-in (`native_features=True`): the RABBIT feature extractor remains
+the default until `benchmarks/bench_features.py`, run with RABBIT installed and on the event archive of the dataset,
+reports no difference with RABBIT and with gitlab_glmap_features.csv (maximum difference of each feature).
+
+`compute_features_batch` computes the features of many contributors in a single pass: the concatenated
+activities are sorted once by (contributor, date) and every family of values is reduced per contributor with
+segmented operations (offsets of the contributors in the sorted arrays, weighted `np.bincount`).
+The sums are accumulated sequentially instead of pairwise, so the statistics can differ from
+`compute_features` by a few ulps before rounding.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Order of the features returned by `extract_features`
+FEATURES = ['NA', 'NT', 'NR', 'NOR', 'ORR',
+            'NAR_mean', 'NAR_median', 'NAR_std', 'NAR_gini', 'NAR_IQR',
+            'NAT_mean', 'NAT_median', 'NAT_std', 'NAT_gini', 'NAT_IQR',
+            'NCAR_mean', 'NCAR_median', 'NCAR_std', 'NCAR_gini', 'NCAR_IQR',
+            'NTR_mean', 'NTR_median', 'NTR_std', 'NTR_gini', 'NTR_IQR',
+            'DCAR_mean', 'DCAR_median', 'DCAR_std', 'DCAR_gini', 'DCAR_IQR',
+            'DAAR_mean', 'DAAR_median', 'DAAR_std', 'DAAR_gini', 'DAAR_IQR',
+            'DCA_mean', 'DCA_median', 'DCA_std', 'DCA_gini', 'DCA_IQR',
+            'DCAT_mean', 'DCAT_median', 'DCAT_std', 'DCAT_gini', 'DCAT_IQR',
+            ]
+# Features holding counts (integers)
+COUNT_FEATURES = ['NA', 'NT', 'NR', 'NOR']
+STATISTICS = ['mean', 'median', 'std', 'gini', 'IQR']
+
+# Number of nanoseconds in an hour (the durations are expressed in hours)
+NS_PER_HOUR = 3600 * 10 ** 9
+
+
+def _quantile(sorted_values, q):
+    """
+    Quantile of sorted values with linear interpolation (same as `np.percentile`).
+    """
+    position = q * (len(sorted_values) - 1)
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    t = position - low
+    difference = sorted_values[high] - sorted_values[low]
+    # Same rounding as the interpolation of NumPy
+    if t >= 0.5:
+        return sorted_values[high] - difference * (1 - t)
+    return sorted_values[low] + difference * t
+
+
+def gini(values):
+    """
+    Gini coefficient of non-negative values (0 without value or if all the values are 0).
+    """
+    return _gini_sorted(np.sort(np.asarray(values, dtype=np.float64)))
+
+
+def _gini_sorted(sorted_values):
+    n = len(sorted_values)
+    total = sorted_values.sum()
+    if n == 0 or total == 0:
+        return 0.0
+    index = np.arange(1, n + 1)
+    return float(np.dot(2 * index - n - 1, sorted_values) / (n * total))
+
+
+def _round(value):
+    """
+    Round a value to 3 decimals as NumPy does (the results can differ from `round` on a float in case of a tie).
+    """
+    return float(np.round(np.float64(value), 3))
+
+
+def statistics(values):
+    """
+    Statistics of a family of values: mean, median, std, gini and IQR (rounded to 3 decimals).
+
+    Returns:
+        A list with the statistics in the order of `STATISTICS`
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return [np.nan, np.nan, 0.0, 0.0, np.nan]
+    # The mean and the std are computed in the order of the activities (same rounding errors as RABBIT)
+    mean = values.mean()
+    std = float(values.std(ddof=1)) if n > 1 else 0.0
+    values = np.sort(values)
+    median = values[n // 2] if n % 2 else (values[n // 2 - 1] + values[n // 2]) / 2
+    iqr = _quantile(values, 0.75) - _quantile(values, 0.25)
+    return [_round(mean), _round(median), _round(std), _round(_gini_sorted(values)), _round(iqr)]
+
+
+def compute_features(dates, activities, repositories, owners):
+    """
+    Compute the features of a contributor from its activities.
+
+    Parameters:
+        dates: The dates of the activities (datetime64 values or nanosecond timestamps)
+        activities: The activity type of each activity
+        repositories: The repository of each activity
+        owners: The owner of the repository of each activity (missing owners are not counted)
+
+    Returns:
+        A dictionary with the value of each feature of `FEATURES`
+    """
+    dates = np.asarray(dates).astype('datetime64[ns]').astype(np.int64)
+    order = np.argsort(dates, kind='stable')
+    hours = dates[order] / NS_PER_HOUR
+    types = pd.factorize(np.asarray(activities, dtype=object)[order])[0]
+    repos = pd.factorize(np.asarray(repositories, dtype=object)[order])[0]
+    owner_codes = pd.factorize(np.asarray(owners, dtype=object))[0]
+
+    nb_activities = len(hours)
+    nb_types = int(types.max()) + 1 if nb_activities else 0
+    nb_repos = int(repos.max()) + 1 if nb_activities else 0
+    nb_owners = len(np.unique(owner_codes[owner_codes >= 0]))
+
+    # Runs of consecutive activities in the same repository
+    delays = np.diff(hours)
+    repo_changes = np.flatnonzero(repos[1:] != repos[:-1])
+    run_starts = np.concatenate(([0], repo_changes + 1)) if nb_activities else np.empty(0, dtype=np.int64)
+    run_ends = np.concatenate((repo_changes, [nb_activities - 1])) if nb_activities else np.empty(0, dtype=np.int64)
+    # Distinct (repository, type) pairs
+    repo_types = np.unique(repos * max(nb_types, 1) + types)
+
+    families = {
+        'NAR': np.bincount(repos, minlength=nb_repos),
+        'NAT': np.bincount(types, minlength=nb_types),
+        'NCAR': run_ends - run_starts + 1,
+        'NTR': np.bincount(repo_types // max(nb_types, 1), minlength=nb_repos),
+        'DCAR': hours[run_ends] - hours[run_starts],
+        'DAAR': delays[repo_changes],
+        'DCA': delays,
+        'DCAT': delays[types[1:] != types[:-1]],
+    }
+
+    features = {
+        'NA': nb_activities,
+        'NT': nb_types,
+        'NR': nb_repos,
+        'NOR': nb_owners,
+        'ORR': _round(nb_owners / nb_repos) if nb_repos else np.nan,
+    }
+    for family, values in families.items():
+        features.update(zip((f'{family}_{statistic}' for statistic in STATISTICS), statistics(values)))
+    return features
+
+
+def extract_features(df, contributor):
+    """
+    Extract the features from the activities of a contributor.
+
+    Parameters:
+        df: activity DataFrame with the columns 'date', 'activity', 'repository' and 'owner'
+        contributor: The name of the contributor (index of the returned DataFrame)
+
+    Returns:
+        A DataFrame with a single row (index: contributor) and the columns of `FEATURES`
+    """
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    features = compute_features(dates.to_numpy(), df['activity'].to_numpy(),
+                                df['repository'].to_numpy(), df['owner'].to_numpy())
+    return pd.DataFrame({
+        feature: np.array([features[feature]], dtype=np.int64 if feature in COUNT_FEATURES else np.float64)
+        for feature in FEATURES
+    }, index=[contributor])
+
+
+def _pairs(groups, codes, nb_codes):
+    """
+    Distinct (group, code) pairs, in the order of their first occurrence.
+
+    Returns:
+        The group of each pair, the number of occurrences of each pair and the pair of each element
+    """
+    keys = groups * max(nb_codes, 1) + codes
+    unique, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return unique[order] // max(nb_codes, 1), counts[order], rank[inverse.ravel()]
+
+
+def _segmented_quantile(sorted_values, offsets, counts, q):
+    position = q * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, counts - 1)
+    t = position - low
+    low_values = sorted_values[offsets + low]
+    high_values = sorted_values[offsets + high]
+    difference = high_values - low_values
+    # Same rounding as the interpolation of NumPy (see `_quantile`)
+    return np.where(t >= 0.5, high_values - difference * (1 - t), low_values + difference * t)
+
+
+def segment_statistics(values, groups, nb_groups):
+    """
+    Statistics of the values of each group: mean, median, std, gini and IQR (rounded to 3 decimals).
+
+    Parameters:
+        values: The values of all the groups
+        groups: The group (in [0, nb_groups)) of each value
+        nb_groups: The number of groups (groups without value get the statistics of an empty family)
+
+    Returns:
+        An array of shape (nb_groups, 5) with the statistics in the order of `STATISTICS`
+    """
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+    result = np.empty((nb_groups, len(STATISTICS)))
+    result[:] = [np.nan, np.nan, 0.0, 0.0, np.nan]
+
+    counts = np.bincount(groups, minlength=nb_groups)
+    present = np.flatnonzero(counts)
+    if not len(present):
+        return result
+    n = counts[present].astype(np.float64)
+
+    # Mean and std with the values in their original order
+    sums = np.bincount(groups, weights=values, minlength=nb_groups)
+    means = sums / np.maximum(counts, 1)
+    squares = np.bincount(groups, weights=(values - means[groups]) ** 2, minlength=nb_groups)[present]
+    result[present, 0] = means[present]
+    result[present, 2] = np.where(n > 1, np.sqrt(squares / np.maximum(n - 1, 1)), 0.0)
+
+    # Median, gini and IQR with the values sorted in each group
+    order = np.lexsort((values, groups))
+    sorted_values, sorted_groups = values[order], groups[order]
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present_offsets, present_counts = offsets[present], counts[present]
+    result[present, 1] = (sorted_values[present_offsets + (present_counts - 1) // 2] +
+                          sorted_values[present_offsets + present_counts // 2]) / 2
+    ranks = np.arange(1, len(sorted_values) + 1) - offsets[sorted_groups]
+    weighted = np.bincount(sorted_groups, weights=(2 * ranks - counts[sorted_groups] - 1) * sorted_values,
+                           minlength=nb_groups)[present]
+    totals = sums[present]
+    result[present, 3] = np.where(totals != 0, weighted / (n * np.where(totals != 0, totals, 1)), 0.0)
+    result[present, 4] = (_segmented_quantile(sorted_values, present_offsets, present_counts, 0.75) -
+                          _segmented_quantile(sorted_values, present_offsets, present_counts, 0.25))
+    return np.round(result, 3)
+
+
+def compute_features_batch(contributors, dates, activities, repositories, owners):
+    """
+    Compute the features of many contributors from their concatenated activities.
+
+    Parameters:
+        contributors: The contributor of each activity
+        dates: The dates of the activities (datetime64 values or nanosecond timestamps)
+        activities: The activity type of each activity
+        repositories: The repository of each activity
+        owners: The owner of the repository of each activity (missing owners are not counted)
+
+    Returns:
+        The contributors (in the order of their first activity in the input) and an array of shape
+        (number of contributors, number of features) with their features in the order of `FEATURES`
+    """
+    contributor_codes, names = pd.factorize(np.asarray(contributors, dtype=object))
+    nb_contributors = len(names)
+    dates = np.asarray(dates).astype('datetime64[ns]').astype(np.int64)
+    # Sort once by contributor, then by date (stable: activities at the same date keep their order)
+    order = np.lexsort((dates, contributor_codes))
+    groups = contributor_codes[order]
+    hours = dates[order] / NS_PER_HOUR
+    types, type_names = pd.factorize(np.asarray(activities, dtype=object)[order])
+    repos, repo_names = pd.factorize(np.asarray(repositories, dtype=object)[order])
+    owner_codes, owner_names = pd.factorize(np.asarray(owners, dtype=object)[order])
+    nb_types, nb_repos = len(type_names), len(repo_names)
+
+    # Distinct types, repositories and owners of each contributor
+    type_groups, type_counts, _ = _pairs(groups, types, nb_types)
+    repo_groups, repo_counts, repo_pairs = _pairs(groups, repos, nb_repos)
+    has_owner = owner_codes >= 0
+    owner_groups, _, _ = _pairs(groups[has_owner], owner_codes[has_owner], len(owner_names))
+    # Distinct types of each (contributor, repository) pair
+    repo_types = np.unique(repo_pairs * max(nb_types, 1) + types)
+    repo_type_counts = np.bincount(repo_types // max(nb_types, 1), minlength=len(repo_counts))
+
+    # Runs of consecutive activities of a contributor in the same repository
+    same_contributor = groups[1:] == groups[:-1]
+    repo_changes = repos[1:] != repos[:-1]
+    run_starts = np.flatnonzero(np.concatenate(([True], ~same_contributor | repo_changes)))[:len(groups)]
+    run_ends = np.concatenate((run_starts[1:] - 1, [len(groups) - 1])) if len(groups) else run_starts
+    delays = np.diff(hours)
+    delay_groups = groups[1:]
+
+    families = {
+        'NAR': (repo_counts, repo_groups),
+        'NAT': (type_counts, type_groups),
+        'NCAR': (run_ends - run_starts + 1, groups[run_starts]),
+        'NTR': (repo_type_counts, repo_groups),
+        'DCAR': (hours[run_ends] - hours[run_starts], groups[run_starts]),
+        'DAAR': (delays[same_contributor & repo_changes], delay_groups[same_contributor & repo_changes]),
+        'DCA': (delays[same_contributor], delay_groups[same_contributor]),
+        'DCAT': (delays[same_contributor & (types[1:] != types[:-1])],
+                 delay_groups[same_contributor & (types[1:] != types[:-1])]),
+    }
+
+    nb_activities = np.bincount(groups, minlength=nb_contributors)
+    nb_distinct_types = np.bincount(type_groups, minlength=nb_contributors)
+    nb_distinct_repos = np.bincount(repo_groups, minlength=nb_contributors)
+    nb_owners = np.bincount(owner_groups, minlength=nb_contributors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        owner_ratio = np.round(np.where(nb_distinct_repos > 0, nb_owners / nb_distinct_repos, np.nan), 3)
+    matrix = np.column_stack([nb_activities, nb_distinct_types, nb_distinct_repos, nb_owners, owner_ratio] + [
+        segment_statistics(values, value_groups, nb_contributors) for values, value_groups in families.values()
+    ])
+    return np.asarray(names, dtype=object), matrix
+
+
+def extract_features_batch(df):
+    """
+    Extract the features of every contributor of a concatenated activity DataFrame.
+
+    Parameters:
+        df: activity DataFrame with the columns 'date', 'activity', 'contributor', 'repository' and 'owner'
+
+    Returns:
+        A DataFrame with one row per contributor (index: contributor) and the columns of `FEATURES`
+    """
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    names, matrix = compute_features_batch(df['contributor'].to_numpy(), dates.to_numpy(), df['activity'].to_numpy(),
+                                           df['repository'].to_numpy(), df['owner'].to_numpy())
+    return features_frame(names, matrix)
+
+
+def features_frame(names, matrix):
+    """
+    DataFrame of the features returned by `compute_features_batch` (index: contributor, columns: `FEATURES`).
+    """
+    # The columns are typed when the DataFrame is created (`astype` on the DataFrame is much slower)
+    return pd.DataFrame({
+        feature: matrix[:, i].astype(np.int64) if feature in COUNT_FEATURES else matrix[:, i]
+        for i, feature in enumerate(FEATURES)
+    }, index=pd.Index(names, name='contributor'))
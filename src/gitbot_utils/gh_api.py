@@ -1,15 +1,8 @@
-from datetime import datetime
-from importlib.resources import files
-
 import pandas as pd
-import requests
-from ExtractEvent import unpackJson
-from GenerateActivities import activity_identification
-from ghmap.mapping.action_mapper import ActionMapper
-from ghmap.mapping.activity_mapper import ActivityMapper
-from ghmap.utils import load_json_file
 
+from .activity_table import ActivityTable
 from .api_manager import APIManager
+from .mapping import map_events, map_events_table
 
 
 class GitHubManager(APIManager):
@@ -23,44 +16,60 @@ class GitHubManager(APIManager):
         ghmap (bool): Whether to use ghmap or rbmap for activity mapping.
     """
 
-    def __init__(self, api_key=None, max_queries=3, min_events=5, ghmap=True):
+    def __init__(self, api_key=None, max_queries=3, min_events=5, ghmap=True,
+                 query_root='https://api.github.com', max_workers=8, response_cache=None, decoder=None,
+                 native_features=False):
         """
         Initialize the GitHub API manager.
 
         Parameters:
-            api_key: The API key to access the GitHub API
+            api_key: The API key to access the GitHub API (or a `TokenPool` of API keys)
             max_queries: The maximum number of queries to be made to the GitHub API
             min_events: The minimum number of events required to consider a contributor
             ghmap: Whether to use ghmap or rbmap for activity mapping (default is True)
+            query_root: The root URL of the GitHub API (default: 'https://api.github.com')
+            max_workers: The maximum number of concurrent requests
+            response_cache: The cache of the responses: a `ResponseCache`, or the folder of the cache
+                (default: no cache)
+            decoder: The decoder of the pages of events, ex: `EventDecoder.of_mapping('ghmap')` to keep only the
+                fields used by ghmap (default: the whole events)
+            native_features: Whether to compute the features with the native extractor (see `gitbot_utils.features`)
+                instead of the RABBIT feature extractor (default is False)
         """
         super().__init__(api_key,
-                         query_root='https://api.github.com',
+                         query_root=query_root,
                          max_queries=max_queries,
-                         min_events=min_events)
+                         min_events=min_events,
+                         max_workers=max_workers,
+                         response_cache=response_cache,
+                         decoder=decoder,
+                         native_features=native_features)
         self.ghmap = ghmap
 
+    def _auth_headers(self, token):
+        """
+        Headers used to authenticate a request with a token (empty without token).
+        """
+        return {'Authorization': f'token {token}'} if token else {}
+
     def _query_event_page(self, contributor, page):
         """
         Query a page of events of a contributor from the GitHub API.
         """
         query = f'{self.query_root}/users/{contributor}/events'
-        response = requests.get(
-            query,
-            headers={'Authorization': f'token {self.api_key}'} if self.api_key else {},
-            params={'per_page': 100, 'page': page}
-        )
+        response = self._request(query, params={'per_page': self.per_page, 'page': page})
 
         if response.ok:
-            return response.json(), response.headers
+            return self.decode_events(response.content), response.headers
         else:
             print(f"Error while querying {contributor}: {response.status_code}")
-            return []
+            return [], response.headers
 
     def _check_events_left(self, events, headers):
         """
         Check if there are events left to query from the GitHub API.
         """
-        return len(events) == 100
+        return len(events) == self.per_page
 
     def _get_repo_owner(self, activity):
         """
@@ -73,18 +82,9 @@ class GitHubManager(APIManager):
         Query the type of contributor from the GitHub API.
         """
         query = f'{self.query_root}/users/{contributor}'
-        response = requests.get(
-            query,
-            headers={'Authorization': f'token {self.api_key}'} if self.api_key else {}
-        )
+        response = self._request(query)
 
         if response.ok:
-            query_remaining = int(response.headers['X-RateLimit-Remaining'])
-            if query_remaining < self.max_queries:
-                reset_time = (datetime.fromtimestamp(int(response.headers['X-RateLimit-Reset']))
-                              .strftime('%Y-%m-%d %H:%M:%S'))
-                self.wait_reset(reset_time)
-
             return response.json()['type']
         else:
             print(f"Error while querying {contributor}: {response.status_code}")
@@ -92,35 +92,41 @@ class GitHubManager(APIManager):
 
     @staticmethod
     def __rabbit_activity_mapping(events):
+        """
+        Map the events to activities with RABBIT, as dictionaries with the fields of the ghmap activities
+        used by `activity_to_df`.
+        """
+        # RABBIT is only required by this mapping
+        from ExtractEvent import unpackJson
+        from GenerateActivities import activity_identification
+
         raw_events = unpackJson(events)
         df_events = pd.DataFrame.from_dict(raw_events, orient='columns')
         df_events['created_at'] = pd.to_datetime(df_events.created_at, errors='coerce',
                                                  format='%Y-%m-%dT%H:%M:%SZ').dt.tz_localize(None)
         df_events = df_events.sort_values(by='created_at')
-
-        return activity_identification(df_events)
+        df_activities = activity_identification(df_events)
+
+        # RABBIT only keeps the names of the repositories
+        repository_ids = {(event.get('repo') or {}).get('name'): (event.get('repo') or {}).get('id')
+                          for event in events}
+        dates = pd.to_datetime(df_activities['date'], errors='coerce', utc=True).dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        return [{
+            'activity': activity,
+            'start_date': date,
+            'end_date': date,
+            'actor': {'login': contributor},
+            'repository': {'id': repository_ids.get(repository), 'name': repository},
+        } for activity, date, contributor, repository in zip(
+            df_activities['activity'], dates, df_activities['contributor'], df_activities['repository'])]
 
     @staticmethod
     def __ghmap_activity_mapping(events):
-        # Step 1: Event to Action Mapping
-        event_to_action_mapping_file = files("gitbot_utils").joinpath("config", "event_to_action.json")
-        action_mapping = load_json_file(event_to_action_mapping_file)
-        action_mapper = ActionMapper(action_mapping, progress_bar=False)
-
-        actions = action_mapper.map(events)
-
-        # Step 2: Actions to Activities Mapping
-        action_to_activity_mapping_file = files("gitbot_utils").joinpath("config", "action_to_activity.json")
-        activity_mapping = load_json_file(action_to_activity_mapping_file)
-        activity_mapper = ActivityMapper(activity_mapping, progress_bar=False)
-
-        activities = activity_mapper.map(actions)
-
-        return activities
+        return map_events(events, 'ghmap')
 
     def events_to_activities(self, events):
         """
-        Convert the events to activities using ghmap.
+        Convert the events to activities using ghmap (or rbmap).
 
         Parameters:
             events: A list of dictionaries corresponding to the events of a contributor
@@ -133,6 +139,22 @@ class GitHubManager(APIManager):
         else:
             return self.__rabbit_activity_mapping(events)
 
+    def events_to_activity_table(self, events):
+        """
+        Convert the events to an `ActivityTable` using ghmap (or rbmap), without creating a dictionary per action
+        or activity.
+
+        Parameters:
+            events: A list of dictionaries corresponding to the events of a contributor
+
+        Returns:
+            An `ActivityTable` with the activities of a contributor
+        """
+        if self.ghmap:
+            return map_events_table(events, 'ghmap')
+        else:
+            return ActivityTable.from_activities(self.__rabbit_activity_mapping(events))
+
 
 if __name__ == '__main__':
     import os
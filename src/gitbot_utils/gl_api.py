@@ -1,12 +1,9 @@
-from datetime import datetime
-from importlib.resources import files
-
-import requests
-from ghmap.mapping.action_mapper import ActionMapper
-from ghmap.mapping.activity_mapper import ActivityMapper
-from ghmap.utils import load_json_file
+from concurrent.futures import ThreadPoolExecutor
 
+from . import json_codec
 from .api_manager import APIManager
+from .mapping import map_events, map_events_table
+from .owner_cache import OwnerCache
 
 
 class GitLabManager(APIManager):
@@ -19,65 +16,167 @@ class GitLabManager(APIManager):
         min_events (int): Minimum number of events required to consider a contributor.
         before (str): Date before which events are queried. (Format: YYYY-MM-DD)
         after (str): Date after which events are queried. (Format: YYYY-MM-DD)
+        repo_owners (OwnerCache): Cache of the owners of the repositories.
     """
 
-    def __init__(self, api_key=None, max_queries=3, min_events=5, before=None, after=None):
+    def __init__(self, api_key=None, max_queries=3, min_events=5, before=None, after=None,
+                 query_root='https://gitlab.com/api/v4', max_workers=8, owner_cache=None,
+                 response_cache=None, decoder=None, native_features=False):
         """
         Initialize the GitLab API manager.
 
         Parameters:
-            api_key: The API key to access the GitLab API
+            api_key: The API key to access the GitLab API (or a `TokenPool` of API keys)
             max_queries: The maximum number of queries to be made to the GitLab API
             before: The date before which events are queried. (Format: YYYY-MM-DD)<-
             after: The date after which events are queried. (Format: YYYY-MM-DD)
+            query_root: The root URL of the GitLab API (default: 'https://gitlab.com/api/v4')
+            max_workers: The maximum number of concurrent requests
+            owner_cache: The cache of the owners of the repositories: an `OwnerCache`, or the path of the SQLite
+                database of a persistent cache (default: in memory only)
+            response_cache: The cache of the responses: a `ResponseCache`, or the folder of the cache
+                (default: no cache)
+            decoder: The decoder of the pages of events, ex: `EventDecoder.of_mapping('glmap')` to keep only the
+                fields used by glmap (default: the whole events)
+            native_features: Whether to compute the features with the native extractor (see `gitbot_utils.features`)
+                instead of the RABBIT feature extractor (default is False)
         """
         super().__init__(api_key,
-                         query_root='https://gitlab.com/api/v4',
+                         query_root=query_root,
                          max_queries=max_queries,
-                         min_events=min_events)
+                         min_events=min_events,
+                         max_workers=max_workers,
+                         response_cache=response_cache,
+                         decoder=decoder,
+                         native_features=native_features)
         # Query parameters
         self.before = before
         self.after = after
 
         # Key: repository_id - Value: owner of the repository
-        self.repo_owners = {}
+        if isinstance(owner_cache, OwnerCache):
+            self.repo_owners = owner_cache
+        else:
+            self.repo_owners = OwnerCache(owner_cache)
 
-    def _query_event_page(self, contributor, page):
+    def _auth_headers(self, token):
         """
-        Query a page of events of a contributor from the GitLab API.
+        Headers used to authenticate a request with a token (empty without token).
         """
-        query = f'{self.query_root}/users/{contributor}/events'
-        params = {'per_page': 100, 'page': page}
+        return {'Private-Token': token} if token else {}
+
+    def _event_params(self, page, after=None, sort=None):
+        """
+        Parameters of the query of a page of events.
+        `after` restricts the events further than `self.after` (the most recent of the two dates is used).
+        `sort` is the order of the events by creation date ('asc' or 'desc', default of the API: 'desc').
+        """
+        params = {'per_page': self.per_page, 'page': page}
+        if sort:
+            params['sort'] = sort
         if self.before:
             params['before'] = self.before
-        if self.after:
-            params['after'] = self.after
+        after = max(filter(None, [self.after, after]), default=None)
+        if after:
+            params['after'] = after
+        return params
+
+    def _get(self, query, params=None, decode=json_codec.loads):
+        """
+        Send a GET request with `_request` and decode the body of the response with `decode`.
+        Same interface as `AsyncGitLabManager._get`, so that the pagers can be run by both managers.
 
-        response = requests.get(
-            query,
-            headers={'Private-Token': self.api_key} if self.api_key else {},
-            params=params
-        )
+        Returns:
+            The decoded JSON body (None if the request failed and is not retried)
+            The headers of the response
 
+        Raises:
+            RetryError: If the request is still rate limited or failed after the retries (see `_request`)
+        """
+        response = self._request(query, params=params)
         if response.ok:
-            # Return the events as a list of dictionaries
-            return response.json(), response.headers
-        elif response.status_code == 429:
-            print("Rate limit exceeded", end=' ')
-            reset_time = (datetime.fromtimestamp(int(response.headers['RateLimit-Reset']))
-                          .strftime('%Y-%m-%d %H:%M:%S'))
-            self.wait_reset(reset_time)
-        else:
-            print(f"Error while querying {contributor}: {response.status_code}")
-            return [], response.headers
+            return decode(response.content), response.headers
+        print(f"Error while querying {query}: {response.status_code}")
+        return None, response.headers
+
+    def _paginate(self, pager):
+        """
+        Run a pager with the requests of the manager: each query yielded by the pager (URL, parameters and decoder)
+        is sent with `_get`, and the decoded body and the headers of the response are sent back to the pager.
+        The pagers hold the pagination and filtering logic, which is thus the same for the synchronous and the
+        asynchronous managers (see `AsyncGitLabManager._paginate`).
+
+        Returns:
+            The value returned by the pager
+        """
+        try:
+            query = next(pager)
+            while True:
+                query = pager.send(self._get(*query))
+        except StopIteration as stop:
+            return stop.value
+
+    def _event_query(self, contributor, page, after=None, sort=None):
+        """
+        Query of a page of events of a contributor (URL, parameters and decoder).
+        """
+        query = f'{self.query_root}/users/{contributor}/events'
+        return query, self._event_params(page, after, sort), self.decode_events
+
+    def _event_pages(self, contributor, max_pages, after=None, sort=None):
+        """
+        Pager of the events of a contributor (see `_paginate`).
+
+        Parameters:
+            contributor: The username or ID of the contributor
+            max_pages: The maximum number of pages to query
+            after: The date after which events are queried (see `_event_params`)
+            sort: The order of the events (see `_event_params`)
+
+        Returns:
+            The list of the events
+        """
+        events = []
+        for page in range(1, max_pages + 1):
+            new_events, headers = yield self._event_query(contributor, page, after, sort)
+            new_events = new_events or []
+            events.extend(new_events)
+            if not self._check_events_left(new_events, headers):
+                break
+        return events
+
+    def _query_event_page(self, contributor, page, after=None):
+        """
+        Query a page of events of a contributor from the GitLab API.
+        """
+        events, headers = self._get(*self._event_query(contributor, page, after))
+        return events or [], headers
 
     def _check_events_left(self, events, headers):
         """
         Check if there are events left to query from the GitLab API.
+        GitLab sends an empty `X-Next-Page` header on the last page. Without this header, a full page means that
+        there may be events left.
+        """
+        if 'X-Next-Page' in headers:
+            return bool(headers['X-Next-Page'])
+        return len(events) == self.per_page
+
+    def query_events(self, contributor):
+        """
+        Query the events of a contributor from the GitLab API.
+        A maximum of `max_queries` pages are queried where each page contains 100 events.
         """
-        if 'X-Next-Page' in headers or len(events) == 100:
-            return True
-        return False
+        return self._paginate(self._event_pages(contributor, self.max_queries))
+
+    def query_events_after(self, contributor, after, max_pages=100):
+        """
+        Query the events of a contributor created after a date (Format: YYYY-MM-DD, exclusive), from the oldest
+        to the most recent (`sort=asc`). Unlike `query_events`, the number of pages is limited by `max_pages` and
+        not by `max_queries`. When the limit is reached, the events returned are the oldest ones: the next call with
+        the date of the most recent event returned continues without gap (see `EventStore.refresh`).
+        """
+        return self._paginate(self._event_pages(contributor, max_pages, after, sort='asc'))
 
     def query_user_type(self, contributor_id):
         """
@@ -88,10 +187,7 @@ class GitLabManager(APIManager):
             return None
         query = f'{self.query_root}/users/{contributor_id}'
 
-        response = requests.get(
-            query,
-            headers={'Private-Token': self.api_key}
-        )
+        response = self._request(query)
 
         if response.ok:
             return response.json()['bot']
@@ -104,11 +200,7 @@ class GitLabManager(APIManager):
         Query the information of contributor from the GitLab API. (ID, username, name, state, ...)
         """
         query = f'{self.query_root}/users'
-        response = requests.get(
-            query,
-            headers={'Private-Token': self.api_key} if self.api_key else {},
-            params={'username': contributor}
-        )
+        response = self._request(query, params={'username': contributor})
 
         if response.ok:
             return response.json()
@@ -116,60 +208,96 @@ class GitLabManager(APIManager):
             print(f"Error while querying {contributor}: {response.status_code}")
             return None
 
+    def _repo_info_query(self, project_id):
+        """
+        Query of the information of a project (URL, parameters and decoder).
+        """
+        return f'{self.query_root}/projects/{project_id}', None, json_codec.loads
+
     def _query_repo_info(self, project_id):
         """
         Query the information of a project from the GitLab API.
         """
-        query = f'{self.query_root}/projects/{project_id}'
-        response = requests.get(
-            query,
-            headers={'Private-Token': self.api_key} if self.api_key else {}
-        )
+        project_info, _ = self._get(*self._repo_info_query(project_id))
+        return project_info
 
-        if response.ok:
-            return response.json()
-        else:
-            print(f"Error while querying {project_id}: {response.status_code}")
-            return None
+    def _missing_owners(self, project_ids):
+        """
+        Owners of the projects that are in the repository owners cache, and the projects that are not.
+        """
+        owners = self.repo_owners.get_many(project_ids)
+        return owners, [project_id for project_id in project_ids if project_id not in owners]
+
+    def _store_owners(self, project_ids, infos):
+        """
+        Store in the repository owners cache the owners of the projects from their information
+        (see `_query_repo_info`, None if the project could not be queried).
+
+        The projects that could not be queried (ex: deleted or private) are stored without owner, so that they are
+        not queried again before the `failure_ttl` of the cache (except for the cache misses in offline mode).
+
+        Returns:
+            A dictionary with the owner of each project (None if the project could not be queried)
+        """
+        # Can be a user or a group (ex: gitlab-org)
+        owners = {project_id: project_info['namespace']['path'] if project_info else None
+                  for project_id, project_info in zip(project_ids, infos)}
+        if self.response_cache is not None and self.response_cache.offline:
+            owners = {project_id: owner for project_id, owner in owners.items() if owner is not None}
+        self.repo_owners.set_many(owners)
+        return owners
+
+    def query_repo_owners(self, project_ids):
+        """
+        Query concurrently the owners of the projects that are not yet in the repository owners cache.
+
+        Parameters:
+            project_ids: The IDs of the projects (can contain duplicates)
+
+        Returns:
+            A dictionary with the owner of each project (None if the project could not be queried)
+        """
+        project_ids = list(dict.fromkeys(project_ids))
+        owners, missing = self._missing_owners(project_ids)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                infos = list(executor.map(self._query_repo_info, missing))
+            owners.update(self._store_owners(missing, infos))
+        return {project_id: owners.get(project_id) for project_id in project_ids}
 
     def _get_repo_owner(self, activity):
         """
         Get the owner of the repository where the activity was done.
         """
-        project_id = activity['repository']['id']
-        if project_id in self.repo_owners:
-            return self.repo_owners[project_id]
+        return self.query_repo_owners([activity['repository']['id']])[activity['repository']['id']]
 
-        project_info = self._query_repo_info(project_id)
-        if project_info:
-            # Can be a user or a group (ex: gitlab-org)
-            owner = project_info['namespace']['path']
-            self.repo_owners[project_id] = owner
-            return owner
-        return None
+    def _get_repo_owners(self, activities):
+        """
+        Get the owner of the repository of each activity.
+        The owners of all the distinct repositories are resolved at once (see `query_repo_owners`).
+        """
+        owners = self.query_repo_owners(activity['repository']['id'] for activity in activities)
+        return [owners[activity['repository']['id']] for activity in activities]
 
     def events_to_activities(self, events):
         """
         Convert the events to activities using glmap.
+        The mappers are shared by all the managers (see `gitbot_utils.mapping`).
 
         Parameters:
             events: A list of dictionaries corresponding to the events of a contributor
         """
-        # Step 1: Event to Action Mapping
-        event_to_action_file = files("gitbot_utils").joinpath("config", "gl_event_to_action.json")
-        action_mapping = load_json_file(event_to_action_file)
-        action_mapper = ActionMapper(action_mapping, progress_bar=False)
-
-        actions = action_mapper.map(events)
+        return map_events(events, 'glmap')
 
-        # Step 2: Action to Activity Mapping
-        action_to_activity_file = files("gitbot_utils").joinpath("config", "gl_action_to_activity.json")
-        activity_mapping = load_json_file(action_to_activity_file)
-        activity_mapper = ActivityMapper(activity_mapping, progress_bar=False)
-
-        activities = activity_mapper.map(actions)
+    def events_to_activity_table(self, events):
+        """
+        Convert the events to an `ActivityTable` using glmap, without creating a dictionary per action or activity.
 
-        return activities
+        Parameters:
+            events: A list of dictionaries corresponding to the events of a contributor
+        """
+        return map_events_table(events, 'glmap')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,177 @@
+"""
+Asynchronous variant of the GitLab API manager, for crawls with a large number of requests.
+
+The requests are sent with aiohttp and at most `max_concurrency` of them are in flight at the same time.
+They share the API keys and rate limiters of the wrapped manager with the synchronous requests.
+The configuration (API key, dates, number of pages, ...), the pagination and filtering of the pages (the pagers of
+`GitLabManager`, see `GitLabManager._paginate`) and the CPU-bound steps (mapping, DataFrame, features) come from
+the wrapped `GitLabManager`: only the requests differ from the synchronous manager. The CPU-bound steps run in the
+default executor of the event loop, so that the requests in flight are not blocked while a contributor is mapped.
+"""
+
+import asyncio
+
+import aiohttp
+
+from . import json_codec
+from .gl_api import GitLabManager
+from .http_cache import ResponseCache
+from .rate_limit import RetryError
+
+
+class AsyncGitLabManager:
+    """
+    Asynchronous GitLab API manager wrapping a `GitLabManager`.
+
+    It must be used as an asynchronous context manager:
+
+        async with AsyncGitLabManager(GitLabManager(key)) as manager:
+            events = await manager.query_events_many(ids)
+
+    Attributes:
+        manager (GitLabManager): The synchronous manager providing the configuration and the repository owners cache.
+        max_concurrency (int): Maximum number of requests in flight at the same time.
+    """
+
+    def __init__(self, manager: GitLabManager, max_concurrency=100):
+        self.manager = manager
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    async def _get(self, query, params=None, decode=json_codec.loads):
+        """
+        Send a GET request to the GitLab API, with the API key of the pool of the wrapped manager that has
+        the most remaining requests. Rate limited (429) and failed (5xx) requests are retried with a jittered backoff,
+        and requests rejected because of their key are retried with another key of the pool.
+        The response cache of the wrapped manager is used as in `GitLabManager._request`.
+        The body is decoded by `decode` (a function of the content of the response).
+
+        Returns:
+            The decoded JSON body (None if the request failed and is not retried)
+            The headers of the response
+
+        Raises:
+            RetryError: If the request is still rate limited or failed after the retries
+        """
+        response_cache = self.manager.response_cache
+        cached = None
+        if response_cache is not None:
+            cached = response_cache.get(query, params)
+            if response_cache.offline:
+                if cached is None:
+                    print(f"Error while querying {query}: not in the cache")
+                    return None, {}
+                return decode(cached.content), cached.headers
+
+        token_pool = self.manager.token_pool
+        attempt = 0
+        while True:
+            token = await token_pool.acquire_async()
+            headers = {**self.manager._auth_headers(token), **ResponseCache.conditional_headers(cached)}
+            updated = False
+            try:
+                async with self._semaphore:
+                    async with self._session.get(query, params=params, headers=headers) as response:
+                        token_pool.update(token, response.status, response.headers)
+                        updated = True
+                        if response.status == 304 and cached is not None:
+                            return decode(cached.content), cached.headers
+                        if response.ok:
+                            content = await response.read()
+                            if response.status == 200 and response_cache is not None:
+                                response_cache.set(query, params, response.headers, content)
+                            return decode(content), response.headers
+                        status, headers = response.status, response.headers
+            finally:
+                if not updated:
+                    # No response (connection error, timeout, cancellation): the request must not stay in flight
+                    token_pool.release(token)
+
+            if not token_pool.should_retry(token, status):
+                print(f"Error while querying {query}: {status}")
+                return None, headers
+            rate_limiter = token_pool.limiter(token)
+            if attempt >= rate_limiter.max_retries:
+                raise RetryError(query, status)
+            await asyncio.sleep(rate_limiter.backoff(attempt, headers))
+            attempt += 1
+
+    async def _paginate(self, pager):
+        """
+        Run a pager of the wrapped manager (ex: `GitLabManager._event_pages`) with asynchronous requests.
+        Same behaviour as `GitLabManager._paginate`.
+        """
+        try:
+            query = next(pager)
+            while True:
+                query = pager.send(await self._get(*query))
+        except StopIteration as stop:
+            return stop.value
+
+    async def query_events(self, contributor):
+        """
+        Query the events of a contributor. Same behaviour as `GitLabManager.query_events`.
+        """
+        return await self._paginate(self.manager._event_pages(contributor, self.manager.max_queries))
+
+    async def query_events_many(self, contributors):
+        """
+        Query the events of several contributors concurrently.
+
+        Returns:
+            A dictionary with the events of each contributor, in the same order as `contributors`
+        """
+        contributors = list(contributors)
+        results = await asyncio.gather(*(self.query_events(contributor) for contributor in contributors))
+        return dict(zip(contributors, results))
+
+    async def _query_repo_info(self, project_id):
+        """
+        Query the information of a project from the GitLab API.
+        """
+        project_info, _ = await self._get(*self.manager._repo_info_query(project_id))
+        return project_info
+
+    async def query_repo_owners(self, project_ids):
+        """
+        Query concurrently the owners of the projects that are not yet in the repository owners cache.
+
+        Returns:
+            A dictionary with the owner of each project (None if the project could not be queried)
+        """
+        project_ids = list(dict.fromkeys(project_ids))
+        owners, missing = self.manager._missing_owners(project_ids)
+        infos = await asyncio.gather(*(self._query_repo_info(project_id) for project_id in missing))
+        owners.update(self.manager._store_owners(missing, infos))
+        return {project_id: owners.get(project_id) for project_id in project_ids}
+
+    async def compute_features(self, contributor):
+        """
+        Compute the features of a contributor. Same steps as `GitLabManager.compute_features`, but the events
+        and the owners of all the repositories of the contributor are queried concurrently.
+        """
+        events = await self.query_events(contributor)
+        if len(events) < self.manager.min_events:
+            return None
+
+        loop = asyncio.get_running_loop()
+        activities = await loop.run_in_executor(None, self.manager.events_to_activity_table, events)
+        del events
+        await self.query_repo_owners(repository['id'] for repository in activities.repositories)
+        # The owners are in the cache: the DataFrame is built without request
+        return await loop.run_in_executor(None, self._extract_features, activities, contributor)
+
+    def _extract_features(self, activities, contributor):
+        """
+        Extract the features of a contributor from its `ActivityTable` (the owners of its repositories are known).
+        """
+        return self.manager.extract_features(self.manager.activity_table_to_df(activities), contributor)
@@ -0,0 +1,157 @@
+"""
+Cache of the responses of the APIs, to re-query known contributors without downloading their events again.
+
+The bodies are stored once per content (file named after their SHA-256) and an SQLite index maps each request
+(URL and parameters, without the API key) to its body, its headers and its validators (`ETag`, `Last-Modified`).
+A cached request is sent again with `If-None-Match`/`If-Modified-Since`: an unchanged page comes back as a 304
+without body and is served from the cache. In offline mode, no request is sent and the requests missing
+from the cache fail with a 504 status (as `Cache-Control: only-if-cached`).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+from requests.structures import CaseInsensitiveDict
+
+from . import json_codec
+
+
+class CachedResponse:
+    """
+    Response served from the cache, with the attributes of `requests.Response` used by the API managers.
+
+    Attributes:
+        status_code (int): The status of the response (200 for a cached response, 504 for an offline miss)
+        headers (CaseInsensitiveDict): The headers of the cached response
+        content (bytes): The body of the response
+        from_cache (bool): Always True
+    """
+    from_cache = True
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json_codec.loads(self.content)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of the API responses, with conditional requests.
+
+    Attributes:
+        path (str): The folder of the cache (created if it does not exist)
+        offline (bool): Whether the responses are only served from the cache (no request is sent)
+    """
+    # Headers stored with the bodies (pagination and validators)
+    stored_headers = ('Content-Type', 'ETag', 'Last-Modified', 'Link',
+                      'X-Next-Page', 'X-Page', 'X-Per-Page', 'X-Prev-Page', 'X-Total', 'X-Total-Pages')
+
+    def __init__(self, path, offline=False):
+        self.path = path
+        self.offline = offline
+        self._local = threading.local()
+        os.makedirs(os.path.join(path, 'bodies'), exist_ok=True)
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                               "(key TEXT PRIMARY KEY, url TEXT NOT NULL, body_hash TEXT NOT NULL, "
+                               "headers TEXT NOT NULL, fetched_at REAL NOT NULL)")
+
+    @classmethod
+    def of(cls, response_cache):
+        """
+        Get the response cache of a `response_cache` argument: the cache itself, a cache in the given folder,
+        or None (no cache).
+        """
+        if response_cache is None or isinstance(response_cache, ResponseCache):
+            return response_cache
+        return cls(response_cache)
+
+    def _connection(self):
+        """
+        SQLite connection of the calling thread.
+        """
+        if not hasattr(self._local, 'connection'):
+            connection = sqlite3.connect(os.path.join(self.path, 'index.sqlite'), timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return self._local.connection
+
+    @staticmethod
+    def key(url, params=None):
+        """
+        Key of a request: the SHA-256 of its URL and its sorted parameters.
+        """
+        query = urlencode(sorted((params or {}).items()))
+        return hashlib.sha256(f'{url}?{query}'.encode()).hexdigest()
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.path, 'bodies', body_hash[:2], body_hash)
+
+    def get(self, url, params=None):
+        """
+        Get the cached response of a request.
+
+        Returns:
+            The `CachedResponse` of the request (None if it is not in the cache)
+        """
+        row = self._connection().execute("SELECT body_hash, headers FROM responses WHERE key = ?",
+                                         (self.key(url, params),)).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(self._body_path(row[0]), 'rb') as file:
+                content = file.read()
+        except FileNotFoundError:
+            return None
+        return CachedResponse(200, json.loads(row[1]), content)
+
+    def set(self, url, params, headers, content):
+        """
+        Store the response of a request. The body is written only if the same content is not already stored.
+        """
+        body_hash = hashlib.sha256(content).hexdigest()
+        body_path = self._body_path(body_hash)
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            # Write then rename, so that concurrent writers never expose a partial body
+            tmp_path = f'{body_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(content)
+            os.replace(tmp_path, body_path)
+
+        headers = {name: headers[name] for name in self.stored_headers if name in headers}
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (self.key(url, params), url, body_hash, json.dumps(headers), time.time()))
+
+    @staticmethod
+    def conditional_headers(cached):
+        """
+        Headers validating a cached response (empty if there is no cached response or it has no validator).
+        """
+        headers = {}
+        if cached is not None:
+            if 'ETag' in cached.headers:
+                headers['If-None-Match'] = cached.headers['ETag']
+            if 'Last-Modified' in cached.headers:
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        return headers
+
+    @staticmethod
+    def offline_miss():
+        """
+        Response of a request missing from the cache in offline mode.
+        """
+        return CachedResponse(504, {}, b'')
@@ -0,0 +1,176 @@
+"""
+Decoding of the JSON documents of the crawls (pages of events, event files), with the fastest parser installed.
+
+`loads` and `load` use orjson, msgspec or the standard library, in this order of preference (optional dependencies,
+`pip install gitbot_utils[json]`). The results are the same with every parser: a document rejected by orjson or
+msgspec (ex: NaN, integers beyond 64 bits for orjson) is decoded again by the standard library, which raises the
+usual `json.JSONDecodeError` if it is not valid.
+
+`EventDecoder` decodes lists of events keeping only the fields used by a mapping (see `mapping.event_columns`),
+which cuts the memory used by the events. With msgspec, the events are decoded into structs declaring only these
+fields: the other fields are skipped by the parser, without creating Python objects. Otherwise, the whole events are
+decoded, then pruned. The events are the same with both paths, and are mapped to the same activities as the whole
+events by the mapping of the decoder.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from .mapping import event_columns
+
+# Parsers in order of preference
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+_backend = None
+_loads = json.loads
+_errors = ()
+
+
+def available_backends():
+    """
+    Parsers installed, in order of preference.
+    """
+    return [name for name, module in zip(BACKENDS, (orjson, msgspec, json)) if module is not None]
+
+
+def set_backend(name=None):
+    """
+    Select the parser used by `loads` and `load`.
+
+    Parameters:
+        name: The parser ('orjson', 'msgspec' or 'json'), None for the fastest one installed
+    """
+    global _backend, _loads, _errors
+    if name is None:
+        name = available_backends()[0]
+    if name not in available_backends():
+        raise ValueError(f"JSON parser not available: {name} (installed: {', '.join(available_backends())})")
+    _backend = name
+    if name == 'orjson':
+        _loads, _errors = orjson.loads, (orjson.JSONDecodeError,)
+    elif name == 'msgspec':
+        _loads, _errors = msgspec.json.decode, (msgspec.DecodeError,)
+    else:
+        _loads, _errors = json.loads, ()
+
+
+def get_backend():
+    """
+    Name of the parser used by `loads` and `load`.
+    """
+    return _backend
+
+
+def loads(data):
+    """
+    Decode a JSON document (str or bytes), as `json.loads`.
+    """
+    try:
+        return _loads(data)
+    except _errors:
+        return json.loads(data)
+
+
+def load(path):
+    """
+    Decode a JSON file, as `json.load`.
+    """
+    with open(path, 'rb') as file:
+        return loads(file.read())
+
+
+set_backend()
+
+
+def _field_tree(fields):
+    """
+    Nested dictionary of dotted field paths (None for the fields kept whole).
+    """
+    tree = {}
+    for field in sorted(fields, key=lambda f: f.count('.')):
+        node = tree
+        keys = field.split('.')
+        for key in keys[:-1]:
+            if key in node and node[key] is None:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[keys[-1]] = None
+    return tree
+
+
+def _prune(value, tree):
+    """
+    Keep the fields of a tree in an event (the values that are not objects are kept whole).
+    """
+    if tree is None or not isinstance(value, dict):
+        return value
+    return {key: _prune(value[key], sub_tree) for key, sub_tree in tree.items() if key in value}
+
+
+def _struct_type(tree, name):
+    """
+    msgspec struct with the fields of a tree (missing fields are UNSET, omitted by `msgspec.to_builtins`).
+    A nested field holds a struct if the value is an object, and the value itself otherwise (as `_prune`).
+    """
+    fields = []
+    for i, (key, sub_tree) in enumerate(tree.items()):
+        if sub_tree is None:
+            field_type = Any
+        else:
+            field_type = Union[_struct_type(sub_tree, f'{name}_{i}'), list, str, int, float, bool, None,
+                               msgspec.UnsetType]
+        fields.append((f'field_{i}', field_type, msgspec.field(default=msgspec.UNSET, name=key)))
+    return msgspec.defstruct(name, fields, gc=False)
+
+
+class EventDecoder:
+    """
+    Decoder of lists of events keeping only some fields (see the module documentation).
+
+    Attributes:
+        fields (list): The dotted paths of the fields kept (ex: `note.noteable_type`), a field holding an object
+            or a list is kept whole
+        tree (dict): The fields as a nested dictionary (None for the fields kept whole)
+    """
+
+    def __init__(self, fields):
+        self.fields = sorted(fields)
+        self.tree = _field_tree(self.fields)
+        self._decoder = msgspec.json.Decoder(list[_struct_type(self.tree, 'Event')]) if msgspec else None
+
+    @classmethod
+    def of_mapping(cls, name, extra_fields=()):
+        """
+        Decoder keeping the fields used by a mapping ('ghmap' or 'glmap') and some other fields.
+        """
+        return cls([*event_columns(name), *extra_fields])
+
+    def prune(self, events):
+        """
+        Keep the fields of the decoder in decoded events (new dictionaries).
+        """
+        if not isinstance(events, list):
+            return events
+        return [_prune(event, self.tree) for event in events]
+
+    def decode(self, data):
+        """
+        Decode a JSON list of events (str or bytes), keeping the fields of the decoder.
+        Another document (ex: an error message) is decoded whole.
+        """
+        if self._decoder is not None:
+            try:
+                return msgspec.to_builtins(self._decoder.decode(data))
+            except (msgspec.ValidationError, msgspec.DecodeError):
+                pass
+        return self.prune(loads(data))
@@ -0,0 +1,279 @@
+"""
+Process-wide registry of the ghmap/glmap mappers.
+
+The mapping configurations are read and compiled only once per process, then shared by every manager and script.
+`reload_mappers` must be called when a configuration file is modified.
+"""
+
+import threading
+from array import array
+from importlib.resources import files
+
+from ghmap.mapping.action_mapper import ActionMapper
+from ghmap.utils import load_json_file
+
+from .action_index import ActionIndex, find_conflicts
+from .activity_engine import WindowActivityMapper
+from .activity_table import ActionTable, Codes, epoch_seconds
+
+# Key: name of the mapping - Value: (event to action file, action to activity file)
+MAPPING_FILES = {
+    'ghmap': (files("gitbot_utils").joinpath("config", "event_to_action.json"),
+              files("gitbot_utils").joinpath("config", "action_to_activity.json")),
+    'glmap': (files("gitbot_utils").joinpath("config", "gl_event_to_action.json"),
+              files("gitbot_utils").joinpath("config", "gl_action_to_activity.json")),
+}
+
+# Key: name of the mapping - Value: (CompiledActionMapper, CompiledActivityMapper)
+_mappers = {}
+_lock = threading.Lock()
+
+
+class CompiledActionMapper(ActionMapper):
+    """
+    ActionMapper where the action definitions are compiled in a decision index (see `gitbot_utils.action_index`).
+
+    For each event, only the actions that can match its type and the values of its fields are tested (in the order
+    of the configuration), instead of every action of the mapping.
+    The configuration is checked when the mapper is created: an action that can never be used raises a ValueError,
+    the actions matching the same events are reported.
+    """
+
+    def __init__(self, action_mapping):
+        super().__init__(action_mapping, progress_bar=False)
+        conflicts = find_conflicts(action_mapping)
+        unreachable = [(first, second) for kind, first, second in conflicts if kind == 'unreachable']
+        if unreachable:
+            raise ValueError(f"Actions never used (matched by a previous action): {unreachable}")
+        for _, first, second in conflicts:
+            print(f"Warning: {second} is not used for the events matching {first} (defined before).")
+        self.index = ActionIndex(action_mapping, self.event_type_key)
+
+    def _find_action(self, event_record):
+        """
+        Return the name and the details of the first action matching the event, or None if there is none.
+        """
+        return self.index.find_action(event_record)
+
+    def map(self, events, mapping_strategy="flexible"):
+        """
+        Map events to actions. Same behaviour as `ActionMapper.map`.
+        """
+        if mapping_strategy not in ("strict", "flexible"):
+            raise ValueError(f"Invalid mapping_strategy: {mapping_strategy}")
+
+        all_mapped_actions = []
+        unknown_warning_issued = False
+        for event_record in events:
+            if 'payload' in event_record:
+                event_record = self._deserialize_payload(event_record)
+            event_record = self._convert_date_to_iso(event_record)
+
+            match = self._find_action(event_record)
+            if match is None:
+                if mapping_strategy == "strict":
+                    raise ValueError(f"UnknownAction encountered for event: {event_record}")
+                if not unknown_warning_issued:
+                    print("Warning: Some actions not identified and mapped as UnknownAction.")
+                    unknown_warning_issued = True
+                match = ('UnknownAction', self.action_mapping['actions']['UnknownAction'])
+
+            action_name, action_details = match
+            all_mapped_actions.append(self._extract_attributes(event_record, action_details, action_name))
+
+        return all_mapped_actions
+
+    def map_table(self, events, mapping_strategy="flexible"):
+        """
+        Map events to actions, as an `ActionTable` (same actions as `map`). The details of the actions are extracted
+        from the events on demand, the events must not be modified while the table is used.
+        """
+        if mapping_strategy not in ("strict", "flexible"):
+            raise ValueError(f"Invalid mapping_strategy: {mapping_strategy}")
+
+        common_fields = self.action_mapping['common_fields']
+        action_mapping = self.action_mapping['actions']
+        action_names = list(action_mapping)
+        action_codes = {name: code for code, name in enumerate(action_names)}
+        action, dates, actor, repository = array('h'), array('q'), array('i'), array('i')
+        event_ids, records = [], []
+        actors, repositories = Codes(), Codes()
+        # Key: date of an event - Value: epoch seconds
+        seconds = {}
+        unknown_warning_issued = False
+        for event_record in events:
+            if 'payload' in event_record:
+                event_record = self._deserialize_payload(event_record)
+
+            match = self._find_action(event_record)
+            if match is None:
+                if mapping_strategy == "strict":
+                    raise ValueError(f"UnknownAction encountered for event: {event_record}")
+                if not unknown_warning_issued:
+                    print("Warning: Some actions not identified and mapped as UnknownAction.")
+                    unknown_warning_issued = True
+                match = ('UnknownAction', action_mapping['UnknownAction'])
+
+            action.append(action_codes[match[0]])
+            created_at = self._extract_field(event_record, common_fields['date'])
+            if created_at not in seconds:
+                seconds[created_at] = epoch_seconds(created_at)
+            dates.append(seconds[created_at])
+            event_ids.append(self._extract_field(event_record, common_fields['event_id']))
+            actor_fields = self._extract_fields(event_record, common_fields['actor'])
+            actor.append(actors.code(tuple(actor_fields.values()), actor_fields))
+            repository_fields = self._extract_fields(event_record, common_fields['repository'])
+            repository.append(repositories.code(tuple(repository_fields.values()), repository_fields))
+            records.append(event_record)
+
+        def details(position):
+            attributes = action_mapping[action_names[action[position]]]['attributes']
+            return self._extract_fields(records[position], attributes.get('details', {}))
+
+        return ActionTable(action, dates, actor, repository, event_ids, action_names, actors.values,
+                           repositories.values, details)
+
+
+class CompiledActivityMapper(WindowActivityMapper):
+    """
+    ActivityMapper that can be shared between contributors and threads, with the grouping engine of
+    `gitbot_utils.activity_engine`.
+
+    The set of used actions is reset at each call of `map` and is local to the calling thread.
+    """
+
+    def __init__(self, activity_mapping):
+        self._local = threading.local()
+        super().__init__(activity_mapping)
+
+    @property
+    def used_ids(self):
+        if not hasattr(self._local, 'used_ids'):
+            self._local.used_ids = set()
+        return self._local.used_ids
+
+    @used_ids.setter
+    def used_ids(self, value):
+        self._local.used_ids = value
+
+    def map(self, actions):
+        """
+        Map actions to activities. Same behaviour as `ActivityMapper.map` on a new mapper.
+        """
+        self.used_ids = set()
+        return super().map(actions)
+
+
+def _leaves(mapping):
+    """
+    Values (field paths) of a nested mapping of the configuration.
+    """
+    if isinstance(mapping, dict):
+        for value in mapping.values():
+            yield from _leaves(value)
+    elif isinstance(mapping, list):
+        for value in mapping:
+            yield from _leaves(value)
+    elif isinstance(mapping, str):
+        yield mapping
+
+
+def _keys(condition, prefix=''):
+    """
+    Keys (field paths) of a nested event condition of the configuration.
+    """
+    for key, value in condition.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            yield from _keys(value, path)
+        else:
+            yield path
+
+
+def event_columns(name='glmap'):
+    """
+    Field paths of the events used by a mapping: event type, date, common fields, conditions and details
+    of the actions.
+
+    Returns:
+        A sorted list of dotted field paths
+    """
+    config = load_json_file(MAPPING_FILES[name][0])
+    event_type_key = config['parameters'].get('event_type_key', 'type')
+    # Same keys as `ActionMapper`
+    created_at_key = config['parameters'].get('created_at_key', 'created_at')
+    columns = {event_type_key, created_at_key, *_leaves(config['common_fields'])}
+    for action in config['actions'].values():
+        columns.update(event_type_key if path == 'type' else path for path in _keys(action['event']))
+        columns.update(_leaves(action['attributes'].get('details', {})))
+    return sorted(columns)
+
+
+def _compile_mappers(name):
+    event_to_action_file, action_to_activity_file = MAPPING_FILES[name]
+    action_mapper = CompiledActionMapper(load_json_file(event_to_action_file))
+    activity_mapper = CompiledActivityMapper(load_json_file(action_to_activity_file))
+    return action_mapper, activity_mapper
+
+
+def get_mappers(name):
+    """
+    Get the mappers of a mapping. The configuration files are loaded and compiled on the first call only.
+
+    Parameters:
+        name: The name of the mapping ('ghmap' or 'glmap')
+
+    Returns:
+        A tuple (action mapper, activity mapper)
+    """
+    with _lock:
+        if name not in _mappers:
+            _mappers[name] = _compile_mappers(name)
+        return _mappers[name]
+
+
+def reload_mappers(name=None):
+    """
+    Reload the configuration files of a mapping (or of all the mappings if `name` is None).
+    To use when a configuration file has changed. The mappers are compiled again on their next use.
+
+    Parameters:
+        name: The name of the mapping to reload (default: None)
+    """
+    with _lock:
+        if name:
+            _mappers.pop(name, None)
+        else:
+            _mappers.clear()
+
+
+def map_events(events, name):
+    """
+    Convert the events of a contributor to activities with the shared mappers.
+
+    Parameters:
+        events: A list of dictionaries corresponding to the events of a contributor
+        name: The name of the mapping ('ghmap' or 'glmap')
+
+    Returns:
+        A list of dictionaries corresponding to the activities of a contributor
+    """
+    action_mapper, activity_mapper = get_mappers(name)
+    actions = action_mapper.map(events)
+    return activity_mapper.map(actions)
+
+
+def map_events_table(events, name):
+    """
+    Convert the events of a contributor to activities with the shared mappers, without creating a dictionary
+    per action or per activity (see `gitbot_utils.activity_table`).
+
+    Parameters:
+        events: A list of dictionaries corresponding to the events of a contributor
+        name: The name of the mapping ('ghmap' or 'glmap')
+
+    Returns:
+        An `ActivityTable` with the activities of the contributor (same activities as `map_events`)
+    """
+    action_mapper, activity_mapper = get_mappers(name)
+    return activity_mapper.map_table(action_mapper.map_table(events))
@@ -0,0 +1,150 @@
+"""
+Registry of the .joblib models of a folder, accessed by name (ex: 'bimbas').
+
+The models are not installed with the package: the folder must be given explicitly, or by the
+`GITBOT_UTILS_MODELS` environment variable (ex: src/resources/models of the repository).
+
+Each model is loaded on first use and only once per process (the registry is thread-safe). Load the models before
+starting forked workers to share them between the processes (copy-on-write).
+"""
+
+import functools
+import os
+import threading
+
+import joblib
+
+from .fast_model import FastModel
+
+# Environment variable with the folder of the models
+MODELS_ENV = 'GITBOT_UTILS_MODELS'
+
+
+def models_folder(folder=None):
+    """
+    Folder of the models: `folder` if given, else the `GITBOT_UTILS_MODELS` environment variable.
+
+    Raises:
+        ValueError: If no folder is given and the environment variable is not set
+        FileNotFoundError: If the folder does not exist
+    """
+    if folder is None:
+        folder = os.environ.get(MODELS_ENV)
+    if folder is None:
+        raise ValueError(f"No models folder: the models are not installed with gitbot_utils, pass the folder of the "
+                         f".joblib models (src/resources/models of the repository) or set the {MODELS_ENV} "
+                         f"environment variable.")
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Models folder not found: {os.path.normpath(folder)}. The models are not installed "
+                                f"with gitbot_utils: pass the folder of the .joblib models (src/resources/models of "
+                                f"the repository) or set the {MODELS_ENV} environment variable.")
+    return folder
+
+
+class ModelRegistry:
+    """
+    Lazy access to the .joblib models of a folder.
+    """
+
+    def __init__(self, folder=None, mmap_mode=None):
+        """
+        Initialize the registry of the models of a folder.
+
+        Parameters:
+            folder: The folder with the .joblib models (default: see `models_folder`)
+            mmap_mode: The `mmap_mode` of `joblib.load` (default: the arrays are loaded in memory)
+        """
+        self.folder = models_folder(folder)
+        self.mmap_mode = mmap_mode
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """
+        Names of the models of the folder (file names without the .joblib extension).
+        """
+        return sorted(name[:-len('.joblib')] for name in os.listdir(self.folder) if name.endswith('.joblib'))
+
+    def path(self, name):
+        return os.path.join(self.folder, f'{name}.joblib')
+
+    def get(self, name):
+        """
+        Model with the given name, loaded on the first call.
+
+        Parameters:
+            name: The name of the model (ex: 'bimbas' for bimbas.joblib)
+
+        Returns:
+            model - loaded model
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                if not os.path.isfile(self.path(name)):
+                    raise KeyError(f"Unknown model {name}: available models are {self.names()}")
+                self._models[name] = joblib.load(self.path(name), mmap_mode=self.mmap_mode)
+            return self._models[name]
+
+    def get_compiled(self, name):
+        """
+        Flat array version of a model (see `gitbot_utils.fast_model`), loaded on the first call from the
+        {name}.npz file exported by `scripts/export_models.py`. It does not need scikit-learn.
+
+        Returns:
+            A `FastModel` with the same `feature_names_in_` and `predict_proba` as the model
+        """
+        key = f'{name}.npz'
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            if key not in self._models:
+                path = os.path.join(self.folder, key)
+                if not os.path.isfile(path):
+                    raise KeyError(f"No compiled version of {name}: run scripts/export_models.py")
+                self._models[key] = FastModel(path)
+            return self._models[key]
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __contains__(self, name):
+        return name in self._models or os.path.isfile(self.path(name))
+
+    def feature_names(self, name):
+        """
+        Features expected by a model, in its order (`feature_names_in_`).
+
+        Returns:
+            A list of feature names (None if the model was trained without feature names)
+        """
+        names = getattr(self.get(name), 'feature_names_in_', None)
+        return None if names is None else list(names)
+
+    def loaded(self):
+        """
+        Names of the models already loaded by this process.
+        """
+        return list(self._models)
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_registry(folder):
+    return ModelRegistry(folder)
+
+
+def get_registry(folder=None):
+    """
+    Registry shared by the whole process for a folder of models (default: see `models_folder`).
+    """
+    return _shared_registry(os.path.realpath(models_folder(folder)))
+
+
+def get_model(name, folder=None):
+    """
+    Model with the given name from the shared registry of the folder (see `ModelRegistry.get`).
+    """
+    return get_registry(folder).get(name)
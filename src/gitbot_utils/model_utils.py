@@ -1,6 +1,8 @@
 import warnings
 
 import joblib
+import numpy as np
+import pandas as pd
 import rabbit as rb
 
 
@@ -18,10 +20,73 @@ def predict_contributor(features, model):
     """
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=UserWarning)
-        proba = model.predict_proba(features)
+        proba = model.predict_proba(align_features(features, model))
     return rb.compute_confidence(proba[0][1])
 
 
+def compute_confidences(probabilities):
+    """
+    Vectorized `rabbit.compute_confidence`: type and confidence of each contributor from its probability of being
+    a bot.
+
+    Parameters:
+        probabilities: The probabilities of being a bot (array-like)
+
+    Returns:
+        contributor_types (np.ndarray) - type of each contributor ('Bot' or 'Human')
+        confidences (np.ndarray) - confidence score of each determined type (value between 0.0 and 1.0)
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    contributor_types = np.where(probabilities <= 0.5, 'Human', 'Bot').astype(object)
+    confidences = np.round(np.abs(probabilities - 0.5) * 2, 3)
+    return contributor_types, confidences
+
+
+def align_features(features, model):
+    """
+    Select the columns of `features` used by the model, in the order of the model (`feature_names_in_`).
+    Models trained without feature names receive `features` unchanged.
+    """
+    names = getattr(model, 'feature_names_in_', None)
+    if names is None:
+        return features
+    return features[list(names)]
+
+
+def predict_contributors(features, models):
+    """
+    Predict if many contributors are bots or not with several models (one `predict_proba` per model).
+
+    Parameters:
+        features: A DataFrame with the features of the contributors (one row per contributor). It can hold more
+            features than a model uses (ex: NR for a model trained without it): the columns are aligned on each
+            model.
+        models: A dictionary with the name of each model as key and the model as value.
+
+    Returns:
+        A DataFrame with the same index as `features` and, for each model, the columns '{name}_label' and
+        '{name}_conf', as well as a column 'label': the label of the models if they all agree, 'Unknown' otherwise.
+    """
+    result = pd.DataFrame(index=features.index)
+    labels = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        for name, model in models.items():
+            if len(features):
+                proba = model.predict_proba(align_features(features, model))[:, 1]
+            else:
+                proba = np.empty(0)
+            contributor_types, confidences = compute_confidences(proba)
+            result[f'{name}_label'] = contributor_types
+            result[f'{name}_conf'] = confidences
+            labels.append(contributor_types)
+
+    if labels:
+        agree = np.all([model_labels == labels[0] for model_labels in labels], axis=0)
+        result['label'] = np.where(agree, labels[0], 'Unknown').astype(object)
+    return result
+
+
 def load_model(model_path=None):
     """
     Load a .joblib model from a given path. If no path is provided, the default model from RABBIT is loaded.
@@ -0,0 +1,157 @@
+"""
+Cache of the owners of the GitLab repositories (Key: project id - Value: namespace path of the owner).
+
+Without path, the cache only lives in memory. With a path, the owners are also stored in an SQLite database
+that survives restarts and can be shared by several worker processes (WAL mode).
+The entries expire after `ttl` seconds and the database keeps at most `max_entries` entries (the oldest are evicted).
+
+The project ids are stored as integers: '123' and 123 are the same project. The projects that could not be queried
+(deleted or private projects) are stored without owner (None) and expire after `failure_ttl` seconds, so that they
+are not queried again at each run.
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class OwnerCache:
+    """
+    Size-bounded repository owners cache with TTL expiry, optionally persisted in SQLite.
+
+    Attributes:
+        path (str): Path of the SQLite database (None for a cache in memory only)
+        ttl (float): Time (in seconds) after which an entry expires
+        failure_ttl (float): Time (in seconds) after which an entry without owner (failed lookup) expires
+        max_entries (int): Maximum number of entries of the cache
+    """
+    # Number of insertions between two evictions of the oldest entries
+    evict_every = 1000
+
+    def __init__(self, path=None, ttl=30 * 24 * 3600, failure_ttl=24 * 3600, max_entries=100_000):
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        # Key: project id (int) - Value: (owner or None for a failed lookup, time at which it was fetched)
+        self._memory = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        if path:
+            with self._connection() as connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS owners "
+                                   "(project_id INTEGER PRIMARY KEY, owner TEXT NOT NULL, fetched_at REAL NOT NULL)")
+                connection.execute("CREATE INDEX IF NOT EXISTS owners_fetched_at ON owners (fetched_at)")
+                # Failed lookups (separate table: the owners of the existing databases cannot be NULL)
+                connection.execute("CREATE TABLE IF NOT EXISTS failures "
+                                   "(project_id INTEGER PRIMARY KEY, failed_at REAL NOT NULL)")
+
+    def _connection(self):
+        """
+        SQLite connection of the calling thread.
+        """
+        if not hasattr(self._local, 'connection'):
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return self._local.connection
+
+    def _is_valid(self, entry, now):
+        """
+        Check if an entry of the cache (owner, time at which it was fetched) has not expired.
+        """
+        return entry[1] >= now - (self.ttl if entry[0] is not None else self.failure_ttl)
+
+    def get_many(self, project_ids):
+        """
+        Get the owners of several projects.
+
+        Returns:
+            A dictionary with the owner of each project found in the cache, with the ids as given (missing and
+            expired projects are skipped, the owner of a project that could not be queried is None)
+        """
+        now = time.time()
+        # Key: project id (int) - Value: project ids as given
+        keys = {}
+        for project_id in project_ids:
+            keys.setdefault(int(project_id), []).append(project_id)
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry and self._is_valid(entry, now):
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+
+        if self.path and missing:
+            connection = self._connection()
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = connection.execute(
+                    f"SELECT project_id, owner, fetched_at FROM owners "
+                    f"WHERE fetched_at >= ? AND project_id IN ({placeholders}) "
+                    f"UNION ALL SELECT project_id, NULL, failed_at FROM failures "
+                    f"WHERE failed_at >= ? AND project_id IN ({placeholders})",
+                    [now - self.ttl, *chunk, now - self.failure_ttl, *chunk]
+                ).fetchall()
+                with self._lock:
+                    for project_id, owner, fetched_at in rows:
+                        # The owner found after a failed lookup wins
+                        if project_id not in found or owner is not None:
+                            self._memory[project_id] = (owner, fetched_at)
+                            found[project_id] = owner
+        return {project_id: owner for key, owner in found.items() for project_id in keys[key]}
+
+    def set_many(self, owners):
+        """
+        Add the owners of several projects to the cache.
+
+        Parameters:
+            owners: A dictionary with the owner of each project (None for a project that could not be queried)
+        """
+        now = time.time()
+        owners = {int(project_id): owner for project_id, owner in owners.items()}
+        with self._lock:
+            for project_id, owner in owners.items():
+                self._memory[project_id] = (owner, now)
+            if len(self._memory) > self.max_entries:
+                # Keep the most recent entries in memory (with some room to avoid sorting at each insertion)
+                recent = sorted(self._memory.items(), key=lambda item: item[1][1])
+                self._memory = dict(recent[-int(self.max_entries * 0.9):])
+            self._inserts += len(owners)
+            evict = self._inserts >= self.evict_every
+            if evict:
+                self._inserts = 0
+
+        if self.path and owners:
+            with self._connection() as connection:
+                connection.executemany("INSERT OR REPLACE INTO owners VALUES (?, ?, ?)",
+                                       [(project_id, owner, now) for project_id, owner in owners.items()
+                                        if owner is not None])
+                connection.executemany("DELETE FROM failures WHERE project_id = ?",
+                                       [(project_id,) for project_id, owner in owners.items() if owner is not None])
+                connection.executemany("INSERT OR REPLACE INTO failures VALUES (?, ?)",
+                                       [(project_id, now) for project_id, owner in owners.items() if owner is None])
+                connection.executemany("DELETE FROM owners WHERE project_id = ?",
+                                       [(project_id,) for project_id, owner in owners.items() if owner is None])
+                if evict:
+                    connection.execute("DELETE FROM owners WHERE fetched_at < ?", (now - self.ttl,))
+                    connection.execute("DELETE FROM failures WHERE failed_at < ?", (now - self.failure_ttl,))
+                    connection.execute("DELETE FROM owners WHERE project_id IN (SELECT project_id FROM owners "
+                                       "ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def get(self, project_id, default=None):
+        return self.get_many([project_id]).get(project_id, default)
+
+    def __contains__(self, project_id):
+        return project_id in self.get_many([project_id])
+
+    def __getitem__(self, project_id):
+        return self.get_many([project_id])[project_id]
+
+    def __setitem__(self, project_id, owner):
+        self.set_many({project_id: owner})
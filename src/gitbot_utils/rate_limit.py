@@ -0,0 +1,208 @@
+"""
+Rate limiter shared by all the requests made with the same API token.
+
+The state of the limiter is updated from the rate limit headers of every response
+(`RateLimit-*` for GitLab, `X-RateLimit-*` for GitHub), so that the requests are paced before the quota is exhausted
+instead of waiting after a 429 response. The limiter can be used from several threads and asyncio tasks at once.
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+# Prefixes of the rate limit headers (GitLab, GitHub)
+HEADER_PREFIXES = ('RateLimit-', 'X-RateLimit-')
+
+
+class RetryError(OSError):
+    """
+    A request still rate limited or failed after `RateLimiter.max_retries` retries. The response is missing, so
+    it must not be taken for an empty (last) page.
+
+    Attributes:
+        query (str): The URL of the request
+        status (int): The status of the last response
+    """
+
+    def __init__(self, query, status):
+        super().__init__(f"Error {status} while querying {query}, still failing after the retries")
+        self.query = query
+        self.status = status
+
+
+def _header(headers, name):
+    """
+    Get the integer value of a rate limit header (None if it is missing).
+    """
+    for prefix in HEADER_PREFIXES:
+        value = headers.get(prefix + name)
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class RateLimiter:
+    """
+    Token bucket synchronised with the rate limit headers of the API.
+
+    As long as more than `reserve` requests remain in the current window, the requests are sent without delay.
+    Below, the remaining requests are spread evenly until the reset time, and when no request remains
+    the requests wait for the reset. While the quota is unknown (first request, or new window of an API that
+    does not send its limit), a single request is sent at a time to discover it. If the responses do not contain
+    rate limit headers, the requests are not limited.
+
+    Attributes:
+        limit (int): Number of requests allowed per window (None until it is received)
+        remaining (int): Number of requests that can still be sent in the current window (None if unknown)
+        reset (float): Reset time of the current window (epoch seconds, None if unknown)
+        reserve (int): Number of requests under which the requests are paced
+        max_retries (int): Maximum number of retries of a rate limited (429, or 403 without remaining requests) or
+            failed (5xx) request, before a `RetryError` is raised
+        backoff_base (float): Base delay (in seconds) of the exponential backoff
+        backoff_max (float): Maximum delay (in seconds) of the exponential backoff
+    """
+    # Key: (query root, API key) - Value: RateLimiter
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+    # Delay (in seconds) between two checks while waiting for the quota to be known
+    poll_interval = 0.05
+
+    def __init__(self, reserve=10, max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight = 0
+        self._probed = False
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_token(cls, query_root, api_key):
+        """
+        Get the rate limiter of an API token. All the managers using the same token share the same limiter.
+        Requests without token share the limiter of their API (the quota is per IP address).
+        """
+        with cls._limiters_lock:
+            key = (query_root, api_key)
+            if key not in cls._limiters:
+                cls._limiters[key] = cls()
+            return cls._limiters[key]
+
+    def _reserve(self):
+        """
+        Try to reserve a request.
+
+        Returns:
+            The delay (in seconds) to wait
+            True if the request is reserved (to send after the delay), False if it must be tried again after the delay
+        """
+        with self._lock:
+            now = time.time()
+            if self.reset is not None and now >= self.reset:
+                # The window is over: the whole quota is available again
+                self.remaining = self.limit
+                self.reset = None
+                self._probed = self.limit is not None
+
+            if self.remaining is None:
+                if not self._probed and self._in_flight:
+                    return self.poll_interval, False
+            elif self.remaining <= 0:
+                if self.reset is None:
+                    return self.poll_interval, False
+                return self.reset - now, False
+
+            interval = 0.0
+            if self.remaining is not None:
+                if self.reset is not None and self.remaining <= self.reserve:
+                    # Spread the last requests until the reset of the window
+                    interval = (self.reset - now) / self.remaining
+                self.remaining -= 1
+            self._in_flight += 1
+            start = max(now, self._next_time)
+            self._next_time = start + interval
+            return start - now, True
+
+    def acquire(self):
+        """
+        Wait (blocking) until a request can be sent.
+        `update` must be called with the headers of the response once it is received
+        (`release` if the request fails without response).
+        """
+        while True:
+            delay, reserved = self._reserve()
+            if delay > 0:
+                time.sleep(delay)
+            if reserved:
+                return
+
+    async def acquire_async(self):
+        """
+        Wait (without blocking the event loop) until a request can be sent.
+        `update` must be called with the headers of the response once it is received
+        (`release` if the request fails without response).
+        """
+        while True:
+            delay, reserved = self._reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if reserved:
+                return
+
+    def update(self, headers):
+        """
+        Release a request sent after `acquire` and update the state of the limiter with the rate limit headers
+        of its response.
+        """
+        limit = _header(headers, 'Limit')
+        remaining = _header(headers, 'Remaining')
+        reset = _header(headers, 'Reset')
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            self._probed = True
+            if limit is not None:
+                self.limit = limit
+            if remaining is None or reset is None or reset <= time.time():
+                return
+            # The requests still in flight may not be counted by the API yet
+            remaining -= self._in_flight
+            if self.reset is None or reset > self.reset:
+                # New window
+                self.reset = reset
+                self.remaining = remaining
+            elif reset == self.reset:
+                # Responses can arrive out of order: keep the lowest count
+                self.remaining = min(self.remaining, remaining)
+
+    def release(self):
+        """
+        Release a request sent after `acquire` that got no response (connection error, timeout, cancellation),
+        without changing the known quota.
+        """
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+
+    def backoff(self, attempt, headers):
+        """
+        Delay (in seconds) before retrying a request that failed with a 429, 403 or 5xx status.
+        It follows the `Retry-After` header when it is present, and an exponential backoff with full jitter otherwise.
+        """
+        retry_after = headers.get('Retry-After')
+        if retry_after is not None and retry_after.isdigit():
+            return int(retry_after) + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def should_retry(self, status):
+        """
+        Check if a request with the given status must be retried: rate limited (429, or 403 when no request remains
+        in the current window, as sent by GitHub) or failed (5xx).
+        """
+        return status == 429 or status >= 500 or (status == 403 and self.remaining is not None and self.remaining <= 0)
@@ -0,0 +1,368 @@
+"""
+Long-running local service predicting if contributors are bots from their raw events.
+
+The service keeps everything warm between the requests: the managers (with their compiled mappers and owner
+caches) and the models (flat array versions of `gitbot_utils.fast_model` when they are exported, the
+scikit-learn pipelines otherwise). Each request is handled in these stages:
+1. mapping: the events are mapped to activities by the manager of the platform ('github': ghmap, 'github-rbmap':
+   rbmap with `GitHubManager(ghmap=False)`, 'gitlab': glmap), in the thread of the request,
+2. owners: the owners of the GitLab projects that are not in the owner cache of the manager (or given with the
+   request) are queried by a pool of threads shared by all the requests (a single query per project). A request
+   waits at most `owner_timeout` seconds for them: after that, it is answered with an error and the queries go on
+   in the background to fill the cache,
+3. features: the concurrent requests are combined in micro-batches (up to `max_batch_size` requests). The features
+   are computed by the manager of each request (`APIManager.extract_features`, the RABBIT feature extractor by
+   default). The requests of managers with `native_features` are computed together in a single pass instead (see
+   `features.compute_features_batch`). A batch only waits (at most `max_wait` seconds) for the requests that are
+   still being mapped,
+4. prediction: one `predict_proba` per model and per batch (see `model_utils.predict_contributors`).
+
+The latency of each stage is returned with each prediction and summarized (percentiles) by `stats`.
+Supported operating point: on a single core, with the native features and the compiled models, the p99 latency
+stays under 50 ms up to about 4 concurrent clients (see `benchmarks/bench_scoring_service.py`). With more clients,
+the requests queue up and the latency grows with their number: run several services to serve more clients.
+
+HTTP API (see `ScoringService.serve`):
+- POST /predict with a JSON body {"platform": "github" | "github-rbmap" | "gitlab", "contributor": name,
+  "events": [...]}, and optionally "owners": {project id: owner} for the GitLab projects
+- GET /stats
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from . import json_codec, model_utils
+from .features import FEATURES, compute_features_batch, features_frame
+from .gh_api import GitHubManager
+from .gl_api import GitLabManager
+from .model_registry import get_registry
+
+STAGES = ['mapping', 'owners', 'queue', 'features', 'prediction', 'total']
+
+
+class _Request:
+    """
+    Activities of a contributor waiting in the micro-batch queue.
+
+    Attributes:
+        manager (APIManager): The manager of the platform of the request (it extracts the features)
+        columns (dict): The 'date', 'activity', 'repository' and 'owner' of each activity (arrays)
+    """
+
+    def __init__(self, manager, contributor, columns, timings):
+        self.manager = manager
+        self.contributor = contributor
+        self.columns = columns
+        self.timings = timings
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+
+
+class ScoringService:
+    """
+    Bot prediction with warm managers and models, and micro-batching of the concurrent requests.
+    """
+
+    def __init__(self, managers=None, models=('bimbas',), models_folder=None, compiled=True, max_batch_size=64,
+                 max_wait=0.005, owner_timeout=0.05, owner_workers=8, history=10_000):
+        """
+        Initialize the service and load the models.
+
+        Parameters:
+            managers: A dictionary with the manager of each platform (default: {'github': GitHubManager(),
+                'github-rbmap': GitHubManager(ghmap=False), 'gitlab': GitLabManager()})
+            models: The names of the models of the registry (the label is 'Unknown' if they disagree)
+            models_folder: The folder of the models (default: the `GITBOT_UTILS_MODELS` environment variable)
+            compiled: Whether to use the flat array versions of the models when they are exported
+            max_batch_size: The maximum number of requests in a micro-batch
+            max_wait: The maximum time (in seconds) to wait for the requests being mapped before processing a batch
+            owner_timeout: The maximum time (in seconds) a request waits for the owners of its GitLab projects
+            owner_workers: The number of threads querying the owners of the GitLab projects
+            history: The number of requests kept to compute the latency percentiles
+        """
+        if managers is None:
+            managers = {'github': GitHubManager(), 'github-rbmap': GitHubManager(ghmap=False),
+                        'gitlab': GitLabManager()}
+        self.managers = managers
+        registry = get_registry(models_folder)
+        self.models = {}
+        for name in models:
+            try:
+                self.models[name] = registry.get_compiled(name) if compiled else registry.get(name)
+            except KeyError:
+                self.models[name] = registry.get(name)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.owner_timeout = owner_timeout
+        self.latencies = {stage: deque(maxlen=history) for stage in STAGES}
+        self.batch_sizes = deque(maxlen=history)
+        self._queue = queue.Queue()
+        # Number of requests being mapped (the batches wait for them)
+        self._nb_mapping = 0
+        self._mapping_lock = threading.Lock()
+        self._owner_executor = ThreadPoolExecutor(max_workers=owner_workers)
+        # Key: (manager id, project id) - Value: future of the query of the owner of the project
+        self._owner_queries = {}
+        self._owner_lock = threading.Lock()
+        threading.Thread(target=self._process_batches, daemon=True).start()
+
+    def _query_owner(self, manager, project_id):
+        """
+        Future of the owner of a GitLab project, shared by the requests waiting for the same project.
+        """
+        key = (id(manager), project_id)
+        with self._owner_lock:
+            future = self._owner_queries.get(key)
+            if future is None:
+                future = self._owner_executor.submit(lambda: manager.query_repo_owners([project_id])[project_id])
+                self._owner_queries[key] = future
+                future.add_done_callback(lambda _: self._forget_owner_query(key))
+            return future
+
+    def _forget_owner_query(self, key):
+        with self._owner_lock:
+            self._owner_queries.pop(key, None)
+
+    def _repository_owners(self, manager, activities, owners=None):
+        """
+        Owners of the distinct repositories of an `ActivityTable` (in the order of `activities.repositories`).
+        For GitLab, the owners that are not in the cache (or in `owners`, {project id: owner}) are queried
+        and awaited at most `owner_timeout` seconds.
+
+        Returns:
+            The list of owners (None if the owners of some projects are still being queried)
+        """
+        if not isinstance(manager, GitLabManager):
+            return manager._get_repo_owners([{'repository': repository} for repository in activities.repositories])
+        if owners:
+            manager.repo_owners.set_many({int(project_id): owner for project_id, owner in owners.items()})
+        project_ids = [repository['id'] for repository in activities.repositories]
+        known = manager.repo_owners.get_many(project_ids)
+        futures = {project_id: self._query_owner(manager, project_id)
+                   for project_id in project_ids if project_id not in known}
+        if futures:
+            done, not_done = wait(futures.values(), timeout=self.owner_timeout)
+            if not_done:
+                return None
+            # The owners of the projects that could not be queried are None (not counted, as in `activity_to_df`)
+            known.update({project_id: future.result() for project_id, future in futures.items()})
+        return [known[project_id] for project_id in project_ids]
+
+    def predict(self, platform, contributor, events, owners=None):
+        """
+        Predict if a contributor is a bot from its events (blocks until the batch of the request is processed).
+
+        Parameters:
+            platform: The platform of the events ('github', 'github-rbmap' or 'gitlab', the keys of `managers`)
+            contributor: The name of the contributor
+            events: A list of dictionaries corresponding to the events of the contributor
+            owners: The owners of GitLab projects, {project id: owner} (added to the owner cache of the manager)
+
+        Returns:
+            A dictionary with the contributor, the number of activities, the label and confidence of each model,
+            the label ('Unknown' if the models disagree, None without enough events or while the owners of its
+            projects are queried) and the latency of each stage (in milliseconds)
+        """
+        if platform not in self.managers:
+            raise ValueError(f"Unknown platform: {platform}")
+        manager = self.managers[platform]
+        start = time.perf_counter()
+        if len(events) < manager.min_events:
+            return {'contributor': contributor, 'nb_activity': 0, 'label': None,
+                    'error': f"Less than {manager.min_events} events"}
+        with self._mapping_lock:
+            self._nb_mapping += 1
+        try:
+            activities = manager.events_to_activity_table(events)
+            mapped = time.perf_counter()
+            repository_owners = self._repository_owners(manager, activities, owners)
+            timings = {'mapping': (mapped - start) * 1000, 'owners': (time.perf_counter() - mapped) * 1000}
+            if repository_owners is None:
+                return {'contributor': contributor, 'nb_activity': len(activities), 'label': None,
+                        'error': "The owners of the projects are being queried, retry later", 'timings': timings}
+            columns = {'date': activities.start, 'activity': activities.names(),
+                       'repository': activities.repository_ids(),
+                       'owner': activities.per_repository(repository_owners)}
+            request = _Request(manager, contributor, columns, timings)
+            self._queue.put(request)
+        finally:
+            with self._mapping_lock:
+                self._nb_mapping -= 1
+        request.done.wait()
+
+        request.timings['total'] = (time.perf_counter() - start) * 1000
+        for stage in STAGES:
+            if stage in request.timings:
+                self.latencies[stage].append(request.timings[stage])
+        request.result['timings'] = request.timings
+        return request.result
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            timeout = deadline - time.perf_counter()
+            # Only the requests being mapped can join the batch soon: a single request is not delayed
+            if timeout <= 0 or not self._nb_mapping:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _process_batches(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if request.result is None:
+                        request.result = {'contributor': request.contributor, 'label': None, 'error': str(e)}
+            for request in batch:
+                request.done.set()
+
+    def _batch_features(self, batch):
+        """
+        Features of the requests of a batch (index: position of the request in the batch, NaN if they could not be
+        extracted). The requests of managers with `native_features` are computed in a single pass, the others with
+        `extract_features` of their manager (RABBIT feature extractor).
+        """
+        # The position of the request in the batch identifies its activities (names can be the same)
+        native = [i for i, request in enumerate(batch) if request.manager.native_features]
+        frames = []
+        if native:
+            names, matrix = compute_features_batch(
+                np.repeat(native, [len(batch[i].columns['activity']) for i in native]),
+                *(np.concatenate([batch[i].columns[column] for i in native])
+                  for column in ['date', 'activity', 'repository', 'owner']))
+            frames.append(features_frame(names, matrix))
+        for i, request in enumerate(batch):
+            if request.manager.native_features:
+                continue
+            columns = request.columns
+            activities_df = pd.DataFrame({'date': columns['date'].astype('datetime64[ns]'),
+                                          'activity': columns['activity'], 'contributor': request.contributor,
+                                          'repository': columns['repository'], 'owner': columns['owner']})
+            try:
+                frames.append(request.manager.extract_features(activities_df, request.contributor)
+                              .set_axis([i]))
+            except Exception as e:
+                request.result = {'contributor': request.contributor, 'nb_activity': len(activities_df),
+                                  'label': None, 'error': f"{type(e).__name__}: {e}"}
+        return (pd.concat(frames) if frames else pd.DataFrame(columns=FEATURES)).reindex(range(len(batch)))
+
+    def _process_batch(self, batch):
+        start = time.perf_counter()
+        self.batch_sizes.append(len(batch))
+        for request in batch:
+            request.timings['queue'] = (start - request.submitted) * 1000
+            request.timings['batch_size'] = len(batch)
+
+        features = self._batch_features(batch)
+        features_time = time.perf_counter()
+
+        try:
+            predictions = model_utils.predict_contributors(features, self.models).to_dict('records')
+        except ValueError:
+            # A contributor has features that the models do not accept (ex: missing values): predict one by one
+            predictions = []
+            for i in range(len(batch)):
+                try:
+                    predictions.append(model_utils.predict_contributors(features.iloc[[i]], self.models)
+                                       .to_dict('records')[0])
+                except ValueError as e:
+                    predictions.append({'label': None, 'error': str(e)})
+        end = time.perf_counter()
+
+        for request, nb_activity, prediction in zip(batch, features['NA'], predictions):
+            if request.result is not None:
+                # The features of the request could not be extracted
+                continue
+            request.timings['features'] = (features_time - start) * 1000
+            request.timings['prediction'] = (end - features_time) * 1000
+            request.result = {'contributor': request.contributor,
+                              'nb_activity': 0 if pd.isna(nb_activity) else int(nb_activity),
+                              **{key: value.item() if isinstance(value, np.generic) else value
+                                 for key, value in prediction.items()}}
+
+    def stats(self):
+        """
+        Number of predictions, mean batch size and percentiles (p50, p90, p99) of the latency of each stage (ms).
+        """
+        result = {'predictions': len(self.latencies['total']),
+                  'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0}
+        for stage, latencies in self.latencies.items():
+            if latencies:
+                p50, p90, p99 = np.percentile(np.array(latencies), [50, 90, 99])
+                result[stage] = {'p50': round(p50, 3), 'p90': round(p90, 3), 'p99': round(p99, 3)}
+        return result
+
+    def serve(self, host='127.0.0.1', port=8765):
+        """
+        Start the HTTP server of the service in a background thread.
+
+        Returns:
+            The server (`server.server_address` gives the port, `server.shutdown()` stops it)
+        """
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # The headers and the body are written separately: without TCP_NODELAY, the delayed ACK of the client
+            # adds ~40 ms to each response
+            disable_nagle_algorithm = True
+
+            def _send(self, status, body):
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                if self.path == '/stats':
+                    self._send(200, service.stats())
+                else:
+                    self._send(404, {'error': f"Unknown path: {self.path}"})
+
+            def do_POST(self):
+                if self.path != '/predict':
+                    self._send(404, {'error': f"Unknown path: {self.path}"})
+                    return
+                try:
+                    body = json_codec.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    result = service.predict(body.get('platform', 'gitlab'), body.get('contributor'),
+                                             body['events'], body.get('owners'))
+                except (ValueError, KeyError, TypeError) as e:
+                    self._send(400, {'error': str(e)})
+                    return
+                except Exception as e:
+                    # Ex: RABBIT not installed for 'github-rbmap', error of the API while querying the owners
+                    self._send(500, {'error': f"{type(e).__name__}: {e}"})
+                    return
+                self._send(200, result)
+
+            def log_message(self, format, *args):
+                pass
+
+        server_class = type('Server', (ThreadingHTTPServer,), {'request_queue_size': 1024, 'daemon_threads': True})
+        server = server_class((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
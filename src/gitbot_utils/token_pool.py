@@ -0,0 +1,149 @@
+"""
+Pool of API tokens, to spread the requests of the managers over the quotas of several tokens.
+
+Each token has its own rate limiter (see `gitbot_utils.rate_limit`), updated from the headers of its responses.
+Each request is routed to the token with the most remaining requests, and exhausted or revoked tokens are taken
+out of the rotation until their reset time.
+"""
+
+import asyncio
+import math
+import threading
+import time
+
+from .rate_limit import RateLimiter
+
+
+class TokenPool:
+    """
+    Pool of API tokens of the same API, usable in place of `api_key` in the API managers.
+
+    Attributes:
+        tokens (list): The tokens of the pool
+        query_root (str): The root URL of the API (identifies the rate limiters of the tokens)
+        disabled_until (dict): Key: token - Value: time (epoch seconds) until which the token is out of the rotation
+    """
+
+    # Time (in seconds) during which a token rejected for its quota is disabled when the reset time is unknown
+    default_disable_time = 60
+
+    def __init__(self, tokens, query_root=None):
+        self.tokens = list(tokens)
+        if not self.tokens:
+            raise ValueError("A token pool needs at least one token.")
+        self.query_root = query_root
+        self.disabled_until = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, api_key, query_root):
+        """
+        Get the token pool of an `api_key` argument: the pool itself, or a pool with a single token (can be None).
+        """
+        if isinstance(api_key, TokenPool):
+            return api_key
+        return cls([api_key], query_root=query_root)
+
+    def limiter(self, token):
+        """
+        Get the rate limiter of a token.
+        """
+        return RateLimiter.for_token(self.query_root, token)
+
+    def _headroom(self, token):
+        """
+        Sort key of a token: remaining requests first (unknown counts as unlimited),
+        then fewest requests in flight, then earliest reset.
+        """
+        limiter = self.limiter(token)
+        remaining = math.inf if limiter.remaining is None else limiter.remaining
+        return remaining, -limiter._in_flight, -(limiter.reset or 0)
+
+    def _select(self):
+        """
+        Select the token with the most headroom.
+
+        Returns:
+            The selected token (None if all the tokens are out of the rotation)
+            The delay (in seconds) before a token is back in the rotation
+        """
+        with self._lock:
+            now = time.time()
+            available = [token for token in self.tokens if self.disabled_until.get(token, 0) <= now]
+            if not available:
+                delay = min(self.disabled_until.values()) - now
+                if math.isinf(delay):
+                    raise RuntimeError("All the tokens of the pool are revoked.")
+                return None, delay
+            return max(available, key=self._headroom), 0
+
+    def acquire(self):
+        """
+        Wait (blocking) until a request can be sent and return the token to use.
+        `update` must be called with the response once it is received
+        (`release` if the request fails without response).
+        """
+        while True:
+            token, delay = self._select()
+            if delay > 0:
+                time.sleep(min(delay, 60))
+                continue
+            self.limiter(token).acquire()
+            return token
+
+    async def acquire_async(self):
+        """
+        Wait (without blocking the event loop) until a request can be sent and return the token to use.
+        `update` must be called with the response once it is received
+        (`release` if the request fails without response).
+        """
+        while True:
+            token, delay = self._select()
+            if delay > 0:
+                await asyncio.sleep(min(delay, 60))
+                continue
+            await self.limiter(token).acquire_async()
+            return token
+
+    def update(self, token, status, headers):
+        """
+        Update the state of a token with the status and the headers of a response.
+        A revoked token (401) is taken out of the rotation, a token rejected for its quota (403/429) until its reset.
+        """
+        limiter = self.limiter(token)
+        limiter.update(headers)
+        if len(self.tokens) == 1:
+            return
+        if status == 401:
+            self.disable(token)
+        elif status in (403, 429) and limiter.remaining is not None and limiter.remaining <= 0:
+            self.disable(token, until=limiter.reset or time.time() + self.default_disable_time)
+
+    def release(self, token):
+        """
+        Release a request sent with a token that got no response (connection error, timeout, cancellation).
+        """
+        self.limiter(token).release()
+
+    def should_retry(self, token, status):
+        """
+        Check if a request sent with a token must be retried: the token is out of the rotation
+        (another token can be used) or the status is retried by its rate limiter.
+        """
+        if status in (401, 403, 429) and self.disabled_until.get(token, 0) > time.time():
+            return True
+        return self.limiter(token).should_retry(status)
+
+    def disable(self, token, until=None):
+        """
+        Take a token out of the rotation until a given time (epoch seconds), or for good if `until` is None.
+        """
+        with self._lock:
+            self.disabled_until[token] = math.inf if until is None else until
+
+    def enable(self, token):
+        """
+        Put a token back in the rotation.
+        """
+        with self._lock:
+            self.disabled_until.pop(token, None)
@@ -6,20 +6,31 @@ For bots, it queries the members of each repository from a list and applies a he
 For humans, it queries the contributors of each repository based on their events and applies a heuristic to filter out bots.
 
 Then, two models (BIMBIS and BIMBAS) are used to predict the type of contributors (Bot or Human) based on their activity features.
+
+The crawl is checkpointed in a journal (see `gitbot_utils.crawl_journal`): the contributors selected in each repository
+and their features are recorded as soon as they are queried, and the results are appended to the output file
+repository by repository. If the script is stopped, running it again continues where it stopped.
 """
 
+import asyncio
 import os
 import random
 
 import pandas as pd
-import requests
 from dotenv import load_dotenv
 
 import gitbot_utils.model_utils as mod
+from gitbot_utils import json_codec
+from gitbot_utils.crawl_journal import CrawlJournal
 from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.gl_async import AsyncGitLabManager
+from gitbot_utils.model_registry import get_model
 
 load_dotenv()
 
+COLUMNS = ['username', 'name', 'nb_activity', 'bimbis_label', 'bimbis_conf', 'bimbas_label', 'bimbas_conf', 'label',
+           'repository']
+
 
 def bot_heuristic(username, name):
     """
@@ -32,89 +43,106 @@ def bot_heuristic(username, name):
     )
 
 
-class ContributorManager(GitLabManager):
+def _add_contributors(events, contributors, known_usernames):
     """
-    Manager specialized in querying contributors and members of GitLab repositories.
+    Add the authors of the events that pass the heuristic to `contributors` (skipping the known usernames).
     """
+    for event in events:
+        if 'author' not in event:
+            continue
+        username = event['author']['username']
+        is_bot = bot_heuristic(username, event['author'].get('name', ''))
+        if username in known_usernames or not is_bot:
+            continue
 
-    def _query_member_page(self, project_id, page):
-        query = f'{self.query_root}/projects/{project_id}/members/all'
-        response = requests.get(
-            query,
-            headers={'Private-Token': self.api_key} if self.api_key else {},
-            params={'per_page': 100, 'page': page}
-        )
-
-        if response.ok:
-            return response.json()
-        else:
-            print(f"Error while querying {project_id}: {response.status_code}")
-            return None
-
-    def _query_repo_event_page(self, project_id, page):
-        query = f'{self.query_root}/projects/{project_id}/events'
-        response = requests.get(
-            query,
-            headers={'Private-Token': self.api_key} if self.api_key else {},
-            params={'per_page': 100, 'page': page}
-        )
-
-        if response.ok:
-            return response.json(), response.headers
-        else:
-            print(f"Error while querying {project_id}: {response.status_code}")
-            return [], response.headers
+        contributors.append({
+            'id': event['author']['id'],
+            'username': username,
+            'name': event['author'].get('name', 'Unknown')
+        })
+        known_usernames.add(username)
 
-    def query_repo_members(self, project_id):
+
+def member_pages(manager, project_id):
+    """
+    Pager of all the members of a project (/projects/{project_id}/members/all), run by `ContributorManager` and
+    `AsyncContributorManager` (see `GitLabManager._paginate`).
+    """
+    all_members = []
+    page = 1
+    while True:
+        members, _ = yield (f'{manager.query_root}/projects/{project_id}/members/all',
+                            {'per_page': manager.per_page, 'page': page}, json_codec.loads)
+        if not members:
+            break
+        all_members.extend(members)
+        page += 1
+    return all_members
+
+
+def contributor_pages(manager, project_id, min_contributors=10):
+    """
+    Pager of the human contributors of a project based on its events, run by `ContributorManager` and
+    `AsyncContributorManager` (see `GitLabManager._paginate`).
+
+    It will:
+    1. Query the events of the project.
+    2. Extract the authors of the events and apply a heuristic to filter out bots.
+    3. Stop querying new pages when we have enough contributors or when there are no more events.
+    4. Return a list of contributors with their ID, username, and name.
+    """
+    contributors = []
+    known_usernames = set()
+
+    for i in range(1, manager.max_queries + 1):
+        events, _ = yield (f'{manager.query_root}/projects/{project_id}/events',
+                           {'per_page': manager.per_page, 'page': i}, json_codec.loads)
+        if not events:
+            break
+
+        _add_contributors(events, contributors, known_usernames)
+        if len(contributors) >= min_contributors:
+            # If we have enough contributors, we can stop querying
+            break
+    return contributors
+
+
+class AsyncContributorManager(AsyncGitLabManager):
+    """
+    Asynchronous manager specialized in querying contributors and members of GitLab repositories.
+    Same pagers as `ContributorManager`, with asynchronous requests.
+    """
+
+    async def query_repo_members(self, project_id):
         """
-        Query all members of a project. (/projects/{project_id}/members/all)
+        Query all members of a project. (see `member_pages`)
         """
-        all_members = []
-        page = 1
-        while True:
-            members = self._query_member_page(project_id, page)
-            if not members:
-                break
-            all_members.extend(members)
-            page += 1
-        return all_members
+        return await self._paginate(member_pages(self.manager, project_id))
 
-    def query_repo_contributors(self, project_id, min_contributors=10):
+    async def query_repo_contributors(self, project_id, min_contributors=10):
         """
-        Query human contributors of a project based on their events.
-
-        This method will:
-        1. Query the events of the project.
-        2. Extract the authors of the events and apply a heuristic to filter out bots.
-        3. Stop querying new pages when we have enough contributors or when there are no more events.
-        4. Return a list of contributors with their ID, username, and name.
+        Query human contributors of a project based on their events. (see `contributor_pages`)
         """
-        contributors = []
-        known_usernames = set()
+        return await self._paginate(contributor_pages(self.manager, project_id, min_contributors))
 
-        for i in range(1, self.max_queries + 1):
-            events, headers = self._query_repo_event_page(project_id, i)
-            if not events:
-                break
 
-            for event in events:
-                if 'author' not in event:
-                    continue
-                username = event['author']['username']
-                is_bot = bot_heuristic(username, event['author'].get('name', ''))
-                if username in known_usernames or not is_bot:
-                    continue
+class ContributorManager(GitLabManager):
+    """
+    Manager specialized in querying contributors and members of GitLab repositories.
+    The requests go through the pooled session of the manager (see `AsyncContributorManager` for concurrent crawls).
+    """
 
-                contributors.append({
-                    'id': event['author']['id'],
-                    'username': username,
-                    'name': event['author'].get('name', 'Unknown')
-                })
-                known_usernames.add(username)
-            if len(contributors) >= min_contributors:
-                # If we have enough contributors, we can stop querying
-                break
-        return list(contributors)
+    def query_repo_members(self, project_id):
+        """
+        Query all members of a project. (see `member_pages`)
+        """
+        return self._paginate(member_pages(self, project_id))
+
+    def query_repo_contributors(self, project_id, min_contributors=10):
+        """
+        Query human contributors of a project based on their events. (see `contributor_pages`)
+        """
+        return self._paginate(contributor_pages(self, project_id, min_contributors))
 
 
 def analyse_contributor(contributor, gitlab_manager: GitLabManager, bimbis, bimbas):
@@ -133,27 +161,51 @@ def analyse_contributor(contributor, gitlab_manager: GitLabManager, bimbis, bimb
     features = gitlab_manager.compute_features(contributor['id'])
     if features is None:
         return None
-    label_bimbis, conf_bimbis = mod.predict_contributor(features, model=bimbis)
-    label_bimbas, conf_bimbas = mod.predict_contributor(features, model=bimbas)
+    return label_contributor(contributor, features, bimbis, bimbas)
 
-    if label_bimbas != label_bimbis:
-        label = 'Unknown'
-    else:
-        label = label_bimbis
 
-    return {
+def label_contributor(contributor, features, bimbis, bimbas):
+    """
+    Predict the type of a contributor from its features with BIMBIS and BIMBAS. (see `analyse_contributor`)
+    """
+    return label_contributors([contributor], [features], bimbis, bimbas)[0]
+
+
+def label_contributors(contributors, features, bimbis, bimbas):
+    """
+    Predict the type of several contributors from their features with BIMBIS and BIMBAS, with a single
+    prediction per model. (see `analyse_contributor`)
+
+    Parameters:
+        contributors: A list of contributors (dictionaries with the keys 'username' and 'name')
+        features: The features of each contributor (single-row DataFrames or None, same order as `contributors`)
+
+    Returns:
+        A list with the information of each contributor with features (same order as `contributors`)
+    """
+    analysed = [(contributor, contributor_features)
+                for contributor, contributor_features in zip(contributors, features)
+                if contributor_features is not None]
+    if not analysed:
+        return []
+    contributors = [contributor for contributor, _ in analysed]
+    features = pd.concat([contributor_features for _, contributor_features in analysed], ignore_index=True)
+    predictions = mod.predict_contributors(features, {'bimbis': bimbis, 'bimbas': bimbas})
+
+    return [{
         "username": contributor['username'],
         "name": contributor['name'],
-        'nb_activity': int(features['NA'].iloc[0]),
-        "bimbis_label": label_bimbis,
-        "bimbis_conf": conf_bimbis,
-        "bimbas_label": label_bimbas,
-        "bimbas_conf": conf_bimbas,
-        "label": label
-    }
+        'nb_activity': int(nb_activity),
+        "bimbis_label": prediction['bimbis_label'],
+        "bimbis_conf": prediction['bimbis_conf'],
+        "bimbas_label": prediction['bimbas_label'],
+        "bimbas_conf": prediction['bimbas_conf'],
+        "label": prediction['label']
+    } for contributor, nb_activity, prediction in zip(contributors, features['NA'],
+                                                      predictions.to_dict('records'))]
 
 
-def extract_bot_users(repository, contributor_manager, bimbis, bimbas):
+def extract_bot_users(repository, contributor_manager, bimbis, bimbas, journal=None):
     """
     Extract bot users from the active repositories.
     To do so, we will fetch the members of the repository and apply a heuristic to determine if they are bots.
@@ -162,16 +214,28 @@ def extract_bot_users(repository, contributor_manager, bimbis, bimbas):
     1. For each repository, get the members.
     2. Apply a heuristic to determine if the member is a bot (if username/name contains 'bot', 'io' or 'ci').
     3. Predict the type of contributors using BIMBIS and BIMBAS models. (Avoid false positives in the dataset)
-    """
-    members = contributor_manager.query_repo_members(repository['id'])
-
-    # Keep members that are bots
-    bot_members = [member for member in members if bot_heuristic(member['username'], member.get('name', ''))]
 
-    results = [
-        analyse_contributor(bot, contributor_manager, bimbis, bimbas)
-        for bot in bot_members
-    ]
+    With a `CrawlJournal`, the members and features already recorded for the repository are not queried again.
+    """
+    bot_members = journal.users('members', repository['id']) if journal else None
+    if bot_members is None:
+        members = contributor_manager.query_repo_members(repository['id'])
+
+        # Keep members that are bots
+        bot_members = [{'id': member['id'], 'username': member['username'], 'name': member.get('name', 'Unknown')}
+                       for member in members if bot_heuristic(member['username'], member.get('name', ''))]
+        if journal:
+            journal.start_repository('members', repository['id'], bot_members)
+
+    done = journal.features('members', repository['id']) if journal else {}
+    features = []
+    for bot in bot_members:
+        if bot['username'] not in done:
+            done[bot['username']] = contributor_manager.compute_features(bot['id'])
+            if journal:
+                journal.add_features('members', repository['id'], bot['username'], done[bot['username']])
+        features.append(done[bot['username']])
+    results = label_contributors(bot_members, features, bimbis, bimbas)
 
     return pd.DataFrame(results)
 
@@ -195,49 +259,104 @@ def extract_human_users(repository, contributor_manager, bimbis, bimbas, min_con
         # Select randomly min_contributors contributors
         contributors = random.sample(contributors, min_contributors)
 
-    results = []
-    for contributor in contributors:
-        info = analyse_contributor(contributor, contributor_manager, bimbis, bimbas)
-        if info is None:
-            continue
+    features = [contributor_manager.compute_features(contributor['id']) for contributor in contributors]
+    results = label_contributors(contributors, features, bimbis, bimbas)
+    for info in results:
         info['repository'] = repository['id']
-        results.append(info)
 
     return pd.DataFrame(results)
 
 
-if __name__ == '__main__':
-    KEY = os.getenv("GITLAB_API_KEY")
-    manager = ContributorManager(KEY, max_queries=3,
-                                 before="2025-01-21", after="2024-10-21")
-    bimbis = mod.load_model("../resources/models/bimbis.joblib")
-    bimbas = mod.load_model("../resources/models/bimbas.joblib")
+async def extract_human_users_async(repositories, contributor_manager, bimbis, bimbas, min_contributors=10,
+                                    journal=None):
+    """
+    Asynchronous variant of `extract_human_users` over several repositories.
+    The repositories, their contributors and the events of the contributors are all queried concurrently.
 
-    repositories = pd.read_csv("../resources/data/gitlab/gitlab_repositories.csv")
-    repositories = repositories.sort_values(by='#stars', ascending=True).reset_index(drop=True)
+    Parameters:
+        repositories: A DataFrame of repositories (with an 'id' column)
+        contributor_manager: An opened `AsyncContributorManager`
+        journal: A `CrawlJournal` where the selected contributors and their features are recorded as soon as they
+            are queried (the ones already recorded are not queried again)
 
-    start = 1 - 1
+    Returns:
+        A list with the DataFrame of each repository (same order as `repositories`)
+    """
 
-    df_result = None
-    for index, row in repositories.iloc[start:].iterrows():
-        repo_name = row['repo']
+    async def contributor_features(repository, contributor, done):
+        if contributor['username'] in done:
+            return done[contributor['username']]
+        features = await contributor_manager.compute_features(contributor['id'])
+        if journal:
+            journal.add_features('contributors', repository['id'], contributor['username'], features)
+        return features
 
-        print(f"=============== {repo_name} ===============")
-        repo_df = extract_human_users(row, manager, bimbis, bimbas)
+    async def extract(repository):
+        contributors = journal.users('contributors', repository['id']) if journal else None
+        if contributors is None:
+            contributors = await contributor_manager.query_repo_contributors(repository['id'], min_contributors)
+            print(f"Number of contributors found in {repository['id']}: {len(contributors)}")
 
-        if repo_df.empty:
-            print(f"No active contributors found for {repo_name}. Skipping...")
-            continue
+            if len(contributors) > min_contributors:
+                # Select randomly min_contributors contributors
+                contributors = random.sample(contributors, min_contributors)
+            if journal:
+                journal.start_repository('contributors', repository['id'], contributors)
+
+        done = journal.features('contributors', repository['id']) if journal else {}
+        features = await asyncio.gather(*(
+            contributor_features(repository, contributor, done) for contributor in contributors
+        ))
+
+        results = label_contributors(contributors, features, bimbis, bimbas)
+        for info in results:
+            info['repository'] = repository['id']
+        return pd.DataFrame(results)
+
+    return await asyncio.gather(*(extract(repository) for _, repository in repositories.iterrows()))
 
-        print(f"Number of bot contributors found: {len(repo_df[repo_df['label'] == 'Bot'])}")
-        print(f"Number of human contributors found: {len(repo_df[repo_df['label'] == 'Human'])}")
-        print(f"Number of unknown contributors found: {len(repo_df[repo_df['label'] == 'Unknown'])}")
 
-        # Concat with current df or create new if it doesn't exist
-        if df_result is None:
-            df_result = repo_df
-        else:
-            df_result = pd.concat([df_result, repo_df], ignore_index=True)
+async def main(manager, repositories, bimbis, bimbas, journal, batch_size=50, max_concurrency=200):
+    """
+    Extract the human users of the repositories by batches of `batch_size` repositories.
+    The repositories already written in the journal are skipped, and the results of each repository are appended to
+    the output file of the journal.
+    """
+    written = journal.written_repositories('contributors')
+    repositories = repositories[~repositories['id'].astype(str).isin(written)]
+    print(f"{len(written)} repositories already done, {len(repositories)} remaining")
+
+    async with AsyncContributorManager(manager, max_concurrency=max_concurrency) as async_manager:
+        for batch_start in range(0, len(repositories), batch_size):
+            batch = repositories.iloc[batch_start:batch_start + batch_size]
+            repo_dfs = await extract_human_users_async(batch, async_manager, bimbis, bimbas, journal=journal)
+
+            repo_names = batch['owner'] + '/' + batch['project']
+            for repo_id, repo_name, repo_df in zip(batch['id'], repo_names, repo_dfs):
+                print(f"=============== {repo_name} ===============")
+                # Empty repositories are also marked as written, so they are not queried again
+                journal.write_results('contributors', repo_id, repo_df)
+                if repo_df.empty:
+                    print(f"No active contributors found for {repo_name}. Skipping...")
+                    continue
+
+                print(f"Number of bot contributors found: {len(repo_df[repo_df['label'] == 'Bot'])}")
+                print(f"Number of human contributors found: {len(repo_df[repo_df['label'] == 'Human'])}")
+                print(f"Number of unknown contributors found: {len(repo_df[repo_df['label'] == 'Unknown'])}")
+
+
+if __name__ == '__main__':
+    KEY = os.getenv("GITLAB_API_KEY")
+    manager = ContributorManager(KEY, max_queries=3,
+                                 before="2025-01-21", after="2024-10-21",
+                                 owner_cache="../resources/data/gitlab/repo_owners.sqlite",
+                                 response_cache="../resources/data/gitlab/http_cache")
+    bimbis = get_model('bimbis', "../resources/models")
+    bimbas = get_model('bimbas', "../resources/models")
+
+    repositories = pd.read_csv("../resources/data/gitlab/gitlab_repositories.csv")
+    repositories = repositories.sort_values(by='#stars', ascending=True).reset_index(drop=True)
 
-        # Save file
-        df_result.to_csv("../resources/data/gitlab/oui.csv", index=False)
+    with CrawlJournal("../resources/data/gitlab/crawl_journal.sqlite", "../resources/data/gitlab/oui.csv",
+                      COLUMNS) as journal:
+        asyncio.run(main(manager, repositories, bimbis, bimbas, journal))
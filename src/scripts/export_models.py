@@ -0,0 +1,32 @@
+"""
+Script to export the models of `resources/models` to flat arrays (see `gitbot_utils.fast_model`).
+
+For each model, it writes {name}.npz next to {name}.joblib and checks that the exported model gives the same
+probabilities as the original one on the features of the dataset.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from gitbot_utils.fast_model import FastModel, export_model
+from gitbot_utils.model_registry import get_registry
+
+
+if __name__ == '__main__':
+    registry = get_registry("../resources/models")
+    dataset = pd.read_csv("../resources/data/gitlab/gitlab_glmap_features.csv")
+
+    for name in registry.names():
+        model = registry.get(name)
+        path = os.path.join(registry.folder, f'{name}.npz')
+        try:
+            export_model(model, path)
+        except ValueError as e:
+            print(f"{name}: not exported ({e})")
+            continue
+
+        features = dataset[registry.feature_names(name)]
+        same = np.array_equal(model.predict_proba(features), FastModel(path).predict_proba(features))
+        print(f"{name}: exported to {path} ({'same' if same else 'DIFFERENT'} probabilities on {len(features)} users)")
@@ -1,36 +1,170 @@
 """
 Script to extract repositories from the GitLab API.
 
-By default, it queries the /projects endpoint to get repositories in descending order of last activity.
+By default, it queries the /projects endpoint to get repositories in descending order of last activity
+(offset pagination, the next pages are queried concurrently while the current one is written).
+As this order changes while the projects are updated, offset pages can overlap or miss repositories. With
+`pagination='keyset'`, the repositories are listed in descending order of id with a cursor (`id_before`), which
+does not move during the extraction (`last_activity_after` keeps only the active repositories).
+
+The repositories are deduplicated by id and appended to the CSV file by batches. The repositories already in the
+file are skipped, so an interrupted extraction can be started again (with keyset pagination, it resumes after the
+smallest id of the file). The requests are paced by the rate limiter of the API key, and the rate limited (429) or
+failed (5xx) pages are retried: a page that still fails raises an error instead of ending the extraction as if
+there were no more repositories.
 """
 
+import csv
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlparse
 
-import pandas as pd
 import requests
 from tqdm import tqdm
 
+from gitbot_utils.rate_limit import RateLimiter, RetryError
+
+QUERY_ROOT = 'https://gitlab.com/api/v4'
+COLUMNS = ['owner', 'project', 'id', '#stars']
+
+
+def _session(api_key=None, pool_size=10):
+    """
+    HTTP session reusing its connections (shared by the prefetching threads).
+    """
+    session = requests.Session()
+    if api_key:
+        session.headers['Private-Token'] = api_key
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def query_projects(params, api_key=None, session=None, query_root=QUERY_ROOT, limiter=None):
+    """
+    Query the /projects endpoint. The requests are paced by the rate limiter, and the rate limited (429) or failed
+    (5xx) requests are retried with a jittered backoff.
+
+    Parameters:
+        params: The parameters of the query
+        limiter: The `RateLimiter` of the requests (default: the limiter shared by the requests of the API key)
 
-def query_repository_page(page, api_key=None):
+    Returns:
+        The successful response
+
+    Raises:
+        RetryError: If the request is still rate limited or failed after the retries
+        requests.HTTPError: If the request failed with another status (ex: 401 for an invalid API key)
+    """
+    query = f'{query_root}/projects'
+    limiter = limiter or RateLimiter.for_token(query_root, api_key)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            response = (session or requests).get(query, headers={'Private-Token': api_key} if api_key else {},
+                                                 params=params)
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.update(response.headers)
+        if response.ok:
+            return response
+        if not limiter.should_retry(response.status_code):
+            response.raise_for_status()
+        if attempt >= limiter.max_retries:
+            raise RetryError(query, response.status_code)
+        delay = limiter.backoff(attempt, response.headers)
+        print(f"Error {response.status_code} while querying repositories {params}, retrying in {delay:.1f} seconds.")
+        time.sleep(delay)
+        attempt += 1
+
+
+def query_repository_page(page, api_key=None, session=None, query_root=QUERY_ROOT, limiter=None):
     """
     Query a page of the /projects endpoint from the GitLab API to get repositories in descending order of last activity.
+
+    Raises:
+        RetryError, requests.HTTPError: If the page could not be queried (see `query_projects`)
+    """
+    return query_projects({
+        'per_page': 100,  # Adjust the number of results per page as needed
+        'page': page,
+        'sort': 'desc',
+        'order_by': 'updated_at'
+    }, api_key, session, query_root, limiter).json()
+
+
+def query_repository_keyset_page(params, api_key=None, session=None, query_root=QUERY_ROOT, limiter=None):
+    """
+    Query a page of the /projects endpoint with keyset pagination.
+
+    Returns:
+        The repositories of the page
+        The parameters of the next page (from the `Link` header, None for the last page)
+
+    Raises:
+        RetryError, requests.HTTPError: If the page could not be queried (see `query_projects`)
+    """
+    response = query_projects(params, api_key, session, query_root, limiter)
+    next_url = response.links.get('next', {}).get('url')
+    return response.json(), dict(parse_qsl(urlparse(next_url).query)) if next_url else None
+
+
+def iter_offset_pages(api_key=None, max_queries=1000, prefetch=8, query_root=QUERY_ROOT, limiter=None):
+    """
+    Pages of repositories with offset pagination (`prefetch` pages are queried ahead of the current one).
+    The extraction stops at the first empty page, and a page that could not be queried raises its error.
     """
-    query = 'https://gitlab.com/api/v4/projects'
-    response = requests.get(
-        query,
-        headers={'Private-Token': api_key} if api_key else {},
-        params={
-            'per_page': 100,  # Adjust the number of results per page as needed
-            'page': page,
-            'sort': 'desc',
-            'order_by': 'updated_at'
-        }
-    )
-    if response.ok:
-        return response.json()
-    else:
-        print(f"Error while querying page {page}: {response.status_code}")
-        return None
+    with _session(api_key, prefetch) as session, ThreadPoolExecutor(prefetch) as executor:
+        futures = deque()
+        next_page = 1
+        for page in range(1, max_queries + 1):
+            while next_page <= max_queries and len(futures) < prefetch:
+                futures.append(executor.submit(query_repository_page, next_page, api_key, session, query_root,
+                                               limiter))
+                next_page += 1
+            try:
+                repositories = futures.popleft().result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            if not repositories:
+                print(f"No more repositories found on page {page}. Stopping extraction.")
+                for future in futures:
+                    future.cancel()
+                return
+            yield repositories
+
+
+def iter_keyset_pages(api_key=None, max_queries=1000, last_activity_after=None, query_root=QUERY_ROOT, id_before=None,
+                      limiter=None):
+    """
+    Pages of repositories with keyset pagination (the next page is queried while the current one is processed),
+    starting after `id_before` if given (to resume an extraction). A page that could not be queried raises its error.
+    """
+    params = {'pagination': 'keyset', 'per_page': 100, 'order_by': 'id', 'sort': 'desc'}
+    if last_activity_after:
+        params['last_activity_after'] = last_activity_after
+    if id_before is not None:
+        params['id_before'] = id_before
+    with _session(api_key, 1) as session, ThreadPoolExecutor(1) as executor:
+        future = executor.submit(query_repository_keyset_page, params, api_key, session, query_root, limiter)
+        for page in range(1, max_queries + 1):
+            repositories, next_params = future.result()
+            if next_params is not None and page < max_queries:
+                future = executor.submit(query_repository_keyset_page, next_params, api_key, session, query_root,
+                                         limiter)
+            if not repositories:
+                print(f"No more repositories found on page {page}. Stopping extraction.")
+                return
+            yield repositories
+            if next_params is None:
+                return
 
 
 def parse_repository_data(repository):
@@ -49,32 +183,106 @@ def parse_repository_data(repository):
     }
 
 
-def extract_repositories(api_key=None, max_queries=1000, path='gitlab_repositories.csv'):
+class RepositoryWriter:
     """
-    Extract active repositories from the GitLab API.
+    CSV file of repositories deduplicated by id, where the new repositories are appended by batches.
+
+    Attributes:
+        path (str): Path of the CSV file
+        batch_size (int): Number of repositories buffered before being appended to the file
+        ids (set): Ids of the repositories already in the file or in the buffer
     """
 
-    df_repo = None
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.ids = set()
+        self._rows = []
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb+') as file:
+                content = file.read()
+                # Remove the incomplete last line of an interrupted extraction
+                if not content.endswith(b'\n'):
+                    file.truncate(content.rfind(b'\n') + 1)
+            with open(path, newline='') as file:
+                self.ids = {int(row['id']) for row in csv.DictReader(file)}
+        self._write_header = not os.path.isfile(path) or os.path.getsize(path) == 0
+
+    def add(self, repository):
+        """
+        Add a repository (dictionary returned by `parse_repository_data`) if its id is new.
+
+        Returns:
+            Whether the repository was added
+        """
+        if repository['id'] in self.ids:
+            return False
+        self.ids.add(repository['id'])
+        self._rows.append(repository)
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        Append the buffered repositories to the file.
+        """
+        if not self._rows:
+            return
+        with open(self.path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=COLUMNS)
+            if self._write_header:
+                writer.writeheader()
+                self._write_header = False
+            writer.writerows(self._rows)
+        self._rows = []
+
+    def __enter__(self):
+        return self
 
-    for page in tqdm(range(1, max_queries + 1), total=max_queries, desc="Extracting repositories"):
-        repositories = query_repository_page(page, api_key)
+    def __exit__(self, *args):
+        self.flush()
 
-        if repositories is None or len(repositories) == 0:
-            print(f"No more repositories found on page {page}. Stopping extraction.")
-            break
 
-        for repository in repositories:
-            repo_data = parse_repository_data(repository)
-            if df_repo is not None and repo_data['id'] in df_repo['id'].values:
-                # Skip if the repository is already in the DataFrame
-                continue
+def extract_repositories(api_key=None, max_queries=1000, path='gitlab_repositories.csv', pagination='offset',
+                         prefetch=8, batch_size=1000, last_activity_after=None, query_root=QUERY_ROOT, limiter=None):
+    """
+    Extract active repositories from the GitLab API.
+
+    Parameters:
+        api_key: The GitLab API key
+        max_queries: The maximum number of pages to query
+        path: The CSV file where the repositories are appended
+        pagination: 'offset' (repositories by last activity) or 'keyset' (repositories by id, stable pages, resumed
+            after the smallest id of the file)
+        prefetch: The number of pages queried concurrently (offset pagination)
+        batch_size: The number of repositories appended to the file at once
+        last_activity_after: Keep only the repositories active after this date (keyset pagination, ISO 8601)
+        query_root: The root URL of the GitLab API
+        limiter: The `RateLimiter` of the requests (default: the limiter shared by the requests of the API key)
 
-            if df_repo is None:
-                df_repo = pd.DataFrame([repo_data])
-            else:
-                df_repo = pd.concat([df_repo, pd.DataFrame([repo_data])], ignore_index=True)
+    Returns:
+        The number of new repositories
+
+    Raises:
+        RetryError, requests.HTTPError: If a page could not be queried (the repositories already extracted are
+            written: the extraction can be started again)
+    """
+    if pagination not in ('offset', 'keyset'):
+        raise ValueError(f"Unknown pagination: {pagination}")
 
-            df_repo.to_csv(path, index=False)
+    nb_new = 0
+    with RepositoryWriter(path, batch_size) as writer:
+        if pagination == 'offset':
+            pages = iter_offset_pages(api_key, max_queries, prefetch, query_root, limiter)
+        else:
+            # The ids are listed in descending order: the repositories after the smallest id are not extracted yet
+            pages = iter_keyset_pages(api_key, max_queries, last_activity_after, query_root,
+                                      min(writer.ids) if writer.ids else None, limiter)
+        for repositories in tqdm(pages, total=max_queries, desc="Extracting repositories"):
+            for repository in repositories:
+                nb_new += writer.add(parse_repository_data(repository))
+    return nb_new
 
 
 if __name__ == '__main__':
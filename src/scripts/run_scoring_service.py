@@ -0,0 +1,33 @@
+"""
+Script to run the local scoring service (see `gitbot_utils.scoring_service`).
+
+Example of request:
+    curl -X POST http://127.0.0.1:8765/predict -d '{"platform": "gitlab", "contributor": "name", "events": [...]}'
+The latency percentiles of each stage are available at http://127.0.0.1:8765/stats
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from gitbot_utils.gh_api import GitHubManager
+from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.scoring_service import ScoringService
+
+load_dotenv()
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+if __name__ == '__main__':
+    managers = {
+        'github': GitHubManager(os.getenv("GITHUB_API_KEY")),
+        # The owners of the GitLab projects are queried from the API (once, see the owner cache)
+        'gitlab': GitLabManager(os.getenv("GITLAB_API_KEY"),
+                                owner_cache="../resources/data/gitlab/repo_owners.sqlite"),
+    }
+    service = ScoringService(managers, models=('bimbas',), models_folder="../resources/models")
+    server = service.serve(HOST, PORT)
+    print(f"Scoring service listening on http://{HOST}:{PORT} (POST /predict, GET /stats)")
+    threading.Event().wait()
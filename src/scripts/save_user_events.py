@@ -1,31 +1,36 @@
 """
 This script fetches events from users that are not yet in the features' dataset. (But in the dataset)
 
-It then saves the events in a json file in the folder ../tests/gitlab_dataset/<origin>_events/<username>.json
+It then saves the events in the event store of the folder ../tests/gitlab_dataset/<origin>_events/
+(see `gitbot_utils.event_store`). When the script is run again, only the new events of each user are fetched.
+The `<username>.json` files saved by the former version of the script in these folders are imported in the stores
+first, so that their users are refreshed in the same way.
+Finally, the events of each store are exported to the columnar archive ../tests/gitlab_dataset/archive
+(see `gitbot_utils.event_archive`), read by `save_user_features.py`.
+
+The responses of the API are cached in ../resources/data/gitlab/http_cache: when the script is run again,
+the unchanged pages are not downloaded again (set OFFLINE to True to only use the cache).
 """
 
-import json
-import os
-
 import pandas as pd
 from tqdm import tqdm
 
+from gitbot_utils.event_archive import EventArchive
+from gitbot_utils.event_store import EventStore
 from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.http_cache import ResponseCache
+
+OFFLINE = False
 
 
 def fetch_and_save(manager, username, id, folder):
     """
-    Fetch events for a given id and save them to a json file (<folder>/<username>.json).
+    Fetch the new events for a given id and append them to the event store of the folder.
     """
-    events = manager.query_events(id)
-
-    if not os.path.exists(folder):
-        os.makedirs(folder)
+    store = EventStore(folder)
+    store.refresh(manager, username, id)
 
-    if events and len(events) >= manager.min_events:
-        # Save events to json file
-        with open(f"{folder}/{username}.json", "w") as f:
-            json.dump(events, f, indent=4)
+    if store.count(username) >= manager.min_events:
         return True
     else:
         print(f"No events found for {username}")
@@ -39,7 +44,12 @@ if __name__ == '__main__':
 
     key = None
     gl_manager = GitLabManager(key, max_queries=3,
-                               before="2025-01-21", after="2024-10-21")
+                               before="2025-01-21", after="2024-10-21",
+                               response_cache=ResponseCache("../resources/data/gitlab/http_cache", offline=OFFLINE))
+
+    # Import the events saved by the former version of the script
+    for origin in ['human', 'bot_heuristic', 'github_common']:
+        EventStore(f'../tests/gitlab_dataset/{origin}_events').import_json_files()
 
     skipped = []
     # Load the dataset
@@ -66,3 +76,9 @@ if __name__ == '__main__':
     with open("skipped_humans.txt", "w") as f:
         for user in skipped:
             f.write(f"{user}\n")
+
+    # Export the event stores to the archive (one partition per origin)
+    archive = EventArchive('../tests/gitlab_dataset/archive')
+    for origin in ['human', 'bot_heuristic', 'github_common']:
+        store = EventStore(f'../tests/gitlab_dataset/{origin}_events')
+        archive.write(origin, {username: store.load(username) for username in store.users()}, overwrite=True)
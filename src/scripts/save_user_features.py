@@ -1,30 +1,31 @@
 """
 For each user in the dataset that is not already in the features file:
-- Load the user's events from a JSON file.
-- Compute features using the GitLabManager.
-- Save the features in the features file.
+- Load the user's events from the event archive (see `save_user_events.py`).
+- Map the events to activities using the GitLabManager.
+- Compute the features of the user.
+The users are processed in parallel by chunks (see `gitbot_utils.feature_pipeline`) and each chunk is appended to
+the features file as soon as it is done, in the order of the dataset. If the script is interrupted, running it
+again continues after the last chunk written (see the progress file next to the features file).
 """
 
-import json
-import os
-
 import pandas as pd
-from tqdm import tqdm
 
-from gitbot_utils.gl_api import GitLabManager
+from gitbot_utils.feature_pipeline import build_features
 
 
-def compute_features(manager, user_events, username):
-    activities = manager.events_to_activities(user_events)
-    # Convert activities to DataFrame
-    df = manager.activity_to_df(activities)
-    # Extract features
-    df_feat = manager.extract_features(df, username)
-    return df_feat
+def archive_partition(origin):
+    """
+    Origin of a user in the event archive.
+    """
+    if origin == 'human':
+        return 'human'
+    elif origin == 'bot-heuristic':
+        return 'bot_heuristic'
+    else:
+        return 'github_common'
 
 
 if __name__ == '__main__':
-    gl_manager = GitLabManager()
     file = 'gitlab_features_glmap.csv'
 
     df_features = pd.read_csv("../resources/data/gitlab/gitlab_glmap_features.csv")
@@ -44,39 +45,19 @@ if __name__ == '__main__':
                'DCA_mean', 'DCA_median', 'DCA_std', 'DCA_gini', 'DCA_IQR',
                'DCAT_mean', 'DCAT_median', 'DCAT_std', 'DCAT_gini', 'DCAT_IQR',
                ]
-    df_feat = pd.DataFrame(columns=columns)
-
-    # tqdm with iterrows
-    for i, row in tqdm(dataset.iterrows(), total=len(dataset), desc="Processing users", unit="user"):
-        row['origin'] = 'bot-heuristic'
-        username = row['username']
-        path = '../tests/gitlab_dataset/'
-        if row['origin'] == 'human':
-            path += f'human_events/{username}.json'
-        elif row['origin'] == 'bot-heuristic':
-            path += f'bot_heuristic_events/{username}.json'
-        else:
-            path += f'github_common_events/{username}.json'
-
-        if not os.path.exists(path):
-            print(f"File {path} does not exist for user {username}. Skipping...")
-            continue
-
-        with open(path, "r") as f:
-            user_events = json.load(f)
-
-        # Compute features
-        features = compute_features(gl_manager, user_events, username)
-        features['contributor'] = username
-        features['label'] = row['label']
-        features['origin'] = row['origin']
-        # Reorder columns to match the original DataFrame
-        features = features[columns]
-
-        if df_feat.empty:
-            df_feat = features
-        else:
-            df_feat = pd.concat([df_feat, features], ignore_index=True)
 
-    # Save features to csv file
-    df_feat.to_csv(file, index=False)
+    users = pd.DataFrame({
+        'contributor': dataset['username'],
+        'label': dataset['label'],
+        'origin': 'bot-heuristic',
+    })
+    users['partition'] = users['origin'].map(archive_partition)
+
+    nb_written, missing = build_features(
+        users, file, '../tests/gitlab_dataset/archive',
+        manager_kwargs={'owner_cache': "../resources/data/gitlab/repo_owners.sqlite"},
+        columns=columns,
+    )
+    for username in missing:
+        print(f"No events in the archive for user {username}. Skipping...")
+    print(f"Features of {nb_written} users saved in {file}")